@@ -1,61 +1,422 @@
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException
-from app.api.schemas import QueryRequest, QueryResponse, UploadResponse
-from app.core.logging import setup_logging
-from app.services.ingestion import save_upload_file, process_document
+import json
+import secrets
+from contextlib import nullcontext
+from typing import AsyncIterator, Dict, List, Optional
+from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException, Header, Depends, Query
+from fastapi.responses import StreamingResponse
+from app.api.schemas import (
+    QueryRequest, QueryResponse, UploadResponse, BatchStatusResponse,
+    GenerationListResponse, RollbackResponse, StatsResponse,
+)
+from app.core.logging import get_logger, HOT_PATH
+from app.services.ingestion import UPLOAD_DIR
+from app.services.upload_batch import (
+    ARCHIVE_EXTENSIONS, DOCUMENT_EXTENSIONS, UploadRejected, create_batch, get_batch_status, run_batch,
+)
 
-logger = setup_logging()
+logger = get_logger(__name__)
 
 router = APIRouter()
 
+UPLOAD_EXTENSIONS = DOCUMENT_EXTENSIONS + ARCHIVE_EXTENSIONS
+
 @router.get("/health")
 async def health_check():
-    logger.info("Health check endpoint hit")
+    logger.info("Health check endpoint hit", extra=HOT_PATH)
     return {"status": "ok"}
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
-    logger.info(f"Received upload request for file: {file.filename}")
-    
-    # Validate file extension
-    if not (file.filename.endswith(".pdf") or file.filename.endswith(".txt")):
-        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF and TXT are allowed.")
+async def upload_document(
+    background_tasks: BackgroundTasks,
+    file: Optional[UploadFile] = File(None),
+    files: Optional[List[UploadFile]] = File(None),
+):
+    """
+    Accepts one or more PDF/TXT files and ZIP archives of them (form fields
+    `file` and/or repeated `files`). Returns a batch handle whose per-file
+    status is available from GET /upload/{batch_id}.
+    """
+    uploads = ([file] if file is not None else []) + (files or [])
+    logger.info("Received upload request for files: %s", ", ".join(upload.filename or "" for upload in uploads))
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No file uploaded.")
+
+    # Validate file extensions
+    if not all((upload.filename or "").lower().endswith(UPLOAD_EXTENSIONS) for upload in uploads):
+        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF, TXT and ZIP are allowed.")
+
+    # Save files (unpacking archives)
+    try:
+        batch = await create_batch(uploads)
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        logger.error("Error saving upload: %s", e)
+        raise HTTPException(status_code=500, detail="Could not save file")
 
-    # Save file
-    file_path = await save_upload_file(file)
-    
     # Trigger background task
-    background_tasks.add_task(process_document, file_path, file.filename)
-    
-    return {"message": "Upload received. Ingestion started in background."}
+    background_tasks.add_task(run_batch, batch)
 
+    return {
+        "message": "Upload received. Ingestion started in background.",
+        "batch_id": batch.batch_id,
+        "files": batch.files,
+    }
+
+@router.get("/upload/{batch_id}", response_model=BatchStatusResponse)
+async def upload_status(batch_id: str):
+    status = get_batch_status(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown batch")
+    return status
+
+import asyncio
+import math
+from app.core.config import settings
 from app.services.retrieval import retrieve_context
-from app.services.llm import generate_answer
+from app.services.llm import LLM_ERROR_ANSWER, generate_answer, stream_answer
+from app.services.cache import LRUCache
+from app.services.compression import compress_context, should_compress
+from app.core.metrics import CONTEXT_CHARS, UPSTREAM_ERRORS
+from app.services.query_log import annotate, finish_entry, normalize_question, start_entry, timed_stage
+from app.services.deadline import Deadline
+from app.services.dedup import duplicate_count
+from app.core.tracing import span, start_trace, finish_trace
+from app.services.admission import AdmissionRejected, TRAFFIC_CLASSES, admission_controllers, retry_after_header
+
+# Answers keyed by normalized question and the exact chunks they were generated from
+answer_cache = LRUCache("answer", settings.ANSWER_CACHE_SIZE)
+
+NO_MATCH_ANSWER = "I don't know based on the provided documents (No relevant matches found)."
+
+# Small-model output held back by /query/stream before deciding whether to escalate (see stream_answer)
+STREAM_HOLD_CHARS = 80
+
+DEADLINE_FALLBACK_ANSWER = (
+    "The request deadline was reached before an answer could be generated. "
+    "The most relevant sources are listed below."
+)
 
 @router.post("/query", response_model=QueryResponse)
-async def query_document(request: QueryRequest):
-    logger.info(f"Received query: {request.question}")
-    
-    # 1. Retrieve Context
-    context_results = await retrieve_context(request.question)
+async def query_document(
+    request: QueryRequest,
+    trace: bool = False,
+    x_trace: Optional[str] = Header(None),
+    x_traffic_class: Optional[str] = Header(None),
+):
+    # The deadline starts on arrival, so time spent queued counts against it
+    deadline = Deadline(request.deadline_ms)
+    if not settings.ADMISSION_ENABLED:
+        return await run_query(request, deadline, trace, x_trace)
+
+    traffic_class = (x_traffic_class or "interactive").lower()
+    if traffic_class not in admission_controllers:
+        raise HTTPException(status_code=400, detail=f"X-Traffic-Class must be one of {', '.join(TRAFFIC_CLASSES)}.")
+    try:
+        async with admission_controllers[traffic_class].admit(max_wait_ms=request.deadline_ms):
+            return await run_query(request, deadline, trace, x_trace)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is at capacity. Retry later.",
+            headers={"Retry-After": retry_after_header(e.retry_after_s)},
+        )
+
+async def run_query(request: QueryRequest, deadline: Deadline, trace: bool, x_trace: Optional[str]) -> dict:
+    # Question text stays at DEBUG; INFO only records its size
+    logger.info("Received query (%d chars)", len(request.question), extra=HOT_PATH)
+    logger.debug("Query text: %s", request.question)
+
+    # Tracing is opt-in (?trace=true or X-Trace: 1), plus a small background sample
+    requested = trace or (x_trace or "").lower() in ("1", "true", "yes")
+    active_trace = start_trace(requested)
+    log_entry = start_entry(request.question)
+    try:
+        with span("query_document", deadline_ms=request.deadline_ms or 0):
+            response = await answer_query(request, deadline)
+    finally:
+        finish_trace(active_trace)
+        finish_entry(log_entry)
+
+    if active_trace is not None and active_trace.requested:
+        response["trace"] = {"trace_id": active_trace.trace_id, "spans": active_trace.breakdown()}
+    return response
+
+def answer_cache_key(question: str, context_results: List[Dict], compress: bool) -> tuple:
+    return (
+        normalize_question(question),
+        tuple((res["vector_id"], res.get("metadata", {}).get("chunk_id")) for res in context_results),
+        compress,
+    )
+
+def prompt_context(question: str, context_results: List[Dict], compress: bool) -> List[Dict]:
+    """The chunks as sent to the LLM: compressed to the relevant sentences if requested."""
+    retrieved_chars = sum(len(res.get("metadata", {}).get("text", "")) for res in context_results)
+    sent = context_results
+    if should_compress(context_results, compress):
+        with span("compression"), timed_stage("compression"):
+            sent, _, _ = compress_context(
+                question, context_results,
+                settings.CONTEXT_COMPRESSION_RATIO, settings.CONTEXT_COMPRESSION_NEIGHBORS,
+            )
+    sent_chars = sum(len(res.get("metadata", {}).get("text", "")) for res in sent)
+    CONTEXT_CHARS.labels(stage="retrieved").inc(retrieved_chars)
+    CONTEXT_CHARS.labels(stage="sent").inc(sent_chars)
+    annotate(context_chars=retrieved_chars, prompt_context_chars=sent_chars)
+    return sent
+
+async def retrieve_for(request: QueryRequest, deadline: Deadline) -> List[Dict]:
+    with span("retrieval"):
+        context_results = await retrieve_context(
+            request.question,
+            top_k=request.top_k or settings.DEFAULT_TOP_K,
+            mmr_lambda=request.mmr_lambda,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            deadline=deadline,
+        )
     
+    annotate(
+        vector_ids=[res["vector_id"] for res in context_results],
+        chunk_ids=[res.get("metadata", {}).get("chunk_id") for res in context_results],
+    )
     if not context_results:
-        # Fallback if no context found or error
         logger.warning("No relevant context found.")
-        return {
-            "answer": "I don't know based on the provided documents (No relevant matches found).", 
-            "sources": []
-        }
+    return context_results
 
-    # 2. Generate Answer
-    answer = await generate_answer(request.question, context_results)
-    
-    # 3. Format Response
+def fit_context_to_deadline(deadline: Deadline, context_results: List[Dict]) -> Optional[List[Dict]]:
+    """
+    The context to generate from within what is left of the deadline: trimmed
+    if retrieval overran (prompt length drives LLM latency), or None if too
+    little time is left to generate at all.
+    """
+    remaining_ms = deadline.remaining_ms()
+    if remaining_ms is None:
+        return context_results
+    if remaining_ms < settings.DEADLINE_MIN_LLM_MS:
+        deadline.degrade("llm_skipped")
+        return None
+    planned_ms = deadline.stage_share_ms("llm")
+    if remaining_ms < planned_ms:
+        keep = max(1, math.floor(len(context_results) * remaining_ms / planned_ms))
+        if keep < len(context_results):
+            context_results = context_results[:keep]
+            deadline.degrade("shortened_context")
+    return context_results
+
+def response_sources(context_results: List[Dict]) -> List[Dict]:
+    """
+    One source per retrieved chunk, with how many near-duplicates were
+    collapsed into it, followed by at most DEDUP_RESPONSE_REFS of the other
+    documents those duplicates came from.
+    """
     sources = []
     for res in context_results:
         meta = res.get('metadata', {})
         sources.append({
             "source_file": meta.get('source_file', 'unknown'),
-            "chunk_id": meta.get('chunk_id', 'unknown')
+            "chunk_id": meta.get('chunk_id', 'unknown'),
+            "duplicate_count": duplicate_count(meta),
         })
-        
-    return {"answer": answer, "sources": sources}
+        sources.extend(meta.get('duplicates', [])[:settings.DEDUP_RESPONSE_REFS])
+    return sources
+
+async def answer_query(request: QueryRequest, deadline: Deadline) -> dict:
+    """Runs retrieval and generation for a query and returns the response body."""
+
+    # 1. Retrieve Context
+    context_results = await retrieve_for(request, deadline)
+    if not context_results:
+        # Fallback if no context found or error
+        return {"answer": NO_MATCH_ANSWER, "sources": [], "degradations": deadline.degradations}
+
+    # 2. Generate Answer (within whatever is left of the deadline)
+    compress = request.compress if request.compress is not None else settings.CONTEXT_COMPRESSION_ENABLED
+    cached_answer = answer_cache.get(answer_cache_key(request.question, context_results, compress))
+    annotate(answer_cache_hit=cached_answer is not None)
+    if cached_answer is not None:
+        answer = cached_answer
+    else:
+        fitted = fit_context_to_deadline(deadline, context_results)
+        if fitted is None:
+            answer = DEADLINE_FALLBACK_ANSWER
+        else:
+            context_results = fitted
+            llm_context = prompt_context(request.question, context_results, compress)
+            remaining_ms = deadline.remaining_ms()
+            try:
+                with timed_stage("llm"):
+                    answer = await asyncio.wait_for(
+                        generate_answer(request.question, llm_context),
+                        timeout=remaining_ms / 1000 if remaining_ms is not None else None,
+                    )
+            except asyncio.TimeoutError:
+                deadline.degrade("llm_timeout")
+                answer = DEADLINE_FALLBACK_ANSWER
+
+    if cached_answer is None and answer not in (DEADLINE_FALLBACK_ANSWER, LLM_ERROR_ANSWER):
+        # Keyed on the context actually used, which may have been shortened
+        answer_cache.put(answer_cache_key(request.question, context_results, compress), answer)
+    annotate(degradations=deadline.degradations)
+    
+    # 3. Format Response
+    return {"answer": answer, "sources": response_sources(context_results), "degradations": deadline.degradations}
+
+@router.post("/query/stream")
+async def query_document_stream(request: QueryRequest, x_traffic_class: Optional[str] = Header(None)):
+    """
+    Like /query, but streams the answer as newline-delimited JSON events:
+    {"event": "sources", "sources": [...]}, then {"event": "token", "text": ...}
+    as the answer is generated, then {"event": "done", "degradations": [...]}
+    (or {"event": "error", "detail": ...} if generation fails part way).
+    The deadline, if any, bounds the time to the first token.
+    """
+    deadline = Deadline(request.deadline_ms)
+    controller = None
+    if settings.ADMISSION_ENABLED:
+        traffic_class = (x_traffic_class or "interactive").lower()
+        if traffic_class not in admission_controllers:
+            raise HTTPException(status_code=400, detail=f"X-Traffic-Class must be one of {', '.join(TRAFFIC_CLASSES)}.")
+        controller = admission_controllers[traffic_class]
+        try:
+            controller.check(max_wait_ms=request.deadline_ms)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is at capacity. Retry later.",
+                headers={"Retry-After": retry_after_header(e.retry_after_s)},
+            )
+
+    async def body():
+        # The slot is taken inside the body, so it is held until the stream ends and released by the
+        # same `async with` however it ends; a response whose body never starts never holds one.
+        admitted = controller.admit(max_wait_ms=request.deadline_ms) if controller is not None else nullcontext()
+        try:
+            async with admitted:
+                async for event in stream_query(request, deadline):
+                    yield json.dumps(event) + "\n"
+        except AdmissionRejected as e:
+            # Shed while queued, after the response started: report it in-band
+            yield json.dumps({
+                "event": "error",
+                "detail": "Server is at capacity. Retry later.",
+                "retry_after_s": int(retry_after_header(e.retry_after_s)),
+            }) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+async def stream_query(request: QueryRequest, deadline: Deadline) -> AsyncIterator[dict]:
+    logger.info("Received streaming query (%d chars)", len(request.question), extra=HOT_PATH)
+    active_trace = start_trace(False)
+    log_entry = start_entry(request.question)
+    try:
+        with span("query_document", deadline_ms=request.deadline_ms or 0, stream=True):
+            async for event in stream_answer_events(request, deadline):
+                yield event
+        annotate(degradations=deadline.degradations)
+        yield {"event": "done", "degradations": deadline.degradations}
+    finally:
+        finish_trace(active_trace)
+        finish_entry(log_entry)
+
+async def stream_answer_events(request: QueryRequest, deadline: Deadline) -> AsyncIterator[dict]:
+    """The events of a streamed answer, following the same steps as answer_query."""
+    context_results = await retrieve_for(request, deadline)
+    if not context_results:
+        yield {"event": "sources", "sources": []}
+        yield {"event": "token", "text": NO_MATCH_ANSWER}
+        return
+
+    compress = request.compress if request.compress is not None else settings.CONTEXT_COMPRESSION_ENABLED
+    cached_answer = answer_cache.get(answer_cache_key(request.question, context_results, compress))
+    annotate(answer_cache_hit=cached_answer is not None)
+    fitted = context_results if cached_answer is not None else fit_context_to_deadline(deadline, context_results)
+    if fitted is not None:
+        context_results = fitted
+    yield {"event": "sources", "sources": response_sources(context_results)}
+    if cached_answer is not None or fitted is None:
+        yield {"event": "token", "text": cached_answer if cached_answer is not None else DEADLINE_FALLBACK_ANSWER}
+        return
+
+    llm_context = prompt_context(request.question, context_results, compress)
+    tokens = stream_answer(request.question, llm_context, hold_chars=STREAM_HOLD_CHARS)
+    parts: List[str] = []
+    with timed_stage("llm"):
+        try:
+            remaining_ms = deadline.remaining_ms()
+            first = await asyncio.wait_for(
+                tokens.__anext__(), timeout=remaining_ms / 1000 if remaining_ms is not None else None
+            )
+            parts.append(first)
+            yield {"event": "token", "text": first}
+            async for text in tokens:
+                parts.append(text)
+                yield {"event": "token", "text": text}
+        except StopAsyncIteration:
+            pass  # Empty answer
+        except asyncio.TimeoutError:
+            deadline.degrade("llm_timeout")
+            yield {"event": "token", "text": DEADLINE_FALLBACK_ANSWER}
+            return
+        except Exception as e:
+            UPSTREAM_ERRORS.labels(provider="groq").inc()
+            logger.error("Error calling LLM: %s", str(e))
+            if parts:
+                yield {"event": "error", "detail": "The answer could not be completed."}
+            else:
+                yield {"event": "token", "text": LLM_ERROR_ANSWER}
+            return
+        finally:
+            await tokens.aclose()
+    answer_cache.put(answer_cache_key(request.question, context_results, compress), "".join(parts))
+
+# --- Admin ---------------------------------------------------------------
+
+from app.services.vector_store import vector_store, INDEX_DIR
+from app.services.store_stats import directory_bytes
+
+@router.get("/stats", response_model=StatsResponse)
+async def store_stats(top: Optional[int] = Query(None, ge=1)):
+    """Size of the live vector store, in total and per document (the `top` largest if given)."""
+    usage = vector_store.usage()
+    faiss_index_bytes, uploads_bytes = await asyncio.gather(
+        asyncio.to_thread(directory_bytes, INDEX_DIR),
+        asyncio.to_thread(directory_bytes, UPLOAD_DIR),
+    )
+    documents = sorted(usage.pop("documents"), key=lambda d: d["vectors"], reverse=True)
+    return {
+        **usage,
+        "disk": {"faiss_index_bytes": faiss_index_bytes, "uploads_bytes": uploads_bytes},
+        "document_count": len(documents),
+        "documents": documents[:top] if top is not None else documents,
+    }
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Admin actions change what every worker serves, so they are off until a token is configured
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them.")
+    if not secrets.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+@router.get("/admin/generations", response_model=GenerationListResponse, dependencies=[Depends(require_admin)])
+async def list_generations():
+    current = vector_store.generation
+    generations = [
+        {**manifest, "current": manifest["generation"] == current}
+        for manifest in vector_store.list_generations()
+    ]
+    return {"current": current, "generations": generations}
+
+@router.post(
+    "/admin/generations/{generation}/rollback",
+    response_model=RollbackResponse,
+    dependencies=[Depends(require_admin)],
+)
+async def rollback_generation(generation: int):
+    try:
+        return await vector_store.rollback(generation)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error("Rollback to generation %s failed: %s", generation, e)
+        raise HTTPException(status_code=409, detail=f"Generation {generation} could not be loaded: {e}")
@@ -1,16 +1,103 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 
 class QueryRequest(BaseModel):
     question: str
+    top_k: Optional[int] = Field(None, ge=1, le=50, description="Number of chunks to retrieve.")
+    nprobe: Optional[int] = Field(None, ge=1, description="IVF lists to probe (higher = better recall, slower).")
+    ef_search: Optional[int] = Field(None, ge=1, description="HNSW search breadth (higher = better recall, slower).")
+    deadline_ms: Optional[int] = Field(
+        None, ge=1,
+        description="End-to-end latency budget. Stages degrade to stay within it."
+    )
+    mmr_lambda: Optional[float] = Field(
+        None, ge=0.0, le=1.0,
+        description="Relevance/diversity trade-off (1.0 = pure relevance). Defaults to server setting."
+    )
+    compress: Optional[bool] = Field(
+        None, description="Send only the sentences most relevant to the question to the LLM. Defaults to server setting."
+    )
 
 class SourceResponse(BaseModel):
     source_file: str
     chunk_id: str
+    duplicate_count: int = 0  # Near-duplicate chunks collapsed into this one at ingestion
+
+class SpanResponse(BaseModel):
+    name: str
+    parent: Optional[str] = None
+    start_ms: float
+    duration_ms: float
+    attributes: Dict[str, Any] = {}
+
+class TraceResponse(BaseModel):
+    trace_id: str
+    spans: List[SpanResponse]
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[SourceResponse]
+    degradations: List[str] = []
+    trace: Optional[TraceResponse] = None
+
+class UploadFileStatus(BaseModel):
+    name: str
+    status: str  # queued, processing, embedded, indexed, failed, empty or skipped
+    chunks: int = 0
+    vectors: int = 0
+    duplicates: int = 0
+    detail: Optional[str] = None
 
 class UploadResponse(BaseModel):
     message: str
+    batch_id: Optional[str] = None
+    files: List[UploadFileStatus] = []
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    status: str  # receiving, queued, processing, committing, complete or failed
+    created_at: float
+    finished_at: Optional[float] = None
+    counts: Dict[str, int]
+    files: List[UploadFileStatus]
+
+class GenerationResponse(BaseModel):
+    generation: int
+    created_at: float
+    vectors: int
+    dimension: Optional[int] = None
+    current: bool = False
+
+class GenerationListResponse(BaseModel):
+    current: int
+    generations: List[GenerationResponse]
+
+class RollbackResponse(BaseModel):
+    generation: int
+    vectors: int
+
+class DocumentStatsResponse(BaseModel):
+    source_file: str
+    vectors: int
+    index_bytes: int
+    metadata_bytes: int
+    duplicate_rows: int
+
+class DiskUsageResponse(BaseModel):
+    faiss_index_bytes: int
+    uploads_bytes: int
+
+class StatsResponse(BaseModel):
+    generation: int
+    index_type: Optional[str] = None
+    dimension: Optional[int] = None
+    memory_mapped: bool
+    vectors: int
+    index_bytes: int
+    metadata_bytes: int
+    duplicate_rows: int
+    tombstoned_rows: int
+    last_save_seconds: float
+    disk: DiskUsageResponse
+    document_count: int
+    documents: List[DocumentStatsResponse]
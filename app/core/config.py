@@ -9,6 +9,10 @@ class Settings(BaseSettings):
     # API Keys (required for production)
     GROQ_API_KEY: str = ""
     JINA_API_KEY: str = ""
+
+    # Upstream endpoints (overridable to point at local mock servers for benchmarking)
+    JINA_API_URL: str = "https://api.jina.ai/v1/embeddings"
+    GROQ_BASE_URL: Optional[str] = None  # None = Groq SDK default
     
     # Data directory (configurable for Fly.io volumes)
     DATA_DIR: str = os.getenv("DATA_DIR", "data")
@@ -16,6 +20,123 @@ class Settings(BaseSettings):
     # Server configuration
     PORT: int = int(os.getenv("PORT", "8000"))
 
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    LOG_HOT_PATH_SAMPLE_RATE: float = 0.1  # Fraction of per-request INFO events kept
+    LOG_QUEUE_SIZE: int = 10000  # Records beyond this are dropped rather than blocking
+
+    # Vector index
+    EMBEDDING_DIMENSION: int = 1024  # jina-embeddings-v3 Matryoshka size (32-1024); migrate with app.tools.migrate_dimension
+    FAISS_INDEX_FACTORY: str = "Flat"  # faiss.index_factory string, e.g. "HNSW32" or "IVF1024,Flat"
+    DEFAULT_NPROBE: int = 16  # IVF lists probed per query
+    DEFAULT_EF_SEARCH: int = 64  # HNSW candidate list size per query
+    INDEX_MMAP: bool = False  # Memory-map the persisted index read-only (shared across workers)
+    INDEX_RELOAD_INTERVAL_S: float = 2.0  # How often workers check for a newer index generation
+    INDEX_KEEP_GENERATIONS: int = 5  # Snapshots kept on disk for rollback
+    ADMIN_TOKEN: Optional[str] = None  # Required in X-Admin-Token for /api/admin/*, which are disabled while unset
+    INDEX_BOOTSTRAP_BUNDLE: Optional[str] = None  # Index bundle imported at startup when the store is empty (see app.tools.index_bundle)
+
+    # Retrieval
+    DEFAULT_TOP_K: int = 5
+    EMBEDDING_CACHE_SIZE: int = 2048  # Query embeddings kept in memory (0 disables)
+    HYBRID_SEARCH_ENABLED: bool = True  # Fuse BM25 and vector results with RRF
+    RRF_K: int = 60  # Reciprocal rank fusion damping constant
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    EMBEDDING_LATENCY_BUDGET_MS: int = 2000  # Fall back to lexical-only results past this
+    MMR_ENABLED: bool = True  # Diversify results with maximal marginal relevance
+    MMR_LAMBDA: float = 0.7  # 1.0 = pure relevance, 0.0 = maximum diversity
+    MMR_FETCH_MULTIPLIER: int = 4  # Candidate pool size = top_k * multiplier
+    TWO_STAGE_ENABLED: bool = True  # Search only the chunks of the documents with the nearest centroids
+    TWO_STAGE_MIN_DOCUMENTS: int = 200  # Below this many documents, search every chunk
+    TWO_STAGE_TOP_DOCUMENTS: int = 16  # Documents searched per query (see benchmarks/two_stage_bench.py)
+
+    # Ingestion pipeline (extract -> chunk -> embed -> index, connected by bounded queues)
+    INGEST_EMBED_BATCH_SIZE: int = 64  # Chunks per embedding request
+    INGEST_EMBED_CONCURRENCY: int = 2  # Embedding requests in flight per upload
+    INGEST_QUEUE_SIZE: int = 4  # Items buffered between stages before the upstream stage waits
+    INGEST_COMMIT_INTERVAL_S: float = 2.0  # Min time between index generations published by one upload
+    INGEST_COMMIT_MAX_SAVE_SHARE: float = 0.25  # Stretch that interval so snapshot writes take at most this share of an upload's time
+
+    # Multi-file and archive uploads (see app.services.upload_batch)
+    UPLOAD_BATCH_CONCURRENCY: int = 4  # Files of one upload ingested in parallel
+    UPLOAD_MAX_FILES: int = 1000  # Documents accepted per upload, archive members included
+    UPLOAD_MAX_ARCHIVE_BYTES: int = 2 * 1024**3  # Uncompressed bytes unpacked per archive (zip bomb guard)
+    UPLOAD_BATCH_HISTORY: int = 500  # Batch status files kept in data/batches
+
+    # Extractive context compression before generation
+    CONTEXT_COMPRESSION_ENABLED: bool = False  # Default for requests that do not set "compress"
+    CONTEXT_COMPRESSION_RATIO: float = 0.4  # Target share of retrieved characters sent to the LLM
+    CONTEXT_COMPRESSION_NEIGHBORS: int = 1  # Sentences kept on each side of a selected sentence
+    CONTEXT_COMPRESSION_MIN_CHARS: int = 1500  # Shorter contexts are sent as is
+
+    # LLM model tiers: cheap questions go to the small model, the rest (and low-confidence answers) to the large one
+    LLM_ROUTING_ENABLED: bool = False  # True = short lookup questions answered by LLM_SMALL_MODEL
+    LLM_SMALL_MODEL: str = "llama-3.1-8b-instant"
+    LLM_LARGE_MODEL: str = "llama-3.3-70b-versatile"
+    LLM_ROUTER_MAX_QUESTION_WORDS: int = 15  # Longer questions go to the large model
+    LLM_ROUTER_MAX_CONTEXT_CHARS: int = 6000  # Larger prompts go to the large model
+    LLM_ROUTER_MIN_SCORE_MARGIN: float = 0.15  # Top retrieval score vs the rest; below this the evidence is ambiguous
+    LLM_ESCALATION_MIN_ANSWER_CHARS: int = 20  # Shorter small-model answers are regenerated by the large model
+    # USD per million tokens, only used to estimate what routing saves (rag_llm_small_tier_savings_total)
+    LLM_SMALL_PRICE_PER_M_INPUT: float = 0.05
+    LLM_SMALL_PRICE_PER_M_OUTPUT: float = 0.08
+    LLM_LARGE_PRICE_PER_M_INPUT: float = 0.59
+    LLM_LARGE_PRICE_PER_M_OUTPUT: float = 0.79
+
+    # Hedged requests on the query path (question embedding, LLM time to first token)
+    HEDGING_ENABLED: bool = False
+    HEDGE_PERCENTILE: float = 95.0  # A call slower than this percentile of recent calls gets a duplicate
+    HEDGE_MIN_DELAY_MS: float = 50.0  # Never hedge sooner than this
+    HEDGE_WINDOW: int = 1000  # Recent latencies per call type the delay is computed from
+    HEDGE_MIN_SAMPLES: int = 50  # No hedging until this many calls have been seen
+    HEDGE_BUDGET_RATIO: float = 0.05  # Average hedges per call allowed; bounds the extra upstream load
+    HEDGE_BUDGET_BURST: int = 10  # Hedges that can be sent back to back once budget has built up
+
+    # Near-duplicate chunk collapsing at ingestion (MinHash LSH)
+    DEDUP_ENABLED: bool = True
+    DEDUP_THRESHOLD: float = 0.85  # Estimated Jaccard similarity of word shingles to count as a duplicate
+    DEDUP_NUM_PERM: int = 128  # MinHash signature length
+    DEDUP_BANDS: int = 16  # LSH bands (NUM_PERM must divide evenly); more bands = more candidates
+    DEDUP_SHINGLE_SIZE: int = 5  # Words per shingle
+    DEDUP_MAX_SOURCE_REFS: int = 8  # Other documents cited per stored chunk; further copies are only counted
+    DEDUP_RESPONSE_REFS: int = 3  # Of those, how many a query response lists per retrieved chunk
+
+    # Query log, answer cache and warm-up
+    QUERY_LOG_ENABLED: bool = True  # Append question, retrieved chunks and stage latencies to data/query_log/
+    QUERY_LOG_BATCH_SIZE: int = 256  # Entries per write
+    QUERY_LOG_FLUSH_INTERVAL_S: float = 1.0  # Max delay before a partial batch is written
+    QUERY_LOG_MAX_BYTES: int = 50 * 1024 * 1024  # Roll the active file past this size
+    ANSWER_CACHE_SIZE: int = 512
+    WARMUP_TOP_QUESTIONS: int = 20  # Most frequent logged questions answered at startup (0 disables)
+    WARMUP_LOOKBACK_HOURS: float = 24 * 7
+    WARMUP_INTERVAL_S: float = 0  # Repeat the warm-up this often (0 = startup only)
+
+    # Traffic capture for replay (benchmarks/replay.py)
+    TRAFFIC_CAPTURE_ENABLED: bool = False  # Record /api/query and /api/upload requests, payloads included, to data/traffic/
+    TRAFFIC_CAPTURE_MAX_BODY_BYTES: int = 10 * 1024 * 1024  # Larger bodies are recorded by size only and skipped on replay
+    TRAFFIC_CAPTURE_MAX_FILE_BYTES: int = 500 * 1024 * 1024  # Roll the active capture file past this size
+
+    # Admission control for /api/query, per worker process (X-Traffic-Class: interactive | batch)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_INTERACTIVE_CONCURRENCY: int = 32
+    ADMISSION_INTERACTIVE_QUEUE: int = 64
+    ADMISSION_INTERACTIVE_MAX_WAIT_MS: int = 5000  # Shed instead of queueing longer than this
+    ADMISSION_BATCH_CONCURRENCY: int = 4
+    ADMISSION_BATCH_QUEUE: int = 256
+    ADMISSION_BATCH_MAX_WAIT_MS: int = 30000
+
+    # Deadline allocation (fractions of a request's deadline_ms; the LLM gets the rest)
+    DEADLINE_EMBEDDING_SHARE: float = 0.2
+    DEADLINE_SEARCH_SHARE: float = 0.1
+    DEADLINE_MIN_LLM_MS: int = 300  # Skip generation if less than this remains
+
+    # Tracing (opt-in per request via X-Trace header or ?trace=true)
+    TRACE_SAMPLE_RATE: float = 0.01  # Fraction of other queries traced in the background
+    TRACE_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    TRACE_LOG_BACKUPS: int = 5
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
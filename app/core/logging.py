@@ -1,12 +1,108 @@
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 
-def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)]
-    )
-    logger = logging.getLogger("rag_app")
-    logger.info("Logging setup complete.")
-    return logger
+# Correlation id of the request being handled (set by the request middleware)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Pass as `extra=HOT_PATH` on chatty per-request events so they are sampled
+HOT_PATH = {"hot_path": True}
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+class JsonFormatter(logging.Formatter):
+    """Renders records as one JSON object per line, including `extra=` fields."""
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and key != "hot_path":
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s")
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the caller's request id on the record before it crosses threads."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class HotPathSampler(logging.Filter):
+    """Keeps only a fraction of hot-path records below WARNING."""
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "hot_path", False):
+            return True
+        return random.random() < self.rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without formatting them first, and
+    drops (and counts) records instead of blocking when the queue is full.
+    """
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting (including %-args) happens on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+def setup_logging() -> logging.Logger:
+    """
+    Configures application logging once per process: callers only enqueue
+    records, and a background listener thread formats and writes them to
+    stdout. Safe to call repeatedly.
+    """
+    global _listener
+    if _listener is None:
+        from app.core.config import settings
+
+        log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(RequestContextFilter())
+        queue_handler.addFilter(HotPathSampler(settings.LOG_HOT_PATH_SAMPLE_RATE))
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+        root = logging.getLogger()
+        root.handlers = [queue_handler]
+        root.setLevel(settings.LOG_LEVEL)
+        # httpx logs every upstream request at INFO, which is per-query noise
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)  # Flush queued records on shutdown
+
+        logging.getLogger("rag_app").info("Logging setup complete.")
+    return logging.getLogger("rag_app")
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
@@ -0,0 +1,84 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets span sub-millisecond in-process work up to slow upstream calls (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Query path
+EMBEDDING_LATENCY = Histogram(
+    "rag_embedding_seconds", "Jina embedding API call latency", buckets=LATENCY_BUCKETS
+)
+SEARCH_LATENCY = Histogram(
+    "rag_search_seconds", "Index search latency", ["kind"], buckets=LATENCY_BUCKETS
+)
+CONTEXT_ASSEMBLY_LATENCY = Histogram(
+    "rag_context_assembly_seconds", "Time to build the LLM context and prompt", buckets=LATENCY_BUCKETS
+)
+CONTEXT_CHARS = Counter(
+    "rag_context_chars_total", "Characters of chunk text retrieved for, and sent to, the LLM",
+    ["stage"],  # "retrieved" or "sent" (after context compression)
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_llm_time_to_first_token_seconds", "Time until the LLM streams its first token",
+    ["tier"], buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "rag_llm_seconds", "Total LLM generation latency", ["tier"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total", "Tokens billed by the LLM", ["tier", "kind"]  # kind: "prompt" or "completion"
+)
+LLM_ROUTED = Counter(
+    "rag_llm_routed_total", "Answers routed to each model tier",
+    ["tier", "reason"],  # reason: the feature that ruled out the small model, or "simple"
+)
+LLM_ESCALATIONS = Counter(
+    "rag_llm_escalations_total", "Small-model answers regenerated by the large model",
+    ["reason"],  # "refusal", "short" or "error"
+)
+LLM_ESCALATION_TOKENS = Counter(
+    "rag_llm_escalation_tokens_total", "Small-model tokens spent on answers that were then escalated"
+)
+LLM_SAVINGS = Counter(
+    "rag_llm_small_tier_savings_total", "Estimated savings of small-model answers over generating them with the large model",
+    ["kind"],  # "cost_usd" (both tiers' token prices) or "seconds" (the large tier's recent speed)
+)
+LLM_ESCALATION_WASTE = Counter(
+    "rag_llm_escalation_waste_total", "Estimated small-model cost and time spent on answers that were then escalated",
+    ["kind"],  # "cost_usd" or "seconds"
+)
+
+HEDGE_REQUESTS = Counter(
+    "rag_hedge_requests_total", "Hedgeable upstream calls by outcome",
+    ["call", "outcome"],  # outcome: "fast", "warming_up", "budget_exhausted", "primary_won", "hedge_won" or "failed"
+)
+HEDGE_DELAY = Gauge("rag_hedge_delay_seconds", "Current delay before a slow call is hedged", ["call"])
+
+# Admission control
+ADMISSION_QUEUE_WAIT = Histogram(
+    "rag_admission_queue_wait_seconds", "Time a query waited for a concurrency slot",
+    ["traffic_class"], buckets=LATENCY_BUCKETS
+)
+ADMISSION_QUEUE_DEPTH = Gauge("rag_admission_queue_depth", "Queries waiting for a concurrency slot", ["traffic_class"])
+ADMISSION_REJECTED = Counter(
+    "rag_admission_rejected_total", "Queries shed with 503", ["traffic_class", "reason"]
+)
+
+# Ingestion
+INGESTION_STAGE_LATENCY = Histogram(
+    "rag_ingestion_stage_seconds", "Ingestion latency per pipeline stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+INGESTION_DOCUMENT_LATENCY = Histogram(
+    "rag_ingestion_document_seconds", "Time from the start of an upload's ingestion to a milestone",
+    ["milestone"], buckets=LATENCY_BUCKETS  # "first_searchable" (first batch committed) or "complete"
+)
+DUPLICATE_CHUNKS = Counter(
+    "rag_ingestion_duplicate_chunks_total",
+    "Chunks collapsed into an existing vector instead of being embedded and indexed",
+    ["match"],  # "document" (earlier chunk of the same upload) or "corpus" (already indexed)
+)
+
+# State
+INDEX_SIZE = Gauge("rag_index_vectors", "Number of vectors in the FAISS index")
+IN_FLIGHT = Gauge("rag_requests_in_flight", "Requests currently being processed", ["endpoint"])
+CACHE_REQUESTS = Counter("rag_cache_requests_total", "Cache lookups", ["cache", "result"])
+UPSTREAM_ERRORS = Counter("rag_upstream_errors_total", "Failed upstream API calls", ["provider"])
@@ -0,0 +1,158 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.logging import NonBlockingQueueHandler
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+TRACE_DIR = os.path.join(settings.DATA_DIR, "traces")
+TRACE_FILE = os.path.join(TRACE_DIR, "traces.jsonl")
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+class Trace:
+    """Spans recorded for one request, exportable as a timing breakdown or OTLP JSON."""
+    def __init__(self, requested: bool):
+        self.trace_id = secrets.token_hex(16)
+        self.requested = requested  # Asked for by the caller (vs. background sampling)
+        self.spans: List[Span] = []
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """Per-span timings relative to the start of the request, in start order."""
+        if not self.spans:
+            return []
+        origin = min(s.start_ns for s in self.spans)
+        names = {s.span_id: s.name for s in self.spans}
+        return [
+            {
+                "name": s.name,
+                "parent": names.get(s.parent_id),
+                "start_ms": round((s.start_ns - origin) / 1e6, 3),
+                "duration_ms": round(s.duration_ms, 3),
+                "attributes": s.attributes,
+            }
+            for s in sorted(self.spans, key=lambda s: s.start_ns)
+        ]
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Serializes the trace in OTLP/JSON (the OpenTelemetry file exporter format)."""
+        def attr(key, value):
+            if isinstance(value, bool):
+                typed = {"boolValue": value}
+            elif isinstance(value, int):
+                typed = {"intValue": str(value)}
+            elif isinstance(value, float):
+                typed = {"doubleValue": value}
+            else:
+                typed = {"stringValue": str(value)}
+            return {"key": key, "value": typed}
+
+        spans = [
+            {
+                "traceId": self.trace_id,
+                "spanId": s.span_id,
+                **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                "name": s.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": [attr(k, v) for k, v in s.attributes.items()],
+            }
+            for s in self.spans
+        ]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [attr("service.name", settings.PROJECT_NAME)]},
+                "scopeSpans": [{"scope": {"name": "rag_app"}, "spans": spans}],
+            }]
+        }
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Records a span under the current trace. A no-op (yields None) when the
+    request is not being traced, so it is safe to leave on the hot path.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attributes)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+def set_span_attribute(key: str, value: Any):
+    """Adds an attribute to the innermost active span, if any."""
+    current = _current_span.get()
+    if current is not None and _current_trace.get() is not None:
+        current.attributes[key] = value
+
+def start_trace(requested: bool) -> Optional[Trace]:
+    """
+    Begins tracing the current request if the caller asked for it or it is
+    picked by TRACE_SAMPLE_RATE. Returns None when the request is not traced.
+    """
+    if not requested and random.random() >= settings.TRACE_SAMPLE_RATE:
+        return None
+    trace = Trace(requested)
+    _current_trace.set(trace)
+    return trace
+
+_trace_logger: Optional[logging.Logger] = None
+
+def _get_trace_logger() -> logging.Logger:
+    global _trace_logger
+    if _trace_logger is None:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        handler = RotatingFileHandler(
+            TRACE_FILE, maxBytes=settings.TRACE_LOG_MAX_BYTES, backupCount=settings.TRACE_LOG_BACKUPS
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        # File writes happen on a listener thread, like the application log
+        trace_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        listener = QueueListener(trace_queue, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        _trace_logger = logging.getLogger("rag_app.traces")
+        _trace_logger.addHandler(NonBlockingQueueHandler(trace_queue))
+        _trace_logger.setLevel(logging.INFO)
+        _trace_logger.propagate = False  # Keep span dumps out of the application log
+    return _trace_logger
+
+def finish_trace(trace: Optional[Trace]):
+    """Ends tracing for the current request and appends the trace to the trace log."""
+    if trace is None:
+        return
+    _current_trace.set(None)
+    _get_trace_logger().info(json.dumps(trace.to_otlp(), separators=(",", ":")))
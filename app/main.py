@@ -1,7 +1,17 @@
-from fastapi import FastAPI
+import asyncio
+import time
+import uuid
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.core.config import settings
-from app.core.logging import setup_logging
-from app.api.routes import router
+from app.core.logging import setup_logging, request_id_var
+from app.core.metrics import IN_FLIGHT
+from app.api.routes import router, answer_query
+from app.api.schemas import QueryRequest
+from app.services.bundle import import_bundle
+from app.services.deadline import Deadline
+from app.services.traffic_capture import record_request, should_capture
+from app.services.warmup import warm_caches
 
 logger = setup_logging()
 
@@ -16,11 +26,97 @@ async def startup_event():
     # Validate API keys
     missing_keys = settings.validate_api_keys()
     if missing_keys:
-        logger.warning(f"Missing API keys: {', '.join(missing_keys)}. Some features may not work.")
+        logger.warning("Missing API keys: %s. Some features may not work.", ", ".join(missing_keys))
     
     # Load FAISS index
     vector_store.load_index()
-    logger.info(f"Data directory: {settings.DATA_DIR}")
+    logger.info("Data directory: %s", settings.DATA_DIR)
+
+    # Warm-start an empty replica from a prebuilt index bundle
+    if settings.INDEX_BOOTSTRAP_BUNDLE and (vector_store.index is None or vector_store.index.ntotal == 0):
+        try:
+            await asyncio.to_thread(import_bundle, vector_store, settings.INDEX_BOOTSTRAP_BUNDLE)
+        except FileExistsError:
+            logger.info("Another worker already populated the index; skipping bundle import.")
+        except Exception as e:
+            logger.error("Could not import index bundle %s: %s", settings.INDEX_BOOTSTRAP_BUNDLE, e)
+
+    # Pick up index generations published by other workers
+    app.state.index_watcher = asyncio.create_task(watch_index_generations())
+
+    # Pre-compute embeddings and answers for the most popular questions
+    if settings.WARMUP_TOP_QUESTIONS > 0:
+        app.state.cache_warmer = asyncio.create_task(warm_caches_periodically())
+
+async def watch_index_generations():
+    while True:
+        await asyncio.sleep(settings.INDEX_RELOAD_INTERVAL_S)
+        try:
+            await vector_store.refresh_if_stale()
+        except Exception as e:
+            logger.error("Failed to reload index generation: %s", e)
+
+async def warm_caches_periodically():
+    async def answer_question(question: str):
+        await answer_query(QueryRequest(question=question), Deadline())
+
+    while True:
+        try:
+            await warm_caches(answer_question, settings.WARMUP_TOP_QUESTIONS)
+        except Exception as e:
+            logger.error("Cache warm-up failed: %s", e)
+        if settings.WARMUP_INTERVAL_S <= 0:
+            return
+        await asyncio.sleep(settings.WARMUP_INTERVAL_S)
+
+@app.middleware("http")
+async def capture_traffic(request: Request, call_next):
+    # Registered first so it runs innermost, inside the request id context
+    if not should_capture(request.url.path):
+        return await call_next(request)
+    started_at = time.time()
+    start = time.perf_counter()
+    declared = int(request.headers.get("content-length") or 0)
+    body = await request.body() if declared <= settings.TRAFFIC_CAPTURE_MAX_BODY_BYTES else None
+    body_bytes = len(body) if body is not None else declared
+    if body_bytes > settings.TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+        body = None
+    response = await call_next(request)
+    record_request(
+        request.method, request.url.path, request.headers, body, body_bytes,
+        started_at, response.status_code, (time.perf_counter() - start) * 1000,
+    )
+    return response
+
+# Endpoints whose concurrency is exported as rag_requests_in_flight
+IN_FLIGHT_ENDPOINTS = {
+    "/api/query": IN_FLIGHT.labels(endpoint="query"),
+    "/api/upload": IN_FLIGHT.labels(endpoint="upload"),
+}
+
+@app.middleware("http")
+async def track_in_flight(request: Request, call_next):
+    gauge = IN_FLIGHT_ENDPOINTS.get(request.url.path)
+    if gauge is None:
+        return await call_next(request)
+    with gauge.track_inprogress():
+        return await call_next(request)
+
+@app.middleware("http")
+async def correlate_request(request: Request, call_next):
+    # Reuse the caller's id when given so logs line up across services
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 app.include_router(router, prefix="/api")
 
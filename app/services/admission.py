@@ -0,0 +1,145 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED
+
+logger = get_logger(__name__)
+
+TRAFFIC_CLASSES = ("interactive", "batch")
+
+class AdmissionRejected(Exception):
+    def __init__(self, traffic_class: str, reason: str, retry_after_s: float):
+        super().__init__(f"{traffic_class} request rejected: {reason}")
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+class AdmissionController:
+    """
+    Per-process concurrency limiter with a bounded FIFO wait queue.
+
+    Requests beyond `max_concurrent` wait for a slot, but are turned away up
+    front if the queue is full or their estimated wait (queue position times
+    the recent average service time, divided across slots) would exceed
+    `max_wait_ms`, so clients get a fast 503 instead of a late answer. Anyone
+    still waiting after `max_wait_ms` is rejected too.
+    """
+    def __init__(self, traffic_class: str, max_concurrent: int, max_queue: int, max_wait_ms: float):
+        self.traffic_class = traffic_class
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_ms = max_wait_ms
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.avg_service_s = 1.0  # EWMA of time a request holds a slot; seeded pessimistically
+        self._queue_wait = ADMISSION_QUEUE_WAIT.labels(traffic_class=traffic_class)
+        ADMISSION_QUEUE_DEPTH.labels(traffic_class=traffic_class).set_function(lambda: len(self.waiters))
+
+    def estimated_wait_s(self, position: int) -> float:
+        return (position + 1) * self.avg_service_s / self.max_concurrent
+
+    def _reject(self, reason: str, retry_after_s: float):
+        ADMISSION_REJECTED.labels(traffic_class=self.traffic_class, reason=reason).inc()
+        logger.warning("Shedding %s request: %s (queue %s)", self.traffic_class, reason, len(self.waiters))
+        raise AdmissionRejected(self.traffic_class, reason, retry_after_s)
+
+    def _wait_limit_ms(self, max_wait_ms: Optional[float]) -> float:
+        return min(self.max_wait_ms, max_wait_ms or self.max_wait_ms)
+
+    def _shed_early(self, max_wait_ms: float):
+        """Rejects a request that would have to queue if the queue is full or the wait too long."""
+        position = len(self.waiters)
+        estimate_s = self.estimated_wait_s(position)
+        if position >= self.max_queue:
+            self._reject("queue_full", estimate_s)
+        if estimate_s * 1000 > max_wait_ms:
+            self._reject("queue_wait", estimate_s)
+
+    def check(self, max_wait_ms: Optional[float] = None):
+        """
+        Raises AdmissionRejected if a request arriving now would be shed up
+        front, without taking a slot or a place in the queue. Lets streamed
+        responses answer 503 before they start, while the slot itself is only
+        taken once the stream body runs.
+        """
+        if self.active < self.max_concurrent and not self.waiters:
+            return
+        self._shed_early(self._wait_limit_ms(max_wait_ms))
+
+    async def _acquire(self, max_wait_ms: float):
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+            return
+
+        self._shed_early(max_wait_ms)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=max_wait_ms / 1000)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return  # A slot was handed over just as the wait expired
+            self._discard(waiter)
+            self._reject("wait_timeout", self.estimated_wait_s(len(self.waiters)))
+        except asyncio.CancelledError:
+            # Client went away; pass on a slot we may have just been given
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                self._discard(waiter)
+            raise
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _release(self):
+        # Hand the slot straight to the oldest live waiter so it cannot be overtaken
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self, max_wait_ms: Optional[float] = None):
+        """
+        Holds a slot for the duration of the block. `max_wait_ms` (e.g. the
+        request's own deadline) can only tighten the configured wait limit.
+        Raises AdmissionRejected when shedding.
+        """
+        queued_at = time.perf_counter()
+        await self._acquire(self._wait_limit_ms(max_wait_ms))
+        started = time.perf_counter()
+        self._queue_wait.observe(started - queued_at)
+        try:
+            yield
+        finally:
+            self.avg_service_s = 0.9 * self.avg_service_s + 0.1 * (time.perf_counter() - started)
+            self._release()
+
+admission_controllers: Dict[str, AdmissionController] = {
+    "interactive": AdmissionController(
+        "interactive",
+        settings.ADMISSION_INTERACTIVE_CONCURRENCY,
+        settings.ADMISSION_INTERACTIVE_QUEUE,
+        settings.ADMISSION_INTERACTIVE_MAX_WAIT_MS,
+    ),
+    "batch": AdmissionController(
+        "batch",
+        settings.ADMISSION_BATCH_CONCURRENCY,
+        settings.ADMISSION_BATCH_QUEUE,
+        settings.ADMISSION_BATCH_MAX_WAIT_MS,
+    ),
+}
+
+def retry_after_header(retry_after_s: float) -> str:
+    return str(max(1, math.ceil(retry_after_s)))
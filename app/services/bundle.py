@@ -0,0 +1,238 @@
+"""
+Portable index bundles: the whole vector store as one self-describing tar
+file, for warm-starting replicas without re-embedding every upload.
+
+Members, in order (so import can stream and reject early):
+
+    bundle.json     format version, embedding model, dimension, counts
+    vectors.f32     every vector in id order, little-endian float32 rows
+    chunks.jsonl    one JSON object per stored chunk: vector_id plus its metadata
+    checksums.json  sha256 of the three members above
+
+Vectors and chunks are stored in plain formats rather than FAISS or pickle
+files, so a bundle does not depend on the exporter's library versions or
+FAISS_INDEX_FACTORY: the importer builds its own index type and rebuilds the
+lexical, near-duplicate and centroid indexes. A name ending in .gz or .tgz
+is gzip-compressed.
+"""
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+from typing import Any, Dict, Iterator
+import faiss
+import numpy as np
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.embeddings import EMBEDDING_MODEL
+from app.services.vector_store import VectorStore, build_index
+
+logger = get_logger(__name__)
+
+BUNDLE_FORMAT = "nexusrag-index-bundle"
+BUNDLE_VERSION = 1
+
+HEADER_MEMBER = "bundle.json"
+VECTORS_MEMBER = "vectors.f32"
+CHUNKS_MEMBER = "chunks.jsonl"
+CHECKSUMS_MEMBER = "checksums.json"
+
+# Vectors read and added per step on import; the first block also trains IVF indexes
+IMPORT_BLOCK_ROWS = 16384
+
+class BundleMismatch(ValueError):
+    """The bundle is valid but was built for a different model, dimension or format version."""
+
+class _StreamReader(io.RawIOBase):
+    """File-like view of an iterator of byte blocks, for tarfile.addfile."""
+    def __init__(self, blocks: Iterator[bytes]):
+        self.blocks = blocks
+        self.pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending:
+            try:
+                self.pending = next(self.blocks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+def _compression(path: str) -> str:
+    return "gz" if path.endswith((".gz", ".tgz")) else ""
+
+def _add_member(tar: tarfile.TarFile, name: str, size: int, fileobj):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(time.time())
+    tar.addfile(info, fileobj)
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes):
+    _add_member(tar, name, len(data), io.BytesIO(data))
+
+# --- Export ---------------------------------------------------------------
+
+def export_bundle(store: VectorStore, path: str) -> Dict[str, Any]:
+    """
+    Writes the store's current state to a bundle at `path` (atomically, via
+    a temp file next to it). Returns the bundle header.
+    """
+    if store.index is None or store.index.ntotal == 0:
+        raise ValueError("The vector store is empty; nothing to export")
+
+    header = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        "dimension": store.dimension,
+        "vectors": store.index.ntotal,
+        "chunks": len(store.metadata),
+        "source_generation": store.generation,
+        "created_at": time.time(),
+    }
+    header_bytes = json.dumps(header, indent=2).encode("utf-8")
+    checksums = {HEADER_MEMBER: hashlib.sha256(header_bytes).hexdigest()}
+
+    vectors_hash = hashlib.sha256()
+
+    def vector_blocks() -> Iterator[bytes]:
+        for block in store.iter_vectors():
+            data = np.ascontiguousarray(block, dtype="<f4").tobytes()
+            vectors_hash.update(data)
+            yield data
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with tarfile.open(tmp_path, f"w|{_compression(path)}") as tar, tempfile.TemporaryFile() as chunks_file:
+            _add_bytes(tar, HEADER_MEMBER, header_bytes)
+            _add_member(tar, VECTORS_MEMBER, store.index.ntotal * store.dimension * 4, _StreamReader(vector_blocks()))
+            checksums[VECTORS_MEMBER] = vectors_hash.hexdigest()
+
+            # Chunk lines are spooled first because tar needs each member's size up front
+            chunks_hash = hashlib.sha256()
+            for vector_id in sorted(store.metadata):
+                line = json.dumps({"vector_id": vector_id, **store.metadata[vector_id]}, separators=(",", ":")).encode("utf-8") + b"\n"
+                chunks_hash.update(line)
+                chunks_file.write(line)
+            checksums[CHUNKS_MEMBER] = chunks_hash.hexdigest()
+            size = chunks_file.tell()
+            chunks_file.seek(0)
+            _add_member(tar, CHUNKS_MEMBER, size, chunks_file)
+
+            _add_bytes(tar, CHECKSUMS_MEMBER, json.dumps(checksums, indent=2).encode("utf-8"))
+    except BaseException:
+        # Leave nothing half-written behind (I/O error, or the store changed under the export)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    logger.info("Exported %s vectors (generation %s) to bundle %s", header["vectors"], store.generation, path)
+    return header
+
+# --- Import ---------------------------------------------------------------
+
+def check_header(header: Dict[str, Any]):
+    """Raises BundleMismatch unless this build can serve the bundle as is."""
+    if header.get("format") != BUNDLE_FORMAT:
+        raise BundleMismatch("Not an index bundle")
+    if header.get("version", 0) > BUNDLE_VERSION:
+        raise BundleMismatch(f"Bundle format version {header['version']} is newer than supported ({BUNDLE_VERSION})")
+    if header.get("embedding_model") != EMBEDDING_MODEL:
+        raise BundleMismatch(
+            f"Bundle was embedded with {header.get('embedding_model')}, but this build uses {EMBEDDING_MODEL}"
+        )
+    if header.get("dimension") != settings.EMBEDDING_DIMENSION:
+        raise BundleMismatch(
+            f"Bundle dimension {header.get('dimension')} does not match EMBEDDING_DIMENSION {settings.EMBEDDING_DIMENSION}"
+        )
+
+def _next_member(tar: tarfile.TarFile, name: str) -> tarfile.TarInfo:
+    member = tar.next()
+    if member is None or member.name != name:
+        raise ValueError(f"Malformed bundle: expected {name}, found {member.name if member else 'end of archive'}")
+    return member
+
+def _read_exactly(f, size: int) -> bytes:
+    parts = []
+    while size > 0:
+        data = f.read(size)
+        if not data:
+            break
+        parts.append(data)
+        size -= len(data)
+    return b"".join(parts)
+
+def _read_index(f, header: Dict[str, Any], digest) -> faiss.Index:
+    dimension, total = header["dimension"], header["vectors"]
+    row_bytes = dimension * 4
+    index = None
+    read = 0
+    while read < total:
+        rows = min(IMPORT_BLOCK_ROWS, total - read)
+        data = _read_exactly(f, rows * row_bytes)
+        if len(data) != rows * row_bytes:
+            raise ValueError("Malformed bundle: vectors member is truncated")
+        digest.update(data)
+        block = np.frombuffer(data, dtype="<f4").reshape(rows, dimension).astype(np.float32)
+        if index is None:
+            index = build_index(dimension, block)
+        index.add(block)
+        read += rows
+    return index
+
+def import_bundle(store: VectorStore, path: str, replace: bool = False) -> Dict[str, Any]:
+    """
+    Streams a bundle into a new index generation. The header is checked
+    before anything else is read, and nothing is published unless every
+    member matches its checksum. Raises BundleMismatch for bundles built for
+    another model or dimension, FileExistsError if the store already has
+    vectors and `replace` is not set, ValueError for corrupt bundles.
+    """
+    if not replace and store.has_published_vectors():
+        raise FileExistsError("The vector store already has vectors; pass replace to overwrite it")
+
+    start = time.perf_counter()
+    digests = {name: hashlib.sha256() for name in (HEADER_MEMBER, VECTORS_MEMBER, CHUNKS_MEMBER)}
+    with tarfile.open(path, "r|*") as tar:
+        # 1. Header: reject mismatched bundles before reading the bulk
+        header_bytes = tar.extractfile(_next_member(tar, HEADER_MEMBER)).read()
+        digests[HEADER_MEMBER].update(header_bytes)
+        header = json.loads(header_bytes)
+        check_header(header)
+
+        # 2. Vectors, added to a fresh index block by block
+        member = _next_member(tar, VECTORS_MEMBER)
+        if member.size != header["vectors"] * header["dimension"] * 4:
+            raise ValueError("Malformed bundle: vectors member size does not match the header")
+        index = _read_index(tar.extractfile(member), header, digests[VECTORS_MEMBER])
+
+        # 3. Chunk metadata
+        metadata: Dict[int, Dict[str, Any]] = {}
+        for line in tar.extractfile(_next_member(tar, CHUNKS_MEMBER)):
+            digests[CHUNKS_MEMBER].update(line)
+            meta = json.loads(line)
+            metadata[meta.pop("vector_id")] = meta
+
+        # 4. Checksums
+        checksums = json.loads(tar.extractfile(_next_member(tar, CHECKSUMS_MEMBER)).read())
+
+    for name, digest in digests.items():
+        if checksums.get(name) != digest.hexdigest():
+            raise ValueError(f"Bundle checksum mismatch for {name}")
+    if len(metadata) != header["chunks"] or (metadata and max(metadata) >= index.ntotal):
+        raise ValueError("Bundle chunk store does not match its vectors")
+
+    generation = store.import_state(index, metadata, replace=replace)
+    logger.info(
+        "Imported bundle %s as generation %s: %s vectors, %s chunks in %.1fs",
+        path, generation, index.ntotal, len(metadata), time.perf_counter() - start
+    )
+    return {**header, "generation": generation}
@@ -0,0 +1,64 @@
+from array import array
+from typing import Dict, List, Optional
+import faiss
+import numpy as np
+
+class DocumentCentroids:
+    """
+    One centroid vector per document (the normalized mean of its chunk
+    vectors) plus the vector ids of its chunks, for coarse-to-fine search:
+    pick the documents whose centroids are closest to the query, then only
+    search their chunks.
+
+    Centroids are updated incrementally from running sums as chunks are
+    added; the stacked centroid matrix is rebuilt lazily after changes.
+    """
+    def __init__(self):
+        self.sums: Dict[str, np.ndarray] = {}  # document -> float64 sum of chunk vectors
+        self.counts: Dict[str, int] = {}
+        self.vector_ids: Dict[str, array] = {}  # document -> int64 vector ids of its chunks
+        self._documents: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.sums)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_documents"], state["_matrix"] = [], None  # Derived; rebuilt on first search
+        return state
+
+    def add(self, document: str, vector_ids: List[int], vectors: np.ndarray):
+        if document not in self.sums:
+            self.sums[document] = np.zeros(vectors.shape[1], dtype=np.float64)
+            self.counts[document] = 0
+            self.vector_ids[document] = array("q")
+        self.sums[document] += vectors.sum(axis=0)
+        self.counts[document] += len(vectors)
+        self.vector_ids[document].extend(vector_ids)
+        self._matrix = None
+
+    def _centroid_matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._documents = list(self.sums)
+            matrix = np.stack([self.sums[doc] / self.counts[doc] for doc in self._documents]).astype(np.float32)
+            faiss.normalize_L2(matrix)
+            self._matrix = matrix
+        return self._matrix
+
+    def nearest_documents(self, query: np.ndarray, top_documents: int) -> List[str]:
+        """Documents whose centroids are closest (L2) to the normalized query."""
+        if not self.sums:
+            return []
+        matrix = self._centroid_matrix()
+        query = np.ascontiguousarray(query.reshape(1, -1), dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        _, indices = faiss.knn(query, matrix, min(top_documents, len(matrix)))
+        return [self._documents[i] for i in indices[0] if i >= 0]
+
+    def chunk_ids(self, documents: List[str]) -> np.ndarray:
+        """Vector ids of every chunk in `documents`, deduplicated."""
+        if not documents:
+            return np.zeros(0, dtype=np.int64)
+        ids = np.concatenate([np.frombuffer(self.vector_ids[doc], dtype=np.int64) for doc in documents])
+        return np.unique(ids)
@@ -1,31 +1,62 @@
 from typing import List, Dict
 
+class StreamingChunker:
+    """
+    Incremental `chunk_text`: text arrives in pieces (e.g. one PDF page at a
+    time) and chunks are emitted as soon as they are complete. Chunk ids keep
+    the character offset into the whole document, so the output is identical
+    to chunking the concatenated text in one go.
+    """
+    def __init__(self, source_file: str, chunk_size: int = 1000, overlap: int = 200):
+        self.source_file = source_file
+        self.chunk_size = chunk_size
+        self.step = chunk_size - overlap
+        self.buffer = ""
+        self.buffer_offset = 0  # Document offset of buffer[0]
+        self.start = 0  # Document offset of the next chunk
+
+    def _chunk(self) -> Dict:
+        local = self.start - self.buffer_offset
+        return {
+            "text": self.buffer[local:local + self.chunk_size],
+            "chunk_id": f"{self.source_file}_chunk_{self.start}",
+            "source_file": self.source_file
+        }
+
+    def feed(self, text: str) -> List[Dict]:
+        """Adds text and returns the chunks that can no longer change."""
+        self.buffer += text
+        chunks = []
+        # A chunk is final once text continues past its end (otherwise it may be the last one)
+        while self.buffer_offset + len(self.buffer) > self.start + self.chunk_size:
+            chunks.append(self._chunk())
+            self.start += self.step
+        # Drop text every remaining chunk starts after
+        consumed = self.start - self.buffer_offset
+        if consumed > 0:
+            self.buffer = self.buffer[consumed:]
+            self.buffer_offset = self.start
+        return chunks
+
+    def finish(self) -> List[Dict]:
+        """Returns the remaining chunks at the end of the document."""
+        chunks = []
+        text_end = self.buffer_offset + len(self.buffer)
+        while self.start < text_end:
+            chunks.append(self._chunk())
+            if self.start + self.chunk_size >= text_end:
+                break
+            self.start += self.step
+        self.buffer = ""
+        self.buffer_offset = self.start
+        return chunks
+
 def chunk_text(text: str, source_file: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict]:
     """
     Splits text into chunks of `chunk_size` characters with `overlap`.
     """
     if not text:
         return []
-        
-    chunks = []
-    text_len = len(text)
-    start = 0
-    
-    while start < text_len:
-        end = start + chunk_size
-        chunk_text = text[start:end]
-        
-        chunks.append({
-            "text": chunk_text,
-            "chunk_id": f"{source_file}_chunk_{start}",
-            "source_file": source_file
-        })
-        
-        # If we reached the end, stop
-        if end >= text_len:
-            break
-            
-        # Move start forward by (chunk_size - overlap)
-        start += (chunk_size - overlap)
-        
-    return chunks
+
+    chunker = StreamingChunker(source_file, chunk_size, overlap)
+    return chunker.feed(text) + chunker.finish()
@@ -0,0 +1,102 @@
+import math
+import re
+from typing import Any, Dict, List, Tuple
+from app.core.config import settings
+from app.services.lexical_index import tokenize
+
+# Sentence ends: terminal punctuation followed by whitespace, or a line break
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+
+# Marks text left out between kept sentences of the same chunk
+GAP_MARKER = " … "
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in SENTENCE_BOUNDARY.split(text) if s.strip()]
+
+def score_sentences(question: str, sentences: List[List[str]], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """
+    BM25 of each tokenized sentence against the question, with the retrieved
+    sentences themselves as the collection, so terms that appear everywhere
+    in the context count for little.
+    """
+    terms = set(tokenize(question))
+    if not terms or not sentences:
+        return [0.0] * len(sentences)
+    count = len(sentences)
+    avg_length = sum(len(tokens) for tokens in sentences) / count or 1.0
+    doc_freq = {term: sum(term in tokens for tokens in sentences) for term in terms}
+    scores = []
+    for tokens in sentences:
+        score = 0.0
+        for term in terms:
+            tf = tokens.count(term)
+            if tf:
+                idf = math.log(1 + (count - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avg_length))
+        scores.append(score)
+    return scores
+
+def compress_context(
+    question: str,
+    context_results: List[Dict[str, Any]],
+    ratio: float,
+    neighbors: int,
+) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    Extractive compression of retrieved chunks: keeps the sentences that
+    score highest against the question, each with `neighbors` sentences on
+    either side for context, until about `ratio` of the original characters
+    are kept. Kept sentences stay in their original order under their
+    original chunk (so citations still point at the right source); chunks
+    with nothing kept are dropped from the prompt.
+
+    Returns (results with shortened text, original chars, compressed chars).
+    The input is returned unchanged if no sentence shares a term with the question.
+    """
+    sentences: List[Tuple[int, int, str]] = []  # (result index, position in chunk, text)
+    for i, res in enumerate(context_results):
+        for position, sentence in enumerate(split_sentences(res.get("metadata", {}).get("text", ""))):
+            sentences.append((i, position, sentence))
+    original_chars = sum(len(res.get("metadata", {}).get("text", "")) for res in context_results)
+
+    scores = score_sentences(question, [tokenize(text) for _, _, text in sentences])
+    if not any(scores):
+        return context_results, original_chars, original_chars
+
+    # Greedily add the best sentences and their neighbours within the character budget
+    budget = ratio * original_chars
+    lookup = {(i, position): n for n, (i, position, _) in enumerate(sentences)}
+    kept = set()
+    kept_chars = 0
+    for n in sorted(range(len(sentences)), key=lambda n: scores[n], reverse=True):
+        if scores[n] <= 0 or kept_chars >= budget:
+            break
+        i, position, _ = sentences[n]
+        for offset in range(-neighbors, neighbors + 1):
+            m = lookup.get((i, position + offset))
+            if m is not None and m not in kept:
+                kept.add(m)
+                kept_chars += len(sentences[m][2])
+
+    compressed = []
+    compressed_chars = 0
+    for i, res in enumerate(context_results):
+        parts = []
+        previous = None
+        for n in sorted(m for m in kept if sentences[m][0] == i):
+            if previous is not None:
+                parts.append(" " if sentences[n][1] == previous + 1 else GAP_MARKER)
+            parts.append(sentences[n][2])
+            previous = sentences[n][1]
+        if parts:
+            text = "".join(parts)
+            compressed_chars += len(text)
+            compressed.append({**res, "metadata": {**res.get("metadata", {}), "text": text}})
+    return compressed, original_chars, compressed_chars
+
+def should_compress(context_results: List[Dict[str, Any]], requested: bool) -> bool:
+    """Compression pays off only once the context is long enough to matter."""
+    if not requested:
+        return False
+    chars = sum(len(res.get("metadata", {}).get("text", "")) for res in context_results)
+    return chars >= settings.CONTEXT_COMPRESSION_MIN_CHARS
@@ -0,0 +1,61 @@
+import time
+from typing import List, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+class Deadline:
+    """
+    Per-request latency budget split across pipeline stages.
+
+    Stage shares come from settings (embedding, vector search, and the
+    remainder for the LLM). Stages ask for their allowance, check whether
+    earlier stages overran, and record any degradation they apply so it can
+    be reported back to the caller. A Deadline without a budget never expires.
+    """
+    def __init__(self, budget_ms: Optional[float] = None):
+        self.budget_ms = budget_ms
+        self.start = time.perf_counter()
+        self.degradations: List[str] = []
+
+    @property
+    def bounded(self) -> bool:
+        return self.budget_ms is not None
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def remaining_ms(self) -> Optional[float]:
+        if not self.bounded:
+            return None
+        return max(self.budget_ms - self.elapsed_ms(), 0.0)
+
+    def stage_share_ms(self, stage: str) -> Optional[float]:
+        """Returns the planned allowance for `stage` out of the total budget."""
+        if not self.bounded:
+            return None
+        shares = {
+            "embedding": settings.DEADLINE_EMBEDDING_SHARE,
+            "search": settings.DEADLINE_SEARCH_SHARE,
+        }
+        shares["llm"] = max(1.0 - sum(shares.values()), 0.0)
+        return self.budget_ms * shares[stage]
+
+    def stage_timeout_ms(self, stage: str) -> Optional[float]:
+        """Allowance for `stage`, capped by whatever time is actually left."""
+        if not self.bounded:
+            return None
+        return min(self.stage_share_ms(stage), self.remaining_ms())
+
+    def behind_schedule(self, *completed_stages: str) -> bool:
+        """True if the stages completed so far used more than their combined share."""
+        if not self.bounded:
+            return False
+        planned = sum(self.stage_share_ms(stage) for stage in completed_stages)
+        return self.elapsed_ms() > planned
+
+    def degrade(self, reason: str):
+        if reason not in self.degradations:
+            self.degradations.append(reason)
+            logger.warning("Deadline degradation applied: %s (elapsed %.0fms)", reason, self.elapsed_ms())
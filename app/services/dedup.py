@@ -0,0 +1,156 @@
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.lexical_index import tokenize
+
+# Prime just above 2^32 for the universal hash family (a*h + b) mod P
+_PRIME = 4294967311
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles. Two texts agree on each signature
+    position with probability equal to the Jaccard similarity of their shingle sets.
+    """
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # a < 2^31 and h < 2^32 keep a*h + b inside uint64
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.shingle_size = shingle_size
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Returns the MinHash signature of `text`, or None if it has no tokens."""
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        size = min(self.shingle_size, len(tokens))
+        shingles = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in shingles),
+            dtype=np.uint64, count=len(shingles),
+        )
+        return ((np.outer(hashes, self.a) + self.b) % _PRIME).min(axis=0)
+
+class NearDuplicateIndex:
+    """
+    LSH over MinHash signatures: each signature is split into `bands` bands
+    and keys sharing any band bucket become candidates, which are then
+    checked against `threshold` on the estimated Jaccard similarity.
+    """
+    def __init__(self, threshold: float, num_perm: int = 128, bands: int = 16):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.signatures: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, key: int, signature: np.ndarray):
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def find(self, signature: np.ndarray) -> Optional[int]:
+        """Returns the most similar indexed key at or above the threshold, if any."""
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+
+        best_key, best_similarity = None, self.threshold
+        for key in candidates:
+            similarity = float(np.mean(self.signatures[key] == signature))
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+        return best_key
+
+minhasher = MinHasher(settings.DEDUP_NUM_PERM, settings.DEDUP_SHINGLE_SIZE)
+
+def new_near_duplicate_index() -> NearDuplicateIndex:
+    return NearDuplicateIndex(settings.DEDUP_THRESHOLD, settings.DEDUP_NUM_PERM, settings.DEDUP_BANDS)
+
+def duplicate_count(meta: Dict) -> int:
+    """How many chunks were collapsed into this one (stores written before the count existed list them all)."""
+    return meta.get("duplicate_count", len(meta.get("duplicates", [])))
+
+def add_duplicate_refs(meta: Dict, refs: List[Dict]) -> List[Dict]:
+    """
+    Records `refs`, chunks collapsed into the chunk `meta`, on it. Every one
+    is counted in "duplicate_count", but only refs to documents the chunk
+    does not cite yet are listed, at most DEDUP_MAX_SOURCE_REFS, so
+    boilerplate repeated across thousands of documents stays one small row.
+    Returns the refs that were listed.
+    """
+    listed = meta.get("duplicates", [])
+    cited = {meta.get("source_file")} | {ref["source_file"] for ref in listed}
+    kept = []
+    for ref in refs:
+        if len(listed) + len(kept) >= settings.DEDUP_MAX_SOURCE_REFS:
+            break
+        if ref["source_file"] not in cited:
+            kept.append(ref)
+            cited.add(ref["source_file"])
+    meta["duplicate_count"] = duplicate_count(meta) + len(refs)
+    if kept:
+        meta["duplicates"] = listed + kept
+    return kept
+
+class StreamingDeduplicator:
+    """
+    Collapses near-duplicate chunks of one document before they are embedded,
+    as they stream out of the chunker. Each chunk is matched first against
+    vectors already in the store (`find_existing`), then against earlier
+    chunks of the same document.
+
+    A match on an earlier chunk that is still waiting to be indexed is listed
+    under that chunk's "duplicates"; once the chunk has been committed (its
+    "vector_id" is set) the ref goes to `existing_duplicates` like a corpus match.
+    """
+    def __init__(self, find_existing: Callable[[np.ndarray], Optional[int]]):
+        self.find_existing = find_existing
+        self.local_index = new_near_duplicate_index()
+        self.local_chunks: List[Dict] = []
+        self.existing_duplicates: Dict[int, List[Dict]] = {}  # vector_id -> source refs, not yet merged
+        self.document_duplicates = 0
+        self.corpus_duplicates = 0
+
+    @property
+    def collapsed(self) -> int:
+        return self.document_duplicates + self.corpus_duplicates
+
+    def check(self, chunk: Dict) -> Tuple[bool, Optional[np.ndarray]]:
+        """Returns (whether the chunk needs embedding, its signature)."""
+        signature = minhasher.signature(chunk["text"])
+        if signature is None:
+            return True, None
+        ref = {"source_file": chunk["source_file"], "chunk_id": chunk["chunk_id"]}
+
+        vector_id = self.find_existing(signature)
+        if vector_id is not None:
+            self.existing_duplicates.setdefault(vector_id, []).append(ref)
+            self.corpus_duplicates += 1
+            return False, signature
+
+        position = self.local_index.find(signature)
+        if position is not None:
+            original = self.local_chunks[position]
+            if "vector_id" in original:
+                self.existing_duplicates.setdefault(original["vector_id"], []).append(ref)
+            else:
+                add_duplicate_refs(original, [ref])
+            self.document_duplicates += 1
+            return False, signature
+
+        self.local_index.add(len(self.local_chunks), signature)
+        self.local_chunks.append(chunk)
+        return True, signature
+
+    def take_existing_duplicates(self) -> Dict[int, List[Dict]]:
+        """Hands over the refs to merge into stored vectors with the next commit."""
+        duplicates, self.existing_duplicates = self.existing_duplicates, {}
+        return duplicates
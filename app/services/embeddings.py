@@ -1,35 +1,87 @@
 import httpx
+import numpy as np
 from typing import List
 from app.core.config import settings
-from app.core.logging import setup_logging
+from app.core.logging import get_logger
+from app.core.metrics import EMBEDDING_LATENCY, UPSTREAM_ERRORS
+from app.core.tracing import span
+from app.services.cache import LRUCache
+from app.services.hedging import Hedger
+from app.services.query_log import timed_stage
 
-logger = setup_logging()
+logger = get_logger(__name__)
 
-async def generate_embeddings(texts: List[str]) -> List[List[float]]:
+EMBEDDING_MODEL = "jina-embeddings-v3"
+
+# Query embeddings keyed by exact question text
+query_embedding_cache = LRUCache("query_embedding", settings.EMBEDDING_CACHE_SIZE)
+
+# Only single-question calls are hedged; ingestion batches are too large to duplicate
+query_embedding_hedger = Hedger("embedding")
+
+async def generate_embeddings(texts: List[str], hedged: bool = False) -> List[List[float]]:
     """
-    Generates embeddings for a list of texts using Jina AI's API.
+    Generates embeddings for a list of texts using Jina AI's API. With
+    `hedged`, a slow request is raced against a duplicate (see Hedger).
     """
     if not texts:
         return []
-        
-    url = "https://api.jina.ai/v1/embeddings"
+
+    url = settings.JINA_API_URL
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {settings.JINA_API_KEY}"
     }
     data = {
         "input": texts,
-        "model": "jina-embeddings-v3" 
+        "model": EMBEDDING_MODEL,
+        "dimensions": settings.EMBEDDING_DIMENSION
     }
 
-    try:
+    async def request() -> dict:
         async with httpx.AsyncClient() as client:
             response = await client.post(url, headers=headers, json=data)
             response.raise_for_status()
-            result = response.json()
-            # Jina returns { "data": [ { "embedding": [...] } ] }
-            embeddings = [item["embedding"] for item in result["data"]]
-            return embeddings
+            return response.json()
+
+    try:
+        with EMBEDDING_LATENCY.time():
+            result = await (query_embedding_hedger.run(request) if hedged else request())
+        # Jina returns { "data": [ { "embedding": [...] } ] }
+        embeddings = [item["embedding"] for item in result["data"]]
+        if embeddings and len(embeddings[0]) > settings.EMBEDDING_DIMENSION:
+            # Upstream ignored `dimensions`; truncate locally instead
+            embeddings = truncate_embeddings(embeddings, settings.EMBEDDING_DIMENSION).tolist()
+        return embeddings
     except Exception as e:
-        logger.error(f"Error generating Jina embeddings: {e}")
+        UPSTREAM_ERRORS.labels(provider="jina").inc()
+        logger.error("Error generating Jina embeddings: %s", e)
         raise e
+
+def truncate_embeddings(vectors, dimension: int) -> np.ndarray:
+    """
+    Matryoshka truncation: keeps the leading `dimension` components of each
+    vector and re-normalizes to unit length, which is what the API returns
+    for a reduced `dimensions` request.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.shape[-1] < dimension:
+        raise ValueError(f"Cannot truncate {vectors.shape[-1]}-d vectors to {dimension} dimensions")
+    if vectors.shape[-1] == dimension:
+        return vectors
+    truncated = np.ascontiguousarray(vectors[..., :dimension])
+    norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
+
+async def embed_query(query: str) -> List[float]:
+    """
+    Embeds a single query, serving repeated questions from an LRU cache.
+    """
+    with span("embedding") as current, timed_stage("embedding"):
+        embedding = query_embedding_cache.get(query)
+        if current is not None:
+            current.attributes["cache_hit"] = embedding is not None
+        if embedding is None:
+            embedding = (await generate_embeddings([query], hedged=True))[0]
+            query_embedding_cache.put(query, embedding)
+    return embedding
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import HEDGE_DELAY, HEDGE_REQUESTS
+
+T = TypeVar("T")
+
+class Hedger:
+    """
+    Hedged requests for one kind of idempotent upstream call.
+
+    If an attempt has not finished after the HEDGE_PERCENTILE latency of
+    recent attempts, a duplicate is started and whichever succeeds first is
+    used; the other is cancelled (or handed to `discard` if it finished
+    too). Hedges are paid for from a token budget that earns
+    HEDGE_BUDGET_RATIO per call, so they add at most that share of upstream
+    load on average (plus a burst of HEDGE_BUDGET_BURST). No hedges are sent
+    until HEDGE_MIN_SAMPLES latencies have been seen.
+    """
+    def __init__(self, call: str):
+        self.call = call
+        self.latencies: Deque[float] = deque(maxlen=settings.HEDGE_WINDOW)
+        self.credit = float(settings.HEDGE_BUDGET_BURST)
+        HEDGE_DELAY.labels(call=call).set_function(lambda: self.delay_s() or 0.0)
+
+    def delay_s(self) -> Optional[float]:
+        """How long to wait before hedging, or None while there are too few samples."""
+        if len(self.latencies) < settings.HEDGE_MIN_SAMPLES:
+            return None
+        percentile = float(np.percentile(self.latencies, settings.HEDGE_PERCENTILE))
+        return max(percentile, settings.HEDGE_MIN_DELAY_MS / 1000)
+
+    def _take_budget(self) -> bool:
+        if self.credit >= 1.0:
+            self.credit -= 1.0
+            return True
+        return False
+
+    def _count(self, outcome: str):
+        HEDGE_REQUESTS.labels(call=self.call, outcome=outcome).inc()
+
+    async def run(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+    ) -> T:
+        """Runs `attempt`, hedging it with a second call if it is slow."""
+        if not settings.HEDGING_ENABLED:
+            return await attempt()
+
+        self.credit = min(float(settings.HEDGE_BUDGET_BURST), self.credit + settings.HEDGE_BUDGET_RATIO)
+        started: Dict[asyncio.Task, float] = {}
+
+        async def timed() -> T:
+            attempt_start = time.perf_counter()
+            result = await attempt()
+            self.latencies.append(time.perf_counter() - attempt_start)
+            return result
+
+        def start() -> asyncio.Task:
+            task = asyncio.ensure_future(timed())
+            started[task] = time.perf_counter()
+            return task
+
+        primary = start()
+        try:
+            delay = self.delay_s()
+            if delay is not None:
+                await asyncio.wait([primary], timeout=delay)
+            if delay is None or primary.done():
+                self._count("warming_up" if delay is None else "fast")
+                return await primary
+            if not self._take_budget():
+                self._count("budget_exhausted")
+                return await primary
+
+            hedge = start()
+            pending = {primary, hedge}
+            winner = None
+            error: Optional[BaseException] = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda task: task is hedge):
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        await discard(task.result())  # Both finished together; release the spare
+            if winner is None:
+                self._count("failed")
+                raise error
+            self._count("hedge_won" if winner is hedge else "primary_won")
+            return winner.result()
+        finally:
+            for task, task_start in started.items():
+                if not task.done():
+                    task.cancel()
+                    # How long the abandoned attempt had run: a lower bound that keeps slow calls in the window
+                    self.latencies.append(time.perf_counter() - task_start)
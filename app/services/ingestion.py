@@ -1,14 +1,18 @@
 import os
-import shutil
-from fastapi import UploadFile, HTTPException
+import time
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import numpy as np
 from pypdf import PdfReader
-from app.services.chunking import chunk_text
+from app.services.chunking import StreamingChunker
 from app.services.embeddings import generate_embeddings
+from app.services.dedup import StreamingDeduplicator
 from app.services.vector_store import vector_store
-from app.core.logging import setup_logging
+from app.core.logging import get_logger
 from app.core.config import settings
+from app.core.metrics import DUPLICATE_CHUNKS, INGESTION_DOCUMENT_LATENCY, INGESTION_STAGE_LATENCY
 
-logger = setup_logging()
+logger = get_logger(__name__)
 
 # Use configurable data directory for Fly.io volume support
 UPLOAD_DIR = os.path.join(settings.DATA_DIR, "uploads")
@@ -16,71 +20,267 @@ UPLOAD_DIR = os.path.join(settings.DATA_DIR, "uploads")
 # Ensure upload directory exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-async def process_document(file_path: str, filename: str):
+# Characters read per block from plain-text uploads
+TEXT_BLOCK_CHARS = 64 * 1024
+
+# Marks the end of a stage's output on its queue
+_DONE = object()
+
+async def extract_segments(file_path: str, filename: str) -> AsyncIterator[str]:
     """
-    Background task to process the document: read, chunk, embed, log.
+    Yields the document's text a page (PDF) or block (TXT) at a time, doing
+    the blocking parsing and reads in a worker thread.
     """
-    logger.info(f"Starting ingestion for file: {filename}")
-    
-    data = ""
-    try:
-        if filename.endswith(".pdf"):
-            reader = PdfReader(file_path)
-            # Extract text from all pages
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    data += text + "\n"
-        elif filename.endswith(".txt"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = f.read()
-        
-        logger.info(f"Text extraction complete for {filename}. Length: {len(data)} chars")
-        
-        # Chunking
-        chunks = chunk_text(data, filename)
-        logger.info(f"Created {len(chunks)} chunks for {filename}")
-        
-        if not chunks:
-            logger.warning(f"No text extracted from {filename}. Skipping embeddings.")
-            return
-
-        # Prepare texts for embedding
-        chunk_texts = [chunk["text"] for chunk in chunks]
-        
-        # Generate Embeddings
-        # Note: In a real production scenario, we might want to batch these if there are too many
-        embeddings = await generate_embeddings(chunk_texts)
-        logger.info(f"Generated {len(embeddings)} embeddings for {filename}")
-        
-        # Prepare metadata
-        metadatas = []
-        for chunk in chunks:
-            metadatas.append({
-                "text": chunk["text"],
-                "source_file": chunk["source_file"],
-                "chunk_id": chunk["chunk_id"]
-            })
-            
-        # Add to Vector Store and Persist
-        vector_store.add_embeddings(embeddings, metadatas)
-        vector_store.save_index()
-        
-        logger.info(f"Ingestion pipeline completed successfully for {filename}")
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".pdf":
+        reader = await asyncio.to_thread(PdfReader, file_path)
+        for page in reader.pages:
+            with INGESTION_STAGE_LATENCY.labels(stage="extraction").time():
+                text = await asyncio.to_thread(page.extract_text)
+            if text:
+                yield text + "\n"
+    elif extension == ".txt":
+        with open(file_path, "r", encoding="utf-8") as f:
+            while True:
+                with INGESTION_STAGE_LATENCY.labels(stage="extraction").time():
+                    block = await asyncio.to_thread(f.read, TEXT_BLOCK_CHARS)
+                if not block:
+                    break
+                yield block
 
-    except Exception as e:
-        logger.error(f"Failed to ingest {filename}: {str(e)}")
-        # In production, we'd update a job status in DB here
+class IngestionPipeline:
+    """
+    Ingests one document as four concurrent stages connected by bounded
+    queues, so total time approaches the slowest stage rather than the sum:
 
-async def save_upload_file(upload_file: UploadFile) -> str:
+        extract (pages) -> chunk + dedup (batches) -> embed (N workers) -> index
+
+    The indexer commits embedded batches as they arrive, publishing a new
+    index generation at most every commit_interval() seconds, so the first
+    pages of a large document are searchable long before the last ones are
+    embedded. Commits run in a worker thread, so queries keep being served
+    while a snapshot is written. A full queue makes the stage feeding it wait (backpressure),
+    which bounds memory regardless of document size.
+
+    With `defer_commit`, embedded batches are kept in `pending` instead, for
+    the caller to commit together with other documents (see upload_batch).
     """
-    Saves the uploaded file to disk and returns the path.
+    def __init__(self, file_path: str, filename: str, defer_commit: bool = False):
+        self.file_path = file_path
+        self.filename = filename
+        self.defer_commit = defer_commit
+        self.pending: List[Tuple[List[Dict], List[Optional[np.ndarray]], np.ndarray]] = []
+        self.pages: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        self.batches: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        self.embedded: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        self.deduplicator = StreamingDeduplicator(vector_store.find_near_duplicate) if settings.DEDUP_ENABLED else None
+        self.started = time.perf_counter()
+        self.chars = 0
+        self.chunks = 0
+        self.indexed = 0
+        self.commits = 0
+        self.error: Optional[str] = None
+
+    async def run(self):
+        workers = max(1, settings.INGEST_EMBED_CONCURRENCY)
+        tasks = [
+            asyncio.create_task(self.extract()),
+            asyncio.create_task(self.chunk(workers)),
+            *(asyncio.create_task(self.embed()) for _ in range(workers)),
+            asyncio.create_task(self.index(workers)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def extract(self):
+        async for text in extract_segments(self.file_path, self.filename):
+            self.chars += len(text)
+            await self.pages.put(text)
+        await self.pages.put(_DONE)
+
+    async def chunk(self, workers: int):
+        chunker = StreamingChunker(self.filename)
+        batch: List[Dict] = []
+        signatures: List[Optional[np.ndarray]] = []
+        while True:
+            text = await self.pages.get()
+            with INGESTION_STAGE_LATENCY.labels(stage="chunking").time():
+                chunks = chunker.finish() if text is _DONE else chunker.feed(text)
+            self.chunks += len(chunks)
+
+            # Collapse near-duplicate chunks (repeated headers, disclaimers, boilerplate)
+            with INGESTION_STAGE_LATENCY.labels(stage="dedup").time():
+                for chunk in chunks:
+                    unique, signature = self.deduplicator.check(chunk) if self.deduplicator else (True, None)
+                    if unique:
+                        batch.append(chunk)
+                        signatures.append(signature)
+
+            while len(batch) >= settings.INGEST_EMBED_BATCH_SIZE or (text is _DONE and batch):
+                size = settings.INGEST_EMBED_BATCH_SIZE
+                await self.batches.put((batch[:size], signatures[:size]))
+                batch, signatures = batch[size:], signatures[size:]
+            if text is _DONE:
+                break
+        for _ in range(workers):
+            await self.batches.put(_DONE)
+
+    async def embed(self):
+        while True:
+            item = await self.batches.get()
+            if item is _DONE:
+                await self.embedded.put(_DONE)
+                return
+            chunks, signatures = item
+            with INGESTION_STAGE_LATENCY.labels(stage="embedding").time():
+                embeddings = await generate_embeddings([chunk["text"] for chunk in chunks])
+            await self.embedded.put((chunks, signatures, np.asarray(embeddings, dtype=np.float32)))
+
+    async def index(self, workers: int):
+        pending = []
+        finished = 0
+        last_commit: Optional[float] = None
+        while finished < workers:
+            # Once something is pending, wait no longer than the commit interval for more
+            timeout = None
+            interval = commit_interval()
+            if pending and last_commit is not None:
+                timeout = max(0.0, last_commit + interval - time.perf_counter())
+            try:
+                item = await asyncio.wait_for(self.embedded.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+            if item is _DONE:
+                finished += 1
+            elif item is not None and self.defer_commit:
+                self.pending.append(item)
+            elif item is not None:
+                pending.append(item)
+
+            # The first batch is committed straight away so the document becomes searchable early
+            due = last_commit is None or time.perf_counter() - last_commit >= interval
+            if pending and (due or finished == workers):
+                await self.commit(pending)
+                pending = []
+                last_commit = time.perf_counter()
+
+        if self.deduplicator and self.deduplicator.existing_duplicates and not self.defer_commit:
+            await self.commit([])
+
+    async def commit(self, pending: List[Tuple[List[Dict], List[Optional[np.ndarray]], np.ndarray]]):
+        """Adds embedded batches (and collapsed duplicates so far) to the store as a new generation."""
+        chunks, signatures, embeddings = flatten_batches(pending)
+        duplicate_sources = self.deduplicator.take_existing_duplicates() if self.deduplicator else {}
+        vector_ids = await commit_chunks(chunks, signatures, embeddings, duplicate_sources)
+
+        # Later duplicates of these chunks now merge into the stored vectors
+        for chunk, vector_id in zip(chunks, vector_ids):
+            chunk["vector_id"] = vector_id
+        if vector_ids and self.indexed == 0:
+            elapsed = time.perf_counter() - self.started
+            INGESTION_DOCUMENT_LATENCY.labels(milestone="first_searchable").observe(elapsed)
+            logger.info("First %s chunks of %s searchable after %.2fs", len(vector_ids), self.filename, elapsed)
+        self.indexed += len(vector_ids)
+        self.commits += 1
+
+def commit_interval() -> float:
+    """
+    Seconds between an upload's progressive commits: INGEST_COMMIT_INTERVAL_S,
+    stretched as the store grows so that writing snapshots takes at most
+    INGEST_COMMIT_MAX_SAVE_SHARE of the time (each commit rewrites the whole store).
+    """
+    return max(settings.INGEST_COMMIT_INTERVAL_S, vector_store.last_save_seconds / settings.INGEST_COMMIT_MAX_SAVE_SHARE)
+
+def flatten_batches(
+    pending: List[Tuple[List[Dict], List[Optional[np.ndarray]], np.ndarray]]
+) -> Tuple[List[Dict], List[Optional[np.ndarray]], List[np.ndarray]]:
+    """Joins embedded batches into parallel lists of chunks, MinHash signatures and embedding rows."""
+    chunks, signatures, embeddings = [], [], []
+    for batch_chunks, batch_signatures, batch_embeddings in pending:
+        chunks.extend(batch_chunks)
+        signatures.extend(batch_signatures)
+        embeddings.extend(batch_embeddings)
+    return chunks, signatures, embeddings
+
+def chunk_metadata(chunk: Dict) -> Dict:
+    meta = {
+        "text": chunk["text"],
+        "source_file": chunk["source_file"],
+        "chunk_id": chunk["chunk_id"]
+    }
+    if chunk.get("duplicate_count"):
+        meta["duplicate_count"] = chunk["duplicate_count"]
+    if chunk.get("duplicates"):
+        meta["duplicates"] = chunk["duplicates"]
+    return meta
+
+async def commit_chunks(
+    chunks: List[Dict],
+    signatures: List[Optional[np.ndarray]],
+    embeddings: List[np.ndarray],
+    duplicate_sources: Dict[int, List[Dict]],
+) -> List[int]:
+    """
+    Publishes embedded chunks as one new index generation, in a worker thread
+    so the snapshot write does not block the event loop. Returns their vector ids.
     """
+    commit_start = time.perf_counter()
+    vector_ids = await asyncio.to_thread(
+        vector_store.commit, embeddings, [chunk_metadata(chunk) for chunk in chunks], signatures, duplicate_sources
+    )
+    commit_seconds = time.perf_counter() - commit_start
+    INGESTION_STAGE_LATENCY.labels(stage="indexing").observe(commit_seconds - vector_store.last_save_seconds)
+    INGESTION_STAGE_LATENCY.labels(stage="save").observe(vector_store.last_save_seconds)
+    return vector_ids
+
+async def process_document(file_path: str, filename: str, defer_commit: bool = False) -> IngestionPipeline:
+    """
+    Background task to process the document: extract, chunk, embed and
+    index it through an IngestionPipeline. Failures are logged rather than
+    raised; the returned pipeline's `error` is set instead.
+    """
+    logger.info("Starting ingestion for file: %s", filename)
+
+    pipeline = IngestionPipeline(file_path, filename, defer_commit=defer_commit)
     try:
-        file_path = os.path.join(UPLOAD_DIR, upload_file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
-        return file_path
+        await pipeline.run()
+
+        elapsed = time.perf_counter() - pipeline.started
+        INGESTION_DOCUMENT_LATENCY.labels(milestone="complete").observe(elapsed)
+        if not pipeline.chunks:
+            logger.warning("No text extracted from %s. Skipping embeddings.", filename)
+            return pipeline
+
+        dedup = pipeline.deduplicator
+        if dedup and dedup.collapsed:
+            DUPLICATE_CHUNKS.labels(match="document").inc(dedup.document_duplicates)
+            DUPLICATE_CHUNKS.labels(match="corpus").inc(dedup.corpus_duplicates)
+            logger.info(
+                "Collapsed %s near-duplicate chunks for %s (%s within the document, %s already indexed); "
+                "saved %s embedding inputs and index rows",
+                dedup.collapsed, filename, dedup.document_duplicates, dedup.corpus_duplicates, dedup.collapsed
+            )
+
+        if defer_commit:
+            logger.info(
+                "Ingestion pipeline embedded %s for a batch commit: %s chars, %s chunks, %s to index, %.2fs",
+                filename, pipeline.chars, pipeline.chunks, sum(len(batch[0]) for batch in pipeline.pending), elapsed
+            )
+        else:
+            logger.info(
+                "Ingestion pipeline completed successfully for %s: %s chars, %s chunks, %s vectors in %s commits, %.2fs",
+                filename, pipeline.chars, pipeline.chunks, pipeline.indexed, pipeline.commits, elapsed
+            )
+
     except Exception as e:
-        logger.error(f"Error saving file {upload_file.filename}: {e}")
-        raise HTTPException(status_code=500, detail="Could not save file")
+        pipeline.error = str(e)
+        pipeline.pending = []
+        logger.error(
+            "Failed to ingest %s: %s (%s chunks were already committed and stay searchable)",
+            filename, str(e), pipeline.indexed
+        )
+    return pipeline
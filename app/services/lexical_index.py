@@ -0,0 +1,94 @@
+import re
+import math
+from array import array
+from typing import List, Dict, Tuple
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "were", "with",
+})
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases text and splits it into word tokens, dropping stop words."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS]
+
+class LexicalIndex:
+    """
+    In-process inverted index with BM25 scoring, keyed by FAISS vector id.
+
+    Postings are kept per term as two compact typed arrays (doc ids as uint32,
+    term frequencies as uint16) instead of dicts, so memory stays close to
+    6 bytes per posting.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}  # term -> term_id
+        self.postings: List[Tuple[array, array]] = []  # term_id -> (doc ids, term freqs)
+        self.doc_lengths = np.zeros(0, dtype=np.uint32)  # vector_id -> token count
+        self.doc_count = 0
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def add(self, doc_id: int, text: str):
+        """Indexes a single document under `doc_id`."""
+        tokens = tokenize(text)
+
+        if doc_id >= len(self.doc_lengths):
+            # Grow geometrically so appends stay amortised O(1)
+            grown = np.zeros(max(doc_id + 1, 2 * len(self.doc_lengths), 1024), dtype=np.uint32)
+            grown[:len(self.doc_lengths)] = self.doc_lengths
+            self.doc_lengths = grown
+
+        self.doc_lengths[doc_id] = len(tokens)
+        self.doc_count += 1
+        self.total_length += len(tokens)
+
+        term_freqs: Dict[str, int] = {}
+        for token in tokens:
+            term_freqs[token] = term_freqs.get(token, 0) + 1
+
+        for term, freq in term_freqs.items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = len(self.postings)
+                self.vocab[term] = term_id
+                self.postings.append((array("I"), array("H")))
+            ids, freqs = self.postings[term_id]
+            ids.append(doc_id)
+            freqs.append(min(freq, 65535))
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """Returns up to `top_k` (doc_id, bm25_score) pairs, best first."""
+        if self.doc_count == 0:
+            return []
+
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids:
+            return []
+
+        avg_length = self.total_length / self.doc_count
+        all_ids, all_scores = [], []
+        for term_id in term_ids:
+            ids, freqs = self.postings[term_id]
+            doc_ids = np.array(ids, dtype=np.int64)
+            tf = np.array(freqs, dtype=np.float32)
+            df = len(doc_ids)
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_ids] / avg_length)
+            all_ids.append(doc_ids)
+            all_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        # Sum per-term contributions for documents matching several terms
+        doc_ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+
+        k = min(top_k, len(doc_ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(doc_ids[i]), float(scores[i])) for i in top]
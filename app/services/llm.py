@@ -1,38 +1,68 @@
+import re
 import time
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from groq import AsyncGroq
 from app.core.config import settings
-from app.core.logging import setup_logging
+from app.core.logging import get_logger, HOT_PATH
+from app.core.tracing import span, set_span_attribute
+from app.core.metrics import (
+    CONTEXT_ASSEMBLY_LATENCY, LLM_ESCALATION_TOKENS, LLM_ESCALATION_WASTE, LLM_ESCALATIONS, LLM_LATENCY, LLM_ROUTED,
+    LLM_SAVINGS, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS, UPSTREAM_ERRORS
+)
+from app.services.hedging import Hedger
+from app.services.query_log import annotate
 
-logger = setup_logging()
+logger = get_logger(__name__)
 
 # Constants
-MODEL_NAME = "llama-3.3-70b-versatile"
+MODEL_TIERS = {"small": settings.LLM_SMALL_MODEL, "large": settings.LLM_LARGE_MODEL}
+TIER_PRICES = {  # (prompt, completion) USD per million tokens
+    "small": (settings.LLM_SMALL_PRICE_PER_M_INPUT, settings.LLM_SMALL_PRICE_PER_M_OUTPUT),
+    "large": (settings.LLM_LARGE_PRICE_PER_M_INPUT, settings.LLM_LARGE_PRICE_PER_M_OUTPUT),
+}
+CHARS_PER_TOKEN = 4  # Rough size of a token, for streams cut short before the API reported usage
+
+LLM_ERROR_ANSWER = "I apologize, but I encountered an error while processing your request. Please try again later."
+REFUSAL_ANSWER = "I don't know based on the provided documents."
 TEMPERATURE = 0  # Deterministic output
 
+SYSTEM_PROMPT = (
+    "You are a professional assistant. Answer questions using ONLY the provided context.\n\n"
+    "STRICT FORMATTING RULES:\n"
+    "1. Start with a direct, high-level summary (1-2 sentences).\n"
+    "2. Use clear headers with '##' to organize main topics.\n"
+    "3. Use bullet points (•) for all lists and key details.\n"
+    "4. Use **bold** for important entities (names, tools, dates, metrics).\n"
+    "5. Keep paragraphs short and readable.\n"
+    "6. If the context contains code, format it properly.\n"
+    "7. Ensure the answer flows logically and is easy to scan.\n\n"
+    "SAFETY & GROUNDING RULES:\n"
+    "- Infer user intent if there are typos (e.g., 'teck stak' -> 'Tech Stack').\n"
+    "- STICK STRICTLY TO THE CONTEXT. Do not use outside knowledge.\n"
+    "- If the answer is partially available, provide what is there and mention what is missing.\n"
+    f"- If the answer is NOT in the context, say exactly: '{REFUSAL_ANSWER}'\n"
+    "- Do not fabricate information."
+)
+
+# Questions that ask for reasoning or synthesis rather than looking up a fact
+ANALYTICAL_QUESTION = re.compile(
+    r"\b(why|how(?! (many|much|old|long|often)\b)|explain|compare|comparison|differen(ce|ces|t)|"
+    r"summari[sz]e|summary|overview|analy[sz]e|evaluate|pros|cons|advantages?|disadvantages?|"
+    r"implications?|recommend|should|relationship|steps)\b",
+    re.IGNORECASE,
+)
+
 # Initialize Groq client
-client = AsyncGroq(api_key=settings.GROQ_API_KEY)
+client = AsyncGroq(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
 
-async def generate_answer(query: str, context_chunks: List[Dict[str, Any]]) -> str:
-    """
-    Generates a deterministic, grounded answer using Groq LLM based on the provided context.
-    
-    This function:
-    1. Constructs a safe context string from retrieved chunks.
-    2. Builds a strict system prompt to prevent hallucination.
-    3. Calls the LLM with deterministic settings.
-    4. Logs latency and model usage for observability.
-    
-    Args:
-        query (str): The user's question.
-        context_chunks (List[Dict[str, Any]]): List of retrieved chunks with metadata.
-        
-    Returns:
-        str: The generated answer or a graceful error message.
-    """
-    start_time = time.time()
-    
-    # 1. Construct Robust Context String
+# Completions are hedged on time to first token, separately per tier since their latencies differ
+ttft_hedgers = {tier: Hedger(f"llm_{tier}") for tier in MODEL_TIERS}
+
+# Recent speed per tier (EWMA of time to first token and seconds per further completion token)
+tier_speed: Dict[str, Dict[str, float]] = {}
+
+def build_context(context_chunks: List[Dict[str, Any]]) -> str:
+    """Formats retrieved chunks as tagged context blocks for the prompt."""
     context_text = ""
     for chunk in context_chunks:
         # Safely access metadata with defaults to prevent crashes
@@ -48,54 +78,278 @@ async def generate_answer(query: str, context_chunks: List[Dict[str, Any]]) -> s
     if not context_text:
         logger.warning("No context provided for query.")
         context_text = "No relevant context found."
+    return context_text
 
-    # 2. Construct Strict System Prompt
-    system_prompt = (
-        "You are a professional assistant. Answer questions using ONLY the provided context.\n\n"
-        "STRICT FORMATTING RULES:\n"
-        "1. Start with a direct, high-level summary (1-2 sentences).\n"
-        "2. Use clear headers with '##' to organize main topics.\n"
-        "3. Use bullet points (•) for all lists and key details.\n"
-        "4. Use **bold** for important entities (names, tools, dates, metrics).\n"
-        "5. Keep paragraphs short and readable.\n"
-        "6. If the context contains code, format it properly.\n"
-        "7. Ensure the answer flows logically and is easy to scan.\n\n"
-        "SAFETY & GROUNDING RULES:\n"
-        "- Infer user intent if there are typos (e.g., 'teck stak' -> 'Tech Stack').\n"
-        "- STICK STRICTLY TO THE CONTEXT. Do not use outside knowledge.\n"
-        "- If the answer is partially available, provide what is there and mention what is missing.\n"
-        "- If the answer is NOT in the context, say exactly: 'I don't know based on the provided documents.'\n"
-        "- Do not fabricate information."
-    )
-    
+def question_type(query: str) -> str:
+    return "analytical" if ANALYTICAL_QUESTION.search(query) else "lookup"
+
+def score_margin(context_chunks: List[Dict[str, Any]]) -> Optional[float]:
+    """
+    How far the best retrieved chunk stands out from the others: the gap
+    between its score and the mean of the rest, relative to the larger of
+    the two (0 = all alike, 1 = nothing else close). Results arrive best
+    first, so this works whether scores are similarities (RRF, BM25) or
+    distances (vector-only search). None with fewer than two scored chunks.
+    """
+    scores = [chunk["score"] for chunk in context_chunks if chunk.get("score") is not None]
+    if len(scores) < 2:
+        return None
+    best, rest = float(scores[0]), sum(scores[1:]) / (len(scores) - 1)
+    scale = max(abs(best), abs(rest))
+    return abs(best - rest) / scale if scale > 0 else 0.0
+
+def route_model(query: str, context_chunks: List[Dict[str, Any]], context_chars: int) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Picks the model tier for a question from features that cost nothing to
+    compute. The small model answers short lookup questions over a compact
+    context where one chunk clearly wins retrieval; anything else goes to
+    the large model. Returns (tier, reason, features), where reason names
+    the first feature that ruled out the small model ("simple" if none did).
+    """
+    features = {
+        "question_words": len(query.split()),
+        "question_type": question_type(query),
+        "context_chars": context_chars,
+        "score_margin": score_margin(context_chunks),
+    }
+    if not settings.LLM_ROUTING_ENABLED:
+        return "large", "disabled", features
+    if features["question_words"] > settings.LLM_ROUTER_MAX_QUESTION_WORDS:
+        return "large", "question_length", features
+    if features["question_type"] != "lookup":
+        return "large", "question_type", features
+    if context_chars > settings.LLM_ROUTER_MAX_CONTEXT_CHARS:
+        return "large", "context_size", features
+    margin = features["score_margin"]
+    if margin is not None and margin < settings.LLM_ROUTER_MIN_SCORE_MARGIN:
+        return "large", "score_margin", features
+    return "small", "simple", features
+
+def escalation_reason(answer: str, complete: bool = True) -> Optional[str]:
+    """
+    Why a small-model answer should be regenerated by the large model, or
+    None to keep it. For an answer still being streamed only refusals count.
+    """
+    if REFUSAL_ANSWER.rstrip(".").lower() in answer.lower():
+        return "refusal"
+    if complete and len(answer.strip()) < settings.LLM_ESCALATION_MIN_ANSWER_CHARS:
+        return "short"
+    return None
+
+def token_cost(tier: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = TIER_PRICES[tier]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+def record_speed(tier: str, ttft_s: float, latency_s: float, completion_tokens: int):
+    token_s = (latency_s - ttft_s) / max(1, completion_tokens - 1)
+    speed = tier_speed.get(tier)
+    if speed is None:
+        tier_speed[tier] = {"ttft_s": ttft_s, "token_s": token_s}
+    else:
+        speed["ttft_s"] = 0.9 * speed["ttft_s"] + 0.1 * ttft_s
+        speed["token_s"] = 0.9 * speed["token_s"] + 0.1 * token_s
+
+def estimated_seconds(tier: str, completion_tokens: int) -> Optional[float]:
+    """How long the tier would take to generate `completion_tokens` at its recent speed (None if unseen)."""
+    speed = tier_speed.get(tier)
+    if speed is None:
+        return None
+    return speed["ttft_s"] + speed["token_s"] * max(0, completion_tokens - 1)
+
+def record_savings(usage: Dict[str, float]):
+    """
+    Estimates what an accepted small-model answer saved over having the
+    large model generate the same tokens: the price difference, and the
+    large tier's recent time for that answer length minus the actual time.
+    Net savings are these minus rag_llm_escalation_waste_total.
+    """
+    if "prompt_tokens" not in usage:
+        return
+    prompt_tokens, completion_tokens = usage["prompt_tokens"], usage["completion_tokens"]
+    saved_cost = token_cost("large", prompt_tokens, completion_tokens) - token_cost("small", prompt_tokens, completion_tokens)
+    LLM_SAVINGS.labels(kind="cost_usd").inc(max(0.0, saved_cost))
+    large_seconds = estimated_seconds("large", completion_tokens)
+    if large_seconds is not None:
+        LLM_SAVINGS.labels(kind="seconds").inc(max(0.0, large_seconds - usage["seconds"]))
+
+def build_prompts(query: str, context_chunks: List[Dict[str, Any]]) -> Tuple[str, str, int]:
+    """Returns the system and user prompts, and the size of the context in the user prompt."""
+    start_time = time.perf_counter()
+    with span("context_build", chunks=len(context_chunks)):
+        context_text = build_context(context_chunks)
     user_prompt = f"Context:\n{context_text}\n\nQuestion:\n{query}"
+    CONTEXT_ASSEMBLY_LATENCY.observe(time.perf_counter() - start_time)
+    return SYSTEM_PROMPT, user_prompt, len(context_text)
 
-    try:
-        # 3. Call Groq LLM
-        chat_completion = await client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt,
-                },
-                {
-                    "role": "user",
-                    "content": user_prompt,
-                }
-            ],
-            model=MODEL_NAME,
-            temperature=TEMPERATURE,
-        )
-        
-        answer = chat_completion.choices[0].message.content
-        
-        # 4. Log Metrics
-        latency_ms = (time.time() - start_time) * 1000
-        logger.info(f"LLM Response generated in {latency_ms:.2f}ms. Model: {MODEL_NAME}")
-        
-        return answer
+async def generate_answer(query: str, context_chunks: List[Dict[str, Any]]) -> str:
+    """
+    Generates a deterministic, grounded answer using Groq LLM based on the provided context.
 
+    Collects stream_answer, so small-model answers are checked in full before
+    one is accepted or escalated to the large model.
+
+    Args:
+        query (str): The user's question.
+        context_chunks (List[Dict[str, Any]]): List of retrieved chunks with metadata.
+        
+    Returns:
+        str: The generated answer or a graceful error message.
+    """
+    try:
+        return "".join([text async for text in stream_answer(query, context_chunks)])
     except Exception as e:
+        UPSTREAM_ERRORS.labels(provider="groq").inc()
         # Log the full error for debugging but return a safe message to the user
-        logger.error(f"Error calling LLM: {str(e)}")
-        return "I apologize, but I encountered an error while processing your request. Please try again later."
+        logger.error("Error calling LLM: %s", str(e))
+        return LLM_ERROR_ANSWER
+
+async def stream_answer(
+    query: str, context_chunks: List[Dict[str, Any]], hold_chars: Optional[int] = None
+) -> AsyncIterator[str]:
+    """
+    Streams a grounded answer as it is generated.
+
+    This function:
+    1. Builds the prompts from the retrieved chunks.
+    2. Routes the question to the small or large model tier.
+    3. Streams the LLM response with deterministic settings. Small-model
+       output is held back until `hold_chars` characters (the whole answer
+       if None) have arrived; if those refuse, fail or (for a complete
+       answer) are too short, the large model answers instead.
+    4. Records time-to-first-token, total latency and tokens per tier.
+
+    Raises if the large model fails.
+    """
+    start_time = time.perf_counter()
+    system_prompt, user_prompt, context_chars = build_prompts(query, context_chunks)
+
+    tier, reason, features = route_model(query, context_chunks, context_chars)
+    LLM_ROUTED.labels(tier=tier, reason=reason).inc()
+    annotate(llm_tier=tier, llm_route_reason=reason)
+
+    if tier == "small":
+        usage: Dict[str, float] = {}
+        tokens = _stream_tokens(tier, system_prompt, user_prompt, features, usage)
+        held: List[str] = []
+        held_chars = 0
+        complete = False
+        try:
+            while hold_chars is None or held_chars < hold_chars:
+                try:
+                    text = await tokens.__anext__()
+                except StopAsyncIteration:
+                    complete = True
+                    break
+                held.append(text)
+                held_chars += len(text)
+            escalation = escalation_reason("".join(held), complete)
+        except Exception as e:
+            UPSTREAM_ERRORS.labels(provider="groq").inc()
+            logger.error("Error calling LLM (%s): %s", MODEL_TIERS[tier], str(e))
+            escalation = "error"
+
+        if escalation is None:
+            yield "".join(held)
+            async for text in tokens:
+                yield text
+            record_savings(usage)
+            _log_answer(tier, start_time)
+            return
+
+        await tokens.aclose()
+        LLM_ESCALATIONS.labels(reason=escalation).inc()
+        LLM_ESCALATION_TOKENS.inc(usage.get("total_tokens", 0))  # Unknown (0) for streams cut short
+        prompt_tokens = usage.get("prompt_tokens", (len(system_prompt) + len(user_prompt)) // CHARS_PER_TOKEN)
+        completion_tokens = usage.get("completion_tokens", held_chars // CHARS_PER_TOKEN)
+        LLM_ESCALATION_WASTE.labels(kind="cost_usd").inc(token_cost("small", prompt_tokens, completion_tokens))
+        LLM_ESCALATION_WASTE.labels(kind="seconds").inc(time.perf_counter() - start_time)
+        annotate(llm_tier="large", llm_escalation=escalation)
+        tier = "large"
+
+    async for text in _stream_tokens(tier, system_prompt, user_prompt, features, {}):
+        yield text
+    _log_answer(tier, start_time)
+
+def _log_answer(tier: str, start_time: float):
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    logger.info("LLM Response generated in %.2fms. Model: %s", latency_ms, MODEL_TIERS[tier], extra=HOT_PATH)
+
+async def _open_stream(tier: str, system_prompt: str, user_prompt: str) -> Tuple[Any, Optional[Any]]:
+    """Starts a streamed completion and reads up to its first chunk with content (None if there is none)."""
+    stream = await client.chat.completions.create(
+        messages=[
+            {
+                "role": "system",
+                "content": system_prompt,
+            },
+            {
+                "role": "user",
+                "content": user_prompt,
+            }
+        ],
+        model=MODEL_TIERS[tier],
+        temperature=TEMPERATURE,
+        stream=True,
+    )
+    try:
+        while True:
+            try:
+                chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+            if chunk.choices and chunk.choices[0].delta.content:
+                return stream, chunk
+    except BaseException:
+        # Includes cancellation by the hedger when the other attempt won
+        await stream.close()
+        raise
+
+async def _discard_stream(opened: Tuple[Any, Optional[Any]]):
+    await opened[0].close()
+
+async def _stream_tokens(
+    tier: str, system_prompt: str, user_prompt: str, features: Dict[str, Any], usage_out: Dict[str, float]
+) -> AsyncIterator[str]:
+    """
+    Streams a chat completion's text, recording time-to-first-token, total
+    latency and token usage for the tier; the usage reported by the API and
+    the generation time are also copied into `usage_out`. Opening the stream is hedged: if the first
+    token is slow, a duplicate request races it and the first to start
+    streaming is read.
+    """
+    attributes = {key: value for key, value in features.items() if value is not None}
+    with span("llm", model=MODEL_TIERS[tier], tier=tier, **attributes):
+        llm_start = time.perf_counter()
+        stream, first = await ttft_hedgers[tier].run(
+            lambda: _open_stream(tier, system_prompt, user_prompt), discard=_discard_stream
+        )
+        usage = None
+        ttft = None
+        try:
+            if first is not None:
+                ttft = time.perf_counter() - llm_start
+                LLM_TIME_TO_FIRST_TOKEN.labels(tier=tier).observe(ttft)
+                set_span_attribute("ttft_ms", round(ttft * 1000, 3))
+                yield first.choices[0].delta.content
+
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+                    # Groq reports usage on the final chunk, under x_groq
+                    usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None) or usage
+        finally:
+            # Also reached when the caller stops reading early (e.g. to escalate)
+            await stream.close()
+
+        latency = time.perf_counter() - llm_start
+        LLM_LATENCY.labels(tier=tier).observe(latency)
+        if usage is not None:
+            LLM_TOKENS.labels(tier=tier, kind="prompt").inc(usage.prompt_tokens)
+            LLM_TOKENS.labels(tier=tier, kind="completion").inc(usage.completion_tokens)
+            usage_out.update(
+                prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+                total_tokens=usage.total_tokens, seconds=latency,
+            )
+            if ttft is not None:
+                record_speed(tier, ttft, latency, usage.completion_tokens)
@@ -0,0 +1,47 @@
+from typing import List
+import numpy as np
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def maximal_marginal_relevance(
+    query_vector: np.ndarray,
+    candidate_vectors: np.ndarray,
+    top_k: int = 5,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """
+    Selects `top_k` candidate positions balancing relevance to the query
+    against similarity to already selected candidates.
+
+    Each step picks argmax(lambda * sim(q, c) - (1 - lambda) * max sim(c, selected)).
+    lambda_mult=1.0 is pure relevance ranking, 0.0 is maximum diversity.
+    All similarities are cosine and computed with a single matrix product;
+    the only Python loop is over the `top_k` selection steps.
+    """
+    n = len(candidate_vectors)
+    if n == 0 or top_k <= 0:
+        return []
+
+    candidates = _normalize(np.asarray(candidate_vectors, dtype=np.float32))
+    query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(-1))
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything selected so far
+    max_redundancy = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(top_k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_redundancy, pairwise[best], out=max_redundancy)
+
+    return selected
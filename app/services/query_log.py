@@ -0,0 +1,171 @@
+import atexit
+import glob
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.logging import get_logger, request_id_var
+
+logger = get_logger(__name__)
+
+QUERY_LOG_DIR = os.path.join(settings.DATA_DIR, "query_log")
+QUERY_LOG_FILE = os.path.join(QUERY_LOG_DIR, "queries.jsonl")
+
+_current_entry: ContextVar[Optional[Dict[str, Any]]] = ContextVar("query_log_entry", default=None)
+
+class QueryLogWriter:
+    """
+    Appends entries to the query log from a background thread, in batches
+    of up to QUERY_LOG_BATCH_SIZE lines or every QUERY_LOG_FLUSH_INTERVAL_S,
+    so the request path only pays for a non-blocking queue put. Entries are
+    dropped (and counted) if the queue is full. The active file is rolled to
+    a timestamped name past `max_bytes` (QUERY_LOG_MAX_BYTES by default);
+    old files are kept.
+    """
+    def __init__(self, path: str, name: str = "query-log", max_bytes: Optional[int] = None):
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes or settings.QUERY_LOG_MAX_BYTES
+        self.queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def write(self, entry: Dict[str, Any]):
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=settings.QUERY_LOG_FLUSH_INTERVAL_S)]
+            except queue.Empty:
+                continue
+            while len(batch) < settings.QUERY_LOG_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append(batch)
+            except Exception as e:
+                logger.error("Failed to write %s %s entries: %s", len(batch), self.name, e)
+
+    def _append(self, batch: List[Dict[str, Any]]):
+        lines = "".join(json.dumps(entry, separators=(",", ":"), default=str) + "\n" for entry in batch)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            size = f.tell()
+        if size > self.max_bytes:
+            os.replace(self.path, self.path.replace(".jsonl", f"-{time.strftime('%Y%m%dT%H%M%S')}.jsonl"))
+
+_writer = QueryLogWriter(QUERY_LOG_FILE)
+
+# --- Recording (request path) ---------------------------------------------
+
+def start_entry(question: str) -> Optional[Dict[str, Any]]:
+    """Begins a query log entry for the current request (None when logging is disabled)."""
+    if not settings.QUERY_LOG_ENABLED:
+        return None
+    entry = {
+        "ts": time.time(),
+        "request_id": request_id_var.get(),
+        "question": question,
+        "stages_ms": {},
+        "_start": time.perf_counter(),
+    }
+    _current_entry.set(entry)
+    return entry
+
+@contextmanager
+def timed_stage(name: str):
+    """Records the duration of a pipeline stage on the current entry, if any."""
+    entry = _current_entry.get()
+    if entry is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry["stages_ms"][name] = round((time.perf_counter() - start) * 1000, 3)
+
+def annotate(**fields: Any):
+    """Adds fields to the current entry, if any."""
+    entry = _current_entry.get()
+    if entry is not None:
+        entry.update(fields)
+
+def embedding_fingerprint(embedding: List[float]) -> str:
+    return hashlib.blake2b(np.asarray(embedding, dtype=np.float32).tobytes(), digest_size=8).hexdigest()
+
+def finish_entry(entry: Optional[Dict[str, Any]]):
+    """Ends the current entry and queues it for writing."""
+    if entry is None:
+        return
+    _current_entry.set(None)
+    entry["stages_ms"]["total"] = round((time.perf_counter() - entry.pop("_start")) * 1000, 3)
+    _writer.write(entry)
+
+# --- Reading (analytics and warm-up) ----------------------------------------
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+def read_entries(since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Yields logged entries from all query log files, oldest file first."""
+    paths = sorted(glob.glob(os.path.join(QUERY_LOG_DIR, "queries-*.jsonl")))
+    if os.path.exists(QUERY_LOG_FILE):
+        paths.append(QUERY_LOG_FILE)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from a crash
+                if since is None or entry.get("ts", 0) >= since:
+                    yield entry
+
+def top_questions(entries: List[Dict[str, Any]], limit: Optional[int]) -> List[Tuple[str, int]]:
+    """
+    Most frequent questions (case and whitespace folded), each reported
+    with its most common original phrasing.
+    """
+    counts: Counter = Counter()
+    phrasings: Dict[str, Counter] = {}
+    for entry in entries:
+        key = normalize_question(entry["question"])
+        counts[key] += 1
+        phrasings.setdefault(key, Counter())[entry["question"]] += 1
+    return [(phrasings[key].most_common(1)[0][0], count) for key, count in counts.most_common(limit)]
+
+def hot_chunks(entries: List[Dict[str, Any]], limit: int) -> List[Tuple[str, int]]:
+    """Chunk ids that were retrieved most often."""
+    counts: Counter = Counter()
+    for entry in entries:
+        counts.update(entry.get("chunk_ids", []))
+    return counts.most_common(limit)
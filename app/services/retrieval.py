@@ -1,32 +1,132 @@
-from typing import List, Dict
+import asyncio
+from typing import List, Dict, Optional
 from app.services.vector_store import vector_store
-from app.services.embeddings import generate_embeddings
-from app.core.logging import setup_logging
+from app.services.embeddings import embed_query, truncate_embeddings
+from app.services.mmr import maximal_marginal_relevance
+from app.services.deadline import Deadline
+from app.core.config import settings
+from app.core.tracing import span
+from app.services.query_log import annotate, embedding_fingerprint, timed_stage
+from app.core.logging import get_logger, HOT_PATH
 
-logger = setup_logging()
+logger = get_logger(__name__)
 
-async def retrieve_context(query: str, top_k: int = 5) -> List[Dict]:
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], top_k: int, k: int = 60) -> List[Dict]:
+    """
+    Merges ranked result lists with reciprocal rank fusion: each result scores
+    sum(1 / (k + rank)) over the lists it appears in.
+    """
+    fused: Dict[int, Dict] = {}
+    for results in result_lists:
+        for rank, res in enumerate(results, start=1):
+            vector_id = res["vector_id"]
+            if vector_id not in fused:
+                fused[vector_id] = {"vector_id": vector_id, "score": 0.0, "metadata": res["metadata"]}
+            fused[vector_id]["score"] += 1.0 / (k + rank)
+
+    return sorted(fused.values(), key=lambda r: r["score"], reverse=True)[:top_k]
+
+def diversify(query_embedding: List[float], candidates: List[Dict], top_k: int, lambda_mult: float) -> List[Dict]:
+    """Re-ranks candidates with MMR using their vectors reconstructed from the index."""
+    if len(candidates) <= 1:
+        return candidates[:top_k]
+    with span("mmr", candidates=len(candidates), lambda_mult=lambda_mult), timed_stage("mmr"):
+        vectors = vector_store.reconstruct_vectors([c["vector_id"] for c in candidates])
+        selected = maximal_marginal_relevance(query_embedding, vectors, top_k=top_k, lambda_mult=lambda_mult)
+    return [candidates[i] for i in selected]
+
+async def retrieve_context(
+    query: str,
+    top_k: int = 5,
+    mmr_lambda: Optional[float] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    deadline: Optional[Deadline] = None,
+) -> List[Dict]:
     """
     Retrieves relevant context for a given query.
-    1. Generate embedding for query.
-    2. Search vector store.
-    3. Return list of metadata (with text).
+    1. Start the query embedding call and run BM25 search while it is in flight.
+    2. Search vector store (falling back to lexical-only results if the
+       embedding call fails or exceeds its latency budget).
+    3. Fuse both rankings into a candidate pool.
+    4. Diversify the pool with MMR and return list of metadata (with text).
+
+    `mmr_lambda`, `nprobe` and `ef_search` override the server defaults for
+    this request. If a `deadline` is given, the embedding call gets its share
+    of it and search effort (nprobe, ef_search, or the documents searched by
+    two-stage retrieval) is halved when the request is already behind.
     """
+    deadline = deadline or Deadline()
+    if mmr_lambda is None:
+        mmr_lambda = settings.MMR_LAMBDA
+    use_mmr = settings.MMR_ENABLED and mmr_lambda < 1.0
+    fetch_k = top_k * settings.MMR_FETCH_MULTIPLIER if use_mmr else top_k
+
     try:
-        # Generate embedding
-        # generate_embeddings returns List[List[float]], we take the first one
-        embeddings = await generate_embeddings([query])
-        if not embeddings:
-            logger.warning("Failed to generate embedding for query.")
-            return []
-            
-        query_embedding = embeddings[0]
-        
-        # Search FAISS
-        results = vector_store.similarity_search(query_embedding, top_k=top_k)
-        
-        logger.info(f"Retrieved {len(results)} chunks for query.")
+        # Generate embedding (served from cache for repeated questions)
+        embedding_task = asyncio.create_task(embed_query(query))
+
+        # Search BM25 (in-process, so it overlaps with the network call)
+        with span("lexical_search", top_k=fetch_k), timed_stage("lexical_search"):
+            lexical_results = vector_store.lexical_search(query, top_k=fetch_k)
+
+        budget_ms = settings.EMBEDDING_LATENCY_BUDGET_MS
+        if deadline.bounded:
+            budget_ms = min(budget_ms, deadline.stage_timeout_ms("embedding"))
+
+        try:
+            # Shielded so a late embedding still lands in the cache for next time
+            query_embedding = await asyncio.wait_for(asyncio.shield(embedding_task), timeout=budget_ms / 1000)
+        except asyncio.TimeoutError:
+            logger.warning("Query embedding exceeded %.0fms budget. Using lexical-only results.", budget_ms)
+            deadline.degrade("lexical_only")
+            return lexical_results[:top_k]
+        except Exception as e:
+            logger.warning("Query embedding failed (%s). Using lexical-only results.", e)
+            deadline.degrade("lexical_only")
+            return lexical_results[:top_k]
+
+        annotate(embedding_hash=embedding_fingerprint(query_embedding))
+        # The index may have been migrated to a shorter dimension than EMBEDDING_DIMENSION;
+        # search and MMR both compare against its vectors, so truncate once here
+        dimension = vector_store.dimension
+        if dimension and len(query_embedding) > dimension:
+            query_embedding = truncate_embeddings(query_embedding, dimension)
+
+        # Search FAISS, spending less effort if the embedding stage ran long
+        top_documents = settings.TWO_STAGE_TOP_DOCUMENTS
+        if deadline.behind_schedule("embedding"):
+            nprobe = max((nprobe or settings.DEFAULT_NPROBE) // 2, 1)
+            ef_search = max((ef_search or settings.DEFAULT_EF_SEARCH) // 2, top_k)
+            top_documents = max(top_documents // 2, 1)
+            deadline.degrade("reduced_search_effort")
+
+        two_stage = settings.TWO_STAGE_ENABLED and len(vector_store.centroids) >= settings.TWO_STAGE_MIN_DOCUMENTS
+        with span("vector_search", top_k=fetch_k, nprobe=nprobe or 0, ef_search=ef_search or 0, two_stage=two_stage), \
+                timed_stage("vector_search"):
+            if two_stage:
+                vector_results = vector_store.two_stage_search(
+                    query_embedding, top_k=fetch_k, top_documents=top_documents
+                )
+            else:
+                vector_results = vector_store.similarity_search(
+                    query_embedding, top_k=fetch_k, nprobe=nprobe, ef_search=ef_search
+                )
+
+        if settings.HYBRID_SEARCH_ENABLED and lexical_results:
+            candidates = reciprocal_rank_fusion(
+                [vector_results, lexical_results], top_k=fetch_k, k=settings.RRF_K
+            )
+        else:
+            candidates = vector_results
+
+        if use_mmr:
+            results = diversify(query_embedding, candidates, top_k, mmr_lambda)
+        else:
+            results = candidates[:top_k]
+
+        logger.info("Retrieved %s chunks for query.", len(results), extra=HOT_PATH)
         return results
     except Exception as e:
-        logger.error(f"Error during retrieval: {e}")
+        logger.error("Error during retrieval: %s", e)
         return []
@@ -0,0 +1,79 @@
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Tuple
+from app.services.dedup import duplicate_count
+
+# Directory sizes are walked at most this often
+DISK_USAGE_TTL_S = 10.0
+
+_disk_usage_cache: Dict[str, Tuple[float, int]] = {}
+
+def pickled_size(value: Any) -> int:
+    """Bytes `value` takes in the pickled metadata file."""
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+class StoreStats:
+    """
+    Running per-document accounting of the vector store: stored rows,
+    metadata bytes and chunks collapsed into other rows as duplicates.
+    Updated as rows are added, so reporting never walks the metadata; it is
+    built from the metadata once when a generation is loaded.
+    """
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, int]] = {}
+        self.rows = 0
+        self.metadata_bytes = 0
+        self.duplicate_rows = 0
+
+    @classmethod
+    def from_metadata(cls, metadata: Dict[int, Dict[str, Any]]) -> "StoreStats":
+        stats = cls()
+        for meta in metadata.values():
+            stats.add_row(meta)
+        return stats
+
+    def _document(self, source_file: str) -> Dict[str, int]:
+        if source_file not in self.documents:
+            self.documents[source_file] = {"vectors": 0, "metadata_bytes": 0, "duplicate_rows": 0}
+        return self.documents[source_file]
+
+    def add_row(self, meta: Dict[str, Any]):
+        size = pickled_size(meta)
+        document = self._document(meta.get("source_file", "unknown"))
+        document["vectors"] += 1
+        document["metadata_bytes"] += size
+        self.rows += 1
+        self.metadata_bytes += size
+        self._count_duplicates(meta.get("duplicates", []), duplicate_count(meta))
+
+    def add_duplicates(self, meta: Dict[str, Any], refs: List[Dict[str, Any]], count: int):
+        """
+        Accounts for `count` chunks merged into the existing row `meta`, of
+        which `refs` were listed on it.
+        """
+        size = pickled_size(refs)
+        self._document(meta.get("source_file", "unknown"))["metadata_bytes"] += size
+        self.metadata_bytes += size
+        self._count_duplicates(refs, count)
+
+    def _count_duplicates(self, refs: List[Dict[str, Any]], count: int):
+        # Per document only as far as refs are listed; the total counts every collapsed chunk
+        for ref in refs:
+            self._document(ref["source_file"])["duplicate_rows"] += 1
+        self.duplicate_rows += count
+
+def directory_bytes(path: str) -> int:
+    """Total size of the files under `path`, cached for DISK_USAGE_TTL_S."""
+    cached = _disk_usage_cache.get(path)
+    if cached is not None and time.monotonic() - cached[0] < DISK_USAGE_TTL_S:
+        return cached[1]
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Pruned or renamed while walking
+    _disk_usage_cache[path] = (time.monotonic(), total)
+    return total
@@ -0,0 +1,81 @@
+import base64
+import glob
+import json
+import os
+from typing import Any, Dict, List, Mapping, Optional
+from app.core.config import settings
+from app.core.logging import request_id_var
+from app.services.query_log import QueryLogWriter
+
+TRAFFIC_DIR = os.path.join(settings.DATA_DIR, "traffic")
+TRAFFIC_CAPTURE_FILE = os.path.join(TRAFFIC_DIR, "capture.jsonl")
+
+CAPTURED_PATHS = ("/api/query", "/api/upload")
+# Request headers that change how a request is served, replayed as captured
+CAPTURED_HEADERS = ("content-type", "x-traffic-class", "x-trace")
+
+_writer = QueryLogWriter(TRAFFIC_CAPTURE_FILE, name="traffic-capture", max_bytes=settings.TRAFFIC_CAPTURE_MAX_FILE_BYTES)
+
+def should_capture(path: str) -> bool:
+    return settings.TRAFFIC_CAPTURE_ENABLED and path in CAPTURED_PATHS
+
+def record_request(
+    method: str,
+    path: str,
+    headers: Mapping[str, str],
+    body: Optional[bytes],
+    body_bytes: int,
+    started_at: float,
+    status: int,
+    latency_ms: float,
+):
+    """
+    Queues one captured request. `body` is None when it was too large to
+    keep; `latency_ms` is the time until response headers were ready.
+    """
+    entry: Dict[str, Any] = {
+        "ts": started_at,
+        "request_id": request_id_var.get(),
+        "method": method,
+        "path": path,
+        "headers": {name: headers[name] for name in CAPTURED_HEADERS if name in headers},
+        "body_bytes": body_bytes,
+        "status": status,
+        "latency_ms": round(latency_ms, 3),
+    }
+    if body is not None:
+        try:
+            entry["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(body).decode("ascii")
+    _writer.write(entry)
+
+def entry_body(entry: Dict[str, Any]) -> Optional[bytes]:
+    """The captured request body, or None if it was not kept."""
+    if "body" in entry:
+        return entry["body"].encode("utf-8")
+    if "body_b64" in entry:
+        return base64.b64decode(entry["body_b64"])
+    return None
+
+def read_capture(paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Captured entries from the given files (or directories of capture
+    files, rolled ones included), in arrival order.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "capture*.jsonl"))))
+        else:
+            files.append(path)
+    entries = []
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # Torn last line from a crash
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
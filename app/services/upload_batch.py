@@ -0,0 +1,347 @@
+"""
+Multi-file and archive uploads, ingested as one batch.
+
+Every upload becomes a batch with a handle (batch_id) and a per-file
+status. Files are staged to UPLOAD_DIR while the request is read: plain
+files as they are, ZIP archives member by member, so an archive never has
+to fit in memory. The files are then ingested UPLOAD_BATCH_CONCURRENCY at a
+time, each through its own IngestionPipeline, and everything they embedded
+is published in one index generation at the end instead of one per file.
+A single-file upload keeps the progressive commits of the pipeline.
+
+Batch status is written to data/batches/<batch_id>.json, so any worker
+can answer a status request for a batch another worker is running.
+"""
+import asyncio
+import json
+import os
+import posixpath
+import time
+import uuid
+import zipfile
+from typing import Any, BinaryIO, Dict, List, Optional
+from fastapi import UploadFile
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import INGESTION_DOCUMENT_LATENCY
+from app.services.ingestion import UPLOAD_DIR, IngestionPipeline, commit_chunks, flatten_batches, process_document
+
+logger = get_logger(__name__)
+
+BATCH_DIR = os.path.join(settings.DATA_DIR, "batches")
+
+DOCUMENT_EXTENSIONS = (".pdf", ".txt")
+ARCHIVE_EXTENSIONS = (".zip",)
+
+# Bytes copied per read when staging files and archive members
+COPY_BUFFER_BYTES = 1024 * 1024
+
+# Batch status files are rewritten at most this often while files are in progress
+STATUS_WRITE_INTERVAL_S = 1.0
+
+# Raised when a staged path collides with another file of the upload (x.pdf next to x.pdf/y.pdf)
+PATH_CLASH_ERRORS = (IsADirectoryError, NotADirectoryError, FileExistsError)
+
+class UploadRejected(ValueError):
+    """The upload as a whole is unusable (no supported files, too many files, bad archive)."""
+
+class UploadBatch:
+    """
+    One upload request's files and their ingestion status:
+    queued -> processing -> embedded -> indexed, or failed / empty / skipped.
+    """
+    def __init__(self, batch_id: Optional[str] = None):
+        self.batch_id = batch_id or uuid.uuid4().hex
+        self.status = "receiving"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.files: List[Dict[str, Any]] = []
+        self.paths: Dict[str, str] = {}  # Staged file name -> path on disk
+        self._last_write = 0.0
+
+    def add_file(self, name: str, path: Optional[str], status: str = "queued", detail: Optional[str] = None):
+        self.files.append({"name": name, "status": status, "chunks": 0, "vectors": 0, "duplicates": 0, "detail": detail})
+        if path is not None:
+            self.paths[name] = path
+
+    @property
+    def documents(self) -> List[Dict[str, Any]]:
+        return [entry for entry in self.files if entry["name"] in self.paths]
+
+    def to_dict(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for entry in self.files:
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "counts": counts,
+            "files": self.files,
+        }
+
+    def save(self, force: bool = True) -> bool:
+        """
+        Writes the status file (atomically); unforced writes are throttled.
+        Returns False if it could not be written, which is logged rather than
+        raised so a full or read-only disk cannot abort ingestion.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_write < STATUS_WRITE_INTERVAL_S:
+            return True
+        self._last_write = now
+        path = batch_path(self.batch_id)
+        try:
+            os.makedirs(BATCH_DIR, exist_ok=True)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.error("Could not write status of batch %s: %s", self.batch_id, e)
+            return False
+        return True
+
+# Batches started by this process, by id
+batches: Dict[str, UploadBatch] = {}
+
+def batch_path(batch_id: str) -> str:
+    return os.path.join(BATCH_DIR, f"{batch_id}.json")
+
+def get_batch_status(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Status of a batch started by any worker, or None if unknown."""
+    if batch_id in batches:
+        return batches[batch_id].to_dict()
+    if not all(c in "0123456789abcdef" for c in batch_id):
+        return None
+    try:
+        with open(batch_path(batch_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def prune_batch_history():
+    """Keeps the newest UPLOAD_BATCH_HISTORY status files."""
+    try:
+        names = [name for name in os.listdir(BATCH_DIR) if name.endswith(".json")]
+    except OSError:
+        return
+    paths = sorted((os.path.join(BATCH_DIR, name) for name in names), key=os.path.getmtime, reverse=True)
+    for path in paths[settings.UPLOAD_BATCH_HISTORY:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# --- Staging --------------------------------------------------------------
+
+def safe_relative_path(name: str) -> Optional[str]:
+    """
+    Normalizes an uploaded or archived file name to a relative POSIX path
+    under UPLOAD_DIR, or None if it is absolute or climbs out of the directory.
+    """
+    name = name.replace("\\", "/")
+    if name.startswith("/") or (len(name) > 1 and name[1] == ":"):
+        return None
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or ".." in parts:
+        return None
+    return "/".join(parts)
+
+def is_archive_metadata(name: str) -> bool:
+    """Entries archivers add that are not user files (__MACOSX/, .DS_Store and other dotfiles)."""
+    return any(part == "__MACOSX" or part.startswith(".") for part in name.split("/"))
+
+def _copy_limited(source: BinaryIO, path: str, limit: Optional[int]) -> int:
+    """Copies `source` to `path`, failing once more than `limit` bytes (if any) have been written."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                block = source.read(COPY_BUFFER_BYTES)
+                if not block:
+                    break
+                written += len(block)
+                if limit is not None and written > limit:
+                    raise UploadRejected(f"Archive expands past UPLOAD_MAX_ARCHIVE_BYTES ({limit} bytes)")
+                out.write(block)
+    except BaseException:
+        # Leave no partial file behind; it is not in batch.paths yet, so create_batch would miss it
+        if os.path.isfile(path):
+            os.remove(path)
+        raise
+    return written
+
+def _stage_document(batch: UploadBatch, name: str, source: BinaryIO, limit: Optional[int] = None) -> int:
+    if len(batch.paths) >= settings.UPLOAD_MAX_FILES:
+        raise UploadRejected(f"Too many files in one upload (UPLOAD_MAX_FILES={settings.UPLOAD_MAX_FILES})")
+    path = os.path.join(UPLOAD_DIR, *name.split("/"))
+    written = _copy_limited(source, path, limit)
+    batch.add_file(name, path)
+    return written
+
+def _unpack_archive(batch: UploadBatch, archive_name: str, fileobj: BinaryIO):
+    """
+    Stages the supported documents of a ZIP archive one member at a time.
+    Members keep their path inside the archive as their document name, so
+    same-named files in different folders stay apart. Sizes are enforced on
+    the bytes actually decompressed, not on what the archive claims.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise UploadRejected(f"{archive_name} is not a valid ZIP archive")
+    remaining = settings.UPLOAD_MAX_ARCHIVE_BYTES
+    with archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            name = safe_relative_path(member.filename)
+            if name is None:
+                batch.add_file(member.filename, None, status="skipped", detail="Unsafe path in archive")
+                continue
+            if is_archive_metadata(name):
+                continue
+            if not name.lower().endswith(DOCUMENT_EXTENSIONS):
+                batch.add_file(name, None, status="skipped", detail="Unsupported file type")
+                continue
+            if name in batch.paths:
+                batch.add_file(name, None, status="skipped", detail="Duplicate name in upload")
+                continue
+            try:
+                with archive.open(member) as source:
+                    remaining -= _stage_document(batch, name, source, remaining)
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+                # Corrupt, encrypted or unsupported-compression members
+                batch.add_file(name, None, status="skipped", detail=str(e))
+            except PATH_CLASH_ERRORS:
+                batch.add_file(name, None, status="skipped", detail="Path clashes with another file in the upload")
+
+def stage_uploads(batch: UploadBatch, uploads: List[UploadFile]):
+    """
+    Saves the request's files (unpacking archives) under UPLOAD_DIR. Blocking;
+    run it in a worker thread. Raises UploadRejected if nothing can be
+    ingested, OSError if the disk fails (full, read-only).
+    """
+    for upload in uploads:
+        filename = upload.filename or ""
+        if filename.lower().endswith(ARCHIVE_EXTENSIONS):
+            _unpack_archive(batch, filename, upload.file)
+            continue
+        # Client-supplied directories are dropped; only the base name is kept
+        name = safe_relative_path(posixpath.basename(filename.replace("\\", "/")))
+        if name is None or not name.lower().endswith(DOCUMENT_EXTENSIONS):
+            batch.add_file(filename, None, status="skipped", detail="Unsupported file type")
+        elif name in batch.paths:
+            batch.add_file(name, None, status="skipped", detail="Duplicate name in upload")
+        else:
+            try:
+                _stage_document(batch, name, upload.file)
+            except PATH_CLASH_ERRORS:
+                batch.add_file(name, None, status="skipped", detail="Path clashes with another file in the upload")
+    if not batch.paths:
+        raise UploadRejected("No PDF or TXT files in the upload")
+
+async def create_batch(uploads: List[UploadFile]) -> UploadBatch:
+    """Stages an upload request's files as a new batch, ready for run_batch."""
+    batch = UploadBatch()
+    try:
+        await asyncio.to_thread(stage_uploads, batch, uploads)
+    except BaseException:
+        # Rejected, disk error or cancelled: nothing of the upload stays on disk
+        for path in batch.paths.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+    batch.status = "queued"
+    batches[batch.batch_id] = batch
+    batch.save()
+    prune_batch_history()
+    return batch
+
+# --- Ingestion ------------------------------------------------------------
+
+def _record_pipeline(entry: Dict[str, Any], pipeline: IngestionPipeline):
+    entry["chunks"] = pipeline.chunks
+    entry["duplicates"] = pipeline.deduplicator.collapsed if pipeline.deduplicator else 0
+    if pipeline.error is not None:
+        entry["status"], entry["detail"] = "failed", pipeline.error
+    elif not pipeline.chunks:
+        entry["status"], entry["detail"] = "empty", "No text extracted"
+    elif pipeline.defer_commit:
+        entry["status"] = "embedded"
+    else:
+        entry["status"], entry["vectors"] = "indexed", pipeline.indexed
+
+async def run_batch(batch: UploadBatch):
+    """
+    Background task: ingests the batch's files in parallel, then commits
+    everything they embedded as one index generation.
+    """
+    documents = batch.documents
+    defer_commit = len(documents) > 1
+    batch.status = "processing"
+    batch.save()
+    logger.info("Starting batch %s: %s files", batch.batch_id, len(documents))
+    start = time.perf_counter()
+
+    slots = asyncio.Semaphore(max(1, settings.UPLOAD_BATCH_CONCURRENCY))
+
+    async def ingest(entry: Dict[str, Any]) -> IngestionPipeline:
+        async with slots:
+            entry["status"] = "processing"
+            batch.save(force=False)
+            pipeline = await process_document(batch.paths[entry["name"]], entry["name"], defer_commit=defer_commit)
+            _record_pipeline(entry, pipeline)
+            batch.save(force=False)
+            return pipeline
+
+    try:
+        pipelines = await asyncio.gather(*(ingest(entry) for entry in documents))
+
+        if defer_commit:
+            batch.status = "committing"
+            batch.save()
+            await _commit_batch(documents, pipelines)
+    except Exception as e:
+        logger.error("Batch %s failed: %s", batch.batch_id, e)
+        for entry in documents:
+            if entry["status"] in ("queued", "processing", "embedded"):
+                entry["status"], entry["detail"] = "failed", f"Batch failed: {e}"
+
+    batch.status = "complete" if any(entry["status"] == "indexed" for entry in batch.files) else "failed"
+    batch.finished_at = time.time()
+    if batch.save():
+        batches.pop(batch.batch_id, None)  # The status file is authoritative from here on
+    logger.info(
+        "Batch %s %s in %.2fs: %s", batch.batch_id, batch.status, time.perf_counter() - start, batch.to_dict()["counts"]
+    )
+
+async def _commit_batch(documents: List[Dict[str, Any]], pipelines: List[IngestionPipeline]):
+    """Publishes every embedded file of a batch in a single vector store commit."""
+    chunks, signatures, embeddings = [], [], []
+    duplicate_sources: Dict[int, List[Dict]] = {}
+    owners = []  # Batch entry of each chunk, for per-file vector counts
+    for entry, pipeline in zip(documents, pipelines):
+        if entry["status"] != "embedded":
+            continue
+        file_chunks, file_signatures, file_embeddings = flatten_batches(pipeline.pending)
+        pipeline.pending = []
+        chunks.extend(file_chunks)
+        signatures.extend(file_signatures)
+        embeddings.extend(file_embeddings)
+        owners.extend([entry] * len(file_chunks))
+        if pipeline.deduplicator:
+            for vector_id, refs in pipeline.deduplicator.take_existing_duplicates().items():
+                duplicate_sources.setdefault(vector_id, []).extend(refs)
+
+    vector_ids = await commit_chunks(chunks, signatures, embeddings, duplicate_sources)
+    for entry, _ in zip(owners, vector_ids):
+        entry["vectors"] += 1
+    for entry, pipeline in zip(documents, pipelines):
+        if entry["status"] == "embedded":
+            entry["status"] = "indexed"
+            INGESTION_DOCUMENT_LATENCY.labels(milestone="first_searchable").observe(time.perf_counter() - pipeline.started)
@@ -1,90 +1,604 @@
 import os
+import time
+import json
+import shutil
+import asyncio
+import hashlib
 import pickle
+import tempfile
+import threading
+from contextlib import contextmanager
 import faiss
 import numpy as np
-from typing import List, Dict, Any
-from app.core.logging import setup_logging
+from typing import List, Dict, Any, Iterator, Optional
+from app.core.logging import get_logger, HOT_PATH
 from app.core.config import settings
+from app.core.metrics import INDEX_SIZE, SEARCH_LATENCY
+from app.services.lexical_index import LexicalIndex
+from app.services.dedup import NearDuplicateIndex, add_duplicate_refs, minhasher, new_near_duplicate_index
+from app.services.embeddings import truncate_embeddings
+from app.services.centroids import DocumentCentroids
+from app.services.store_stats import StoreStats
 
-logger = setup_logging()
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = get_logger(__name__)
 
 # Use configurable data directory for Fly.io volume support
 INDEX_DIR = os.path.join(settings.DATA_DIR, "faiss_index")
-INDEX_FILE = os.path.join(INDEX_DIR, "index.faiss")
-METADATA_FILE = os.path.join(INDEX_DIR, "metadata.pkl")
+GENERATIONS_DIR = os.path.join(INDEX_DIR, "generations")
+CURRENT_FILE = os.path.join(INDEX_DIR, "CURRENT")  # Number of the generation being served
+LOCK_FILE = os.path.join(INDEX_DIR, ".lock")
+
+# Files inside each generation directory
+INDEX_FILENAME = "index.faiss"
+METADATA_FILENAME = "metadata.pkl"
+LEXICAL_FILENAME = "lexical.pkl"
+DEDUP_FILENAME = "dedup.pkl"
+CENTROIDS_FILENAME = "centroids.pkl"
+MANIFEST_FILENAME = "MANIFEST.json"
+
+# Pre-snapshot layout, still loaded once so existing deployments keep their data
+LEGACY_INDEX_FILE = os.path.join(INDEX_DIR, INDEX_FILENAME)
+LEGACY_METADATA_FILE = os.path.join(INDEX_DIR, METADATA_FILENAME)
+
+def generation_dir(generation: int) -> str:
+    return os.path.join(GENERATIONS_DIR, f"gen-{generation:06d}")
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def add_to_centroids(
+    centroids: DocumentCentroids, vector_ids: List[int], vectors: np.ndarray, metadata: Dict[int, Dict[str, Any]]
+):
+    """Adds vectors to the centroids of their chunk's document and of any near-duplicates' documents."""
+    by_document: Dict[str, List[int]] = {}
+    for position, vector_id in enumerate(vector_ids):
+        meta = metadata[vector_id]
+        documents = {meta.get("source_file", "unknown")}
+        documents.update(ref["source_file"] for ref in meta.get("duplicates", []))
+        for document in documents:
+            by_document.setdefault(document, []).append(position)
+    for document, positions in by_document.items():
+        centroids.add(document, [vector_ids[p] for p in positions], vectors[positions])
+
+def build_index(dim: int, training_vectors: np.ndarray) -> faiss.Index:
+    """
+    Builds an empty index from settings.FAISS_INDEX_FACTORY, training it on
+    `training_vectors` if the index type needs it. Falls back to exact search
+    if there are too few vectors to train on.
+    """
+    try:
+        index = faiss.index_factory(dim, settings.FAISS_INDEX_FACTORY)
+        if not index.is_trained:
+            index.train(training_vectors)
+    except Exception as e:
+        logger.warning("Could not build '%s' index (%s). Falling back to Flat.", settings.FAISS_INDEX_FACTORY, e)
+        index = faiss.IndexFlatL2(dim)
+    return index
+
+def search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    Per-query search parameters for the search-effort knobs `index` supports,
+    defaulting to DEFAULT_NPROBE / DEFAULT_EF_SEARCH.
+    """
+    if faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(nprobe=nprobe or settings.DEFAULT_NPROBE)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or settings.DEFAULT_EF_SEARCH)
+    return None  # Exact search has no effort knob
+
+def enable_reconstruction(index: faiss.Index):
+    # IVF indexes need a direct map for reconstruct() (used by MMR and centroids)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
 
 class VectorStore:
     def __init__(self):
         self.index = None
         self.metadata = {}  # Map vector_id (int) -> metadata (dict)
         self.dimension = None
+        self.lexical_index = LexicalIndex(k1=settings.BM25_K1, b=settings.BM25_B)
+        self.dedup_index = new_near_duplicate_index()  # MinHash LSH over chunk text, keyed by vector id
+        self.centroids = DocumentCentroids()  # Per-document centroid and chunk ids for two-stage search
+        self.generation = 0  # Index generation last loaded or published by this process
+        self.read_only = False  # True while the index is memory-mapped from disk
+        self.last_save_seconds = 0.0  # Duration of the write that produced the current generation
+        self.stats = StoreStats()  # Per-document rows, metadata bytes and duplicates, kept up to date incrementally
+        self.index_bytes_per_vector: Optional[float] = None  # From the size of the last written or loaded index file
+        # Guards the in-memory state: commits change it from worker threads, searches read it on the event loop
+        self.lock = threading.RLock()
         
         # Ensure directory exists
         os.makedirs(INDEX_DIR, exist_ok=True)
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """
+        Cross-process lock on the index directory: writers hold it exclusively
+        while publishing a generation, readers share it while loading one.
+        """
+        if fcntl is None:  # Not available on Windows; single-process only there
+            yield
+            return
+        with open(LOCK_FILE, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def disk_generation(self) -> int:
+        """Returns the generation CURRENT points at (0 if none has been published)."""
+        try:
+            with open(CURRENT_FILE) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def list_generations(self) -> List[Dict[str, Any]]:
+        """Manifests of the snapshots on disk, newest first."""
+        generations = []
+        if os.path.isdir(GENERATIONS_DIR):
+            for name in os.listdir(GENERATIONS_DIR):
+                if not name.startswith("gen-"):
+                    continue  # Unfinished snapshot
+                try:
+                    with open(os.path.join(GENERATIONS_DIR, name, MANIFEST_FILENAME)) as f:
+                        generations.append(json.load(f))
+                except (OSError, ValueError):
+                    logger.warning("Skipping snapshot without a readable manifest: %s", name)
+        return sorted(generations, key=lambda m: m["generation"], reverse=True)
         
     def load_index(self):
         """
-        Loads the FAISS index and metadata from disk if they exist.
+        Loads the generation CURRENT points at, falling back to the newest
+        snapshot that passes its checksums if that one is missing or corrupt.
         Otherwise initializes a new state.
+
+        With settings.INDEX_MMAP the vectors are memory-mapped read-only so
+        worker processes share them through the OS page cache.
         """
-        if os.path.exists(INDEX_FILE) and os.path.exists(METADATA_FILE):
-            try:
-                self.index = faiss.read_index(INDEX_FILE)
-                with open(METADATA_FILE, "rb") as f:
-                    self.metadata = pickle.load(f)
-                
-                self.dimension = self.index.d
-                logger.info(f"FAISS index loaded. Vectors: {self.index.ntotal}")
-            except Exception as e:
-                logger.error(f"Error loading FAISS index: {e}")
-                self._initialize_empty_index()
-        else:
+        with self._file_lock(exclusive=False):
+            state = self._read_latest_valid_state(mmap=settings.INDEX_MMAP)
+
+        if state is None:
             logger.info("No existing FAISS index found. Starting fresh.")
             self._initialize_empty_index()
+            return
+
+        self._apply_state(state)
+        logger.info(
+            "FAISS index loaded. Vectors: %s, generation: %s, mmap: %s",
+            self.index.ntotal, self.generation, self.read_only
+        )
+        if self.dimension < settings.EMBEDDING_DIMENSION:
+            logger.warning(
+                "Index dimension %s is below EMBEDDING_DIMENSION %s (e.g. mid-migration); queries and uploads "
+                "are truncated to fit. Set EMBEDDING_DIMENSION=%s to stop requesting the unused components.",
+                self.dimension, settings.EMBEDDING_DIMENSION, self.dimension
+            )
+        elif self.dimension > settings.EMBEDDING_DIMENSION:
+            logger.error(
+                "Index dimension %s is above EMBEDDING_DIMENSION %s; queries and uploads cannot be searched or "
+                "added. Set EMBEDDING_DIMENSION=%s, or shrink the index with app.tools.migrate_dimension first.",
+                self.dimension, settings.EMBEDDING_DIMENSION, self.dimension
+            )
+
+    def _read_latest_valid_state(self, mmap: bool) -> Optional[Dict[str, Any]]:
+        """Caller holds the lock."""
+        current = self.disk_generation()
+        candidates = [current] + [m["generation"] for m in self.list_generations() if m["generation"] != current]
+        for generation in candidates:
+            if not os.path.isdir(generation_dir(generation)):
+                continue
+            try:
+                return self._read_state(generation, mmap)
+            except Exception as e:
+                logger.error("Skipping index generation %s: %s", generation, e)
+
+        if os.path.exists(LEGACY_INDEX_FILE) and os.path.exists(LEGACY_METADATA_FILE):
+            try:
+                return self._read_legacy_state()
+            except Exception as e:
+                logger.error("Error loading FAISS index: %s", e)
+        return None
+
+    def _read_state(self, generation: int, mmap: bool) -> Dict[str, Any]:
+        """
+        Reads one snapshot without touching the live state, so it can run off
+        the event loop. Raises if any file fails its manifest checksum.
+        Caller holds the lock.
+        """
+        directory = generation_dir(generation)
+        with open(os.path.join(directory, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+        for name, checksum in manifest["checksums"].items():
+            if file_checksum(os.path.join(directory, name)) != checksum:
+                raise ValueError(f"checksum mismatch for {name}")
+
+        flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index = faiss.read_index(os.path.join(directory, INDEX_FILENAME), flags)
+        with open(os.path.join(directory, METADATA_FILENAME), "rb") as f:
+            metadata = pickle.load(f)
+        return {
+            "index": index,
+            "metadata": metadata,
+            "lexical_index": self._read_lexical_index(os.path.join(directory, LEXICAL_FILENAME), metadata),
+            "dedup_index": self._read_dedup_index(os.path.join(directory, DEDUP_FILENAME), metadata),
+            "centroids": self._read_centroids(os.path.join(directory, CENTROIDS_FILENAME), index, metadata),
+            "stats": StoreStats.from_metadata(metadata),
+            "index_bytes_per_vector": self._bytes_per_vector(os.path.join(directory, INDEX_FILENAME), index),
+            "save_seconds": manifest.get("save_seconds", 0.0),
+            "generation": generation,
+            "read_only": mmap,
+        }
+
+    def _read_legacy_state(self) -> Dict[str, Any]:
+        """Reads an index saved before snapshots existed; the next save migrates it."""
+        index = faiss.read_index(LEGACY_INDEX_FILE)
+        with open(LEGACY_METADATA_FILE, "rb") as f:
+            metadata = pickle.load(f)
+        return {
+            "index": index,
+            "metadata": metadata,
+            "lexical_index": self._read_lexical_index(os.path.join(INDEX_DIR, LEXICAL_FILENAME), metadata),
+            "dedup_index": self._read_dedup_index(os.path.join(INDEX_DIR, DEDUP_FILENAME), metadata),
+            "centroids": self._read_centroids(os.path.join(INDEX_DIR, CENTROIDS_FILENAME), index, metadata),
+            "stats": StoreStats.from_metadata(metadata),
+            "index_bytes_per_vector": self._bytes_per_vector(LEGACY_INDEX_FILE, index),
+            "save_seconds": 0.0,
+            "generation": 0,
+            "read_only": False,
+        }
+
+    def _apply_state(self, state: Dict[str, Any]):
+        self.index = state["index"]
+        self.metadata = state["metadata"]
+        self.lexical_index = state["lexical_index"]
+        self.dedup_index = state["dedup_index"]
+        self.centroids = state["centroids"]
+        self.stats = state["stats"]
+        self.index_bytes_per_vector = state["index_bytes_per_vector"]
+        self.last_save_seconds = state["save_seconds"]
+        self.dimension = self.index.d
+        self.generation = state["generation"]
+        self.read_only = state["read_only"]
+        self._enable_reconstruction()
+
+    async def refresh_if_stale(self) -> bool:
+        """
+        Hot-reloads the index if another process published (or rolled back
+        to) a different generation. Loading happens in a worker thread; the
+        swap happens on the event loop, so in-flight searches see either the
+        old or the new state, never a mix.
+        """
+        if self.disk_generation() == self.generation:
+            return False
+
+        def read_locked():
+            with self._file_lock(exclusive=False):
+                return self._read_state(self.disk_generation(), mmap=settings.INDEX_MMAP)
+
+        state = await asyncio.to_thread(read_locked)
+        # Ignore the result if CURRENT moved again while reading
+        if state["generation"] == self.generation or state["generation"] != self.disk_generation():
+            return False
+
+        with self.lock:
+            self._apply_state(state)
+        logger.info("Reloaded FAISS index generation %s. Vectors: %s", self.generation, self.index.ntotal)
+        return True
+
+    async def rollback(self, generation: int) -> Dict[str, Any]:
+        """
+        Points CURRENT back at an older snapshot and serves it immediately.
+        Other workers follow on their next poll; the next upload builds on
+        the rolled-back state. Raises FileNotFoundError for unknown snapshots
+        and ValueError for ones that fail their checksums.
+        """
+        if not os.path.isdir(generation_dir(generation)):
+            raise FileNotFoundError(f"Index generation {generation} does not exist")
+
+        def read_and_publish():
+            with self._file_lock(exclusive=True):
+                state = self._read_state(generation, mmap=settings.INDEX_MMAP)
+                self._publish_current(generation)
+                # Swapped in before the lock is released, so a commit waiting on it builds on this state
+                with self.lock:
+                    self._apply_state(state)
+
+        await asyncio.to_thread(read_and_publish)
+        logger.warning("Rolled back FAISS index to generation %s. Vectors: %s", generation, self.index.ntotal)
+        return {"generation": generation, "vectors": self.index.ntotal}
+
+    def _read_lexical_index(self, path: str, metadata: Dict[int, Dict[str, Any]]) -> LexicalIndex:
+        """
+        Loads the BM25 index persisted next to the FAISS index, rebuilding it
+        from chunk metadata if it is missing or out of sync.
+        """
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    lexical_index = pickle.load(f)
+                if len(lexical_index) == len(metadata):
+                    return lexical_index
+                logger.warning("Lexical index out of sync with metadata. Rebuilding.")
+            except Exception as e:
+                logger.error("Error loading lexical index: %s. Rebuilding.", e)
+
+        lexical_index = self._build_lexical_index(metadata)
+        logger.info("Lexical index rebuilt. Documents: %s", len(lexical_index))
+        return lexical_index
+
+    @staticmethod
+    def _build_lexical_index(metadata: Dict[int, Dict[str, Any]]) -> LexicalIndex:
+        lexical_index = LexicalIndex(k1=settings.BM25_K1, b=settings.BM25_B)
+        for vector_id, meta in metadata.items():
+            lexical_index.add(vector_id, meta.get("text", ""))
+        return lexical_index
+
+    def _read_dedup_index(self, path: str, metadata: Dict[int, Dict[str, Any]]) -> NearDuplicateIndex:
+        """Loads the near-duplicate index, rebuilding it from chunk text if it is missing."""
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+            except Exception as e:
+                logger.error("Error loading near-duplicate index: %s. Rebuilding.", e)
+
+        dedup_index = self._build_dedup_index(metadata)
+        if settings.DEDUP_ENABLED:
+            logger.info("Near-duplicate index rebuilt. Chunks: %s", len(dedup_index))
+        return dedup_index
+
+    @staticmethod
+    def _build_dedup_index(metadata: Dict[int, Dict[str, Any]]) -> NearDuplicateIndex:
+        dedup_index = new_near_duplicate_index()
+        if settings.DEDUP_ENABLED:
+            for vector_id, meta in metadata.items():
+                signature = minhasher.signature(meta.get("text", ""))
+                if signature is not None:
+                    dedup_index.add(vector_id, signature)
+        return dedup_index
+
+    def _read_centroids(self, path: str, index: faiss.Index, metadata: Dict[int, Dict[str, Any]]) -> DocumentCentroids:
+        """Loads per-document centroids, rebuilding them from the stored vectors if missing."""
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+            except Exception as e:
+                logger.error("Error loading document centroids: %s. Rebuilding.", e)
+        centroids = self._build_centroids(index, metadata)
+        logger.info("Document centroids rebuilt. Documents: %s", len(centroids))
+        return centroids
+
+    @staticmethod
+    def _build_centroids(index: faiss.Index, metadata: Dict[int, Dict[str, Any]], batch_size: int = 65536) -> DocumentCentroids:
+        centroids = DocumentCentroids()
+        for start in range(0, index.ntotal, batch_size):
+            count = min(batch_size, index.ntotal - start)
+            vectors = index.reconstruct_n(start, count)
+            ids = [vector_id for vector_id in range(start, start + count) if vector_id in metadata]
+            add_to_centroids(centroids, ids, vectors[[vector_id - start for vector_id in ids]], metadata)
+        return centroids
+
+    @staticmethod
+    def _bytes_per_vector(path: str, index: faiss.Index) -> Optional[float]:
+        if index.ntotal == 0:
+            return None
+        return os.path.getsize(path) / index.ntotal
+
+    def _create_index(self, dim: int, training_vectors: np.ndarray):
+        self.index = build_index(dim, training_vectors)
+        self._enable_reconstruction()
+
+    def _enable_reconstruction(self):
+        enable_reconstruction(self.index)
 
     def _initialize_empty_index(self):
         self.index = None # Will be initialized on first add
         self.metadata = {}
         self.dimension = None
+        self.lexical_index = LexicalIndex(k1=settings.BM25_K1, b=settings.BM25_B)
+        self.dedup_index = new_near_duplicate_index()
+        self.centroids = DocumentCentroids()
+        self.stats = StoreStats()
+        self.index_bytes_per_vector = None
+        self.generation = self.disk_generation()
+        self.read_only = False
 
     def save_index(self):
         """
-        Persists the current index and metadata to disk.
+        Persists the current index and metadata to disk and publishes them as
+        a new generation.
         """
         if self.index is None:
             logger.warning("Attempted to save empty index. Skipping.")
             return
 
         try:
-            faiss.write_index(self.index, INDEX_FILE)
-            with open(METADATA_FILE, "wb") as f:
-                pickle.dump(self.metadata, f)
-            logger.info(f"FAISS index saved to disk. Total vectors: {self.index.ntotal}")
+            with self._file_lock(exclusive=True):
+                self._write_generation()
         except Exception as e:
-            logger.error(f"Error saving FAISS index: {e}")
+            logger.error("Error saving FAISS index: %s", e)
 
-    def add_embeddings(self, embeddings: List[List[float]], metadatas: List[Dict[str, Any]]):
+    def _write_generation(self):
         """
-        Adds embeddings to the FAISS index and stores associated metadata.
+        Writes a complete snapshot (index, metadata, lexical index and a
+        manifest of checksums) into a temp directory, renames it into place
+        and then atomically repoints CURRENT at it. A crash at any step leaves
+        the previous generation intact and served. Caller holds the exclusive lock.
+        """
+        start = time.perf_counter()
+        existing = [m["generation"] for m in self.list_generations()]
+        generation = max(existing + [self.disk_generation(), self.generation]) + 1
+
+        os.makedirs(GENERATIONS_DIR, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=GENERATIONS_DIR)
+        try:
+            faiss.write_index(self.index, os.path.join(staging, INDEX_FILENAME))
+            with open(os.path.join(staging, METADATA_FILENAME), "wb") as f:
+                pickle.dump(self.metadata, f)
+            with open(os.path.join(staging, LEXICAL_FILENAME), "wb") as f:
+                pickle.dump(self.lexical_index, f)
+            with open(os.path.join(staging, DEDUP_FILENAME), "wb") as f:
+                pickle.dump(self.dedup_index, f)
+            with open(os.path.join(staging, CENTROIDS_FILENAME), "wb") as f:
+                pickle.dump(self.centroids, f)
+
+            manifest = {
+                "generation": generation,
+                "created_at": time.time(),
+                "vectors": self.index.ntotal,
+                "dimension": self.dimension,
+                "save_seconds": time.perf_counter() - start,
+                "checksums": {
+                    name: file_checksum(os.path.join(staging, name))
+                    for name in (INDEX_FILENAME, METADATA_FILENAME, LEXICAL_FILENAME, DEDUP_FILENAME, CENTROIDS_FILENAME)
+                },
+            }
+            with open(os.path.join(staging, MANIFEST_FILENAME), "w") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            index_bytes_per_vector = self._bytes_per_vector(os.path.join(staging, INDEX_FILENAME), self.index)
+            os.rename(staging, generation_dir(generation))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self._publish_current(generation)
+        self.generation = generation
+        self.index_bytes_per_vector = index_bytes_per_vector
+        self._prune_generations()
+        self.last_save_seconds = time.perf_counter() - start
+        logger.info("FAISS index saved to disk. Total vectors: %s, generation: %s", self.index.ntotal, generation)
+
+    def _publish_current(self, generation: int):
+        tmp_path = CURRENT_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CURRENT_FILE)
+
+    def _prune_generations(self):
+        """Keeps the newest INDEX_KEEP_GENERATIONS snapshots (and whichever one is current)."""
+        current = self.disk_generation()
+        for manifest in self.list_generations()[settings.INDEX_KEEP_GENERATIONS:]:
+            if manifest["generation"] != current:
+                # Workers that still map these files keep them alive until they reload
+                shutil.rmtree(generation_dir(manifest["generation"]), ignore_errors=True)
+
+    def commit(
+        self,
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        signatures: Optional[List[Optional[np.ndarray]]] = None,
+        duplicate_sources: Optional[Dict[int, List[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        """
+        Adds embeddings and publishes the result as a new generation, as the
+        single writer across processes. If another process published since
+        this one last loaded, or the index is memory-mapped, the latest
+        generation is first loaded into a private writable copy.
+
+        `duplicate_sources` maps existing vector ids to chunks that were
+        collapsed into them instead of being embedded. Returns the assigned vector ids.
+
+        Blocking, and slow on a large store (a reload plus a full snapshot
+        write), so the app runs it in a worker thread. The in-memory state is
+        only changed under `self.lock`, which searches also hold: they wait
+        for the add, not for the disk I/O.
+        """
+        with self._file_lock(exclusive=True):
+            if self.read_only or self.disk_generation() != self.generation:
+                state = self._read_latest_valid_state(mmap=False)
+                if state is not None:
+                    with self.lock:
+                        self._apply_state(state)
+            with self.lock:
+                vector_ids = self.add_embeddings(embeddings, metadatas, signatures)
+                merged = self._merge_duplicate_sources(duplicate_sources or {})
+            changed = bool(vector_ids) or merged > 0
+            if changed:
+                self._write_generation()
+
+        if settings.INDEX_MMAP and changed:
+            # Drop the private copy in favour of the shared mapping of what we just wrote
+            with self._file_lock(exclusive=False):
+                state = self._read_state(self.generation, mmap=True)
+            with self.lock:
+                self._apply_state(state)
+        return vector_ids
+
+    def _merge_duplicate_sources(self, duplicate_sources: Dict[int, List[Dict[str, Any]]]) -> int:
+        """Records collapsed chunks on the vectors they duplicate. Returns how many were merged."""
+        merged = 0
+        for vector_id, refs in duplicate_sources.items():
+            if vector_id not in self.metadata:
+                # The target vanished (e.g. a rollback) between planning and commit
+                logger.warning("Dropping %s duplicate refs for missing vector %s", len(refs), vector_id)
+                continue
+            listed = add_duplicate_refs(self.metadata[vector_id], refs)
+            self.stats.add_duplicates(self.metadata[vector_id], listed, len(refs))
+            # The shared chunk also belongs to the duplicates' documents for two-stage search
+            vector = self.index.reconstruct(vector_id).reshape(1, -1)
+            for document in {ref["source_file"] for ref in refs}:
+                self.centroids.add(document, [vector_id], vector)
+            merged += len(refs)
+        return merged
+
+    def find_near_duplicate(self, signature: np.ndarray) -> Optional[int]:
+        """Returns the id of a stored chunk whose text near-duplicates `signature`, if any."""
+        with self.lock:
+            return self.dedup_index.find(signature)
+
+    def add_embeddings(
+        self,
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        signatures: Optional[List[Optional[np.ndarray]]] = None,
+    ) -> List[int]:
+        """
+        Adds embeddings to the FAISS index, stores associated metadata and
+        indexes the chunk text for lexical and near-duplicate search.
+        Returns the assigned vector ids.
         """
         if not embeddings:
-            return
+            return []
+        if self.read_only:
+            # Appending to a memory-mapped index would abort inside FAISS
+            raise RuntimeError("Index is memory-mapped read-only; use commit() to add embeddings.")
 
         count = len(embeddings)
         dim = len(embeddings[0])
         
+        if self.index is not None and dim < self.dimension:
+            logger.error("Embedding dimension mismatch. Expected %s, got %s", self.dimension, dim)
+            return []
+
+        # Convert to numpy array (truncating Matryoshka embeddings longer than the index)
+        vectors = np.array(embeddings).astype('float32')
+        if self.index is not None and dim > self.dimension:
+            vectors = truncate_embeddings(vectors, self.dimension)
+            dim = self.dimension
+
         # Initialize index if first time
         if self.index is None:
             self.dimension = dim
-            self.index = faiss.IndexFlatL2(dim)
-            logger.info(f"Initialized new FAISS index with dimension: {dim}")
-
-        if dim != self.dimension:
-            logger.error(f"Embedding dimension mismatch. Expected {self.dimension}, got {dim}")
-            return
-
-        # Convert to numpy array
-        vectors = np.array(embeddings).astype('float32')
+            self._create_index(dim, vectors)
+            logger.info("Initialized new FAISS index with dimension: %s", dim)
         
         # Add to FAISS
         start_id = self.index.ntotal
@@ -94,29 +608,248 @@ class VectorStore:
         for i, meta in enumerate(metadatas):
             vector_id = start_id + i
             self.metadata[vector_id] = meta
+            self.stats.add_row(meta)
+            self.lexical_index.add(vector_id, meta.get("text", ""))
+            if settings.DEDUP_ENABLED:
+                signature = signatures[i] if signatures is not None else minhasher.signature(meta.get("text", ""))
+                if signature is not None:
+                    self.dedup_index.add(vector_id, signature)
+        add_to_centroids(self.centroids, list(range(start_id, start_id + count)), vectors, self.metadata)
             
-        logger.info(f"Added {count} vectors to FAISS. New total: {self.index.ntotal}")
+        logger.info("Added %s vectors to FAISS. New total: %s", count, self.index.ntotal)
+        return list(range(start_id, start_id + count))
         
-    def similarity_search(self, query_embedding: List[float], top_k: int = 5) -> List[Dict]:
-        """Performs vector similarity search and returns top-k results."""
-        if self.index is None or self.index.ntotal == 0:
-            logger.warning("Index is empty. Cannot search.")
-            return []
+    def similarity_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Performs vector similarity search and returns top-k results.
+        `nprobe` (IVF) and `ef_search` (HNSW) trade recall for speed; they are
+        ignored by exact indexes.
+        """
+        with self.lock:
+            if self.index is None or self.index.ntotal == 0:
+                logger.warning("Index is empty. Cannot search.")
+                return []
 
-        vector = np.array([query_embedding]).astype('float32')
-        distances, indices = self.index.search(vector, top_k)
-        
-        results = []
-        for j, i in enumerate(indices[0]):
-            if i == -1: continue # No match
-            if i in self.metadata:
-                results.append({
-                     "score": float(distances[0][j]),
-                     "metadata": self.metadata[i]
-                })
+            vector = self._query_vector(query_embedding)
+            if vector is None:
+                return []
+            params = search_params(self.index, nprobe, ef_search)
+            with SEARCH_LATENCY.labels(kind="vector").time():
+                distances, indices = self.index.search(vector, top_k, params=params)
+
+            results = []
+            for j, i in enumerate(indices[0]):
+                if i == -1: continue # No match
+                if i in self.metadata:
+                    results.append({
+                         "vector_id": int(i),
+                         "score": float(distances[0][j]),
+                         "metadata": self.metadata[i]
+                    })
         
-        logger.info(f"Internal Similarity Search completed. Found {len(results)} matches.")
+        logger.info("Internal Similarity Search completed. Found %s matches.", len(results), extra=HOT_PATH)
         return results
 
+    def two_stage_search(self, query_embedding: List[float], top_k: int = 5, top_documents: int = 16) -> List[Dict]:
+        """
+        Coarse-to-fine search: picks the `top_documents` documents whose
+        centroids are nearest the query, then runs exact search over only
+        their chunks, so cost scales with those documents rather than the corpus.
+        """
+        with self.lock:
+            if self.index is None or self.index.ntotal == 0:
+                logger.warning("Index is empty. Cannot search.")
+                return []
+            vector = self._query_vector(query_embedding)
+            if vector is None:
+                return []
+
+            with SEARCH_LATENCY.labels(kind="centroid").time():
+                documents = self.centroids.nearest_documents(vector[0], top_documents)
+                candidate_ids = self.centroids.chunk_ids(documents)
+            if len(candidate_ids) == 0:
+                return []
+
+            with SEARCH_LATENCY.labels(kind="vector").time():
+                candidates = self.index.reconstruct_batch(candidate_ids)
+                distances, positions = faiss.knn(vector, candidates, min(top_k, len(candidate_ids)))
+
+            results = []
+            for distance, position in zip(distances[0], positions[0]):
+                if position < 0:
+                    continue
+                vector_id = int(candidate_ids[position])
+                if vector_id in self.metadata:
+                    results.append({"vector_id": vector_id, "score": float(distance), "metadata": self.metadata[vector_id]})
+            logger.info(
+                "Two-stage search scanned %s chunks in %s documents.", len(candidate_ids), len(documents), extra=HOT_PATH
+            )
+            return results
+
+    def _query_vector(self, query_embedding: List[float]) -> Optional[np.ndarray]:
+        """Shapes a query embedding as a (1, d) float32 array, truncating it to the index dimension."""
+        vector = np.array([query_embedding]).astype('float32')
+        if vector.shape[1] != self.dimension:
+            if vector.shape[1] < self.dimension:
+                logger.error("Query dimension %s is smaller than index dimension %s", vector.shape[1], self.dimension)
+                return None
+            vector = truncate_embeddings(vector, self.dimension)
+        return vector
+
+    def iter_vectors(self, batch_size: int = 65536) -> Iterator[np.ndarray]:
+        """Yields every stored vector in id order, `batch_size` rows at a time."""
+        if self.index is None:
+            return
+        for start in range(0, self.index.ntotal, batch_size):
+            yield self.index.reconstruct_n(start, min(batch_size, self.index.ntotal - start))
+
+    def all_vectors(self, batch_size: int = 65536) -> np.ndarray:
+        """Returns every stored vector in id order as a (ntotal, d) float32 array."""
+        if self.index is None:
+            return np.zeros((0, self.dimension or 0), dtype='float32')
+        return np.vstack(list(self.iter_vectors(batch_size)) or [np.zeros((0, self.dimension), dtype='float32')])
+
+    def has_published_vectors(self) -> bool:
+        """
+        Whether the served state on disk holds vectors: the generation CURRENT
+        points at (the newest snapshot if its manifest is unreadable, as
+        load_index would fall back), or a legacy index before the first one.
+        """
+        current = self.disk_generation()
+        if current == 0:
+            return os.path.exists(LEGACY_INDEX_FILE)
+        try:
+            with open(os.path.join(generation_dir(current), MANIFEST_FILENAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifests = self.list_generations()
+            manifest = manifests[0] if manifests else {}
+        return manifest.get("vectors", 0) > 0
+
+    def import_state(self, index: faiss.Index, metadata: Dict[int, Dict[str, Any]], replace: bool = False) -> int:
+        """
+        Publishes an index and chunk metadata built elsewhere (e.g. read from
+        a bundle) as a new generation, rebuilding the lexical, near-duplicate
+        and centroid indexes from them. Refuses to overwrite a store that
+        already has vectors unless `replace` is set; the previous generations
+        stay available for rollback either way. Returns the new generation.
+        """
+        with self._file_lock(exclusive=True):
+            if not replace and self.has_published_vectors():
+                raise FileExistsError("The vector store already has vectors; pass replace to overwrite it")
+            enable_reconstruction(index)
+            state = {
+                "index": index,
+                "metadata": metadata,
+                "lexical_index": self._build_lexical_index(metadata),
+                "dedup_index": self._build_dedup_index(metadata),
+                "centroids": self._build_centroids(index, metadata),
+                "stats": StoreStats.from_metadata(metadata),
+                "index_bytes_per_vector": None,
+                "save_seconds": 0.0,
+                "generation": max(self.generation, self.disk_generation()),
+                "read_only": False,
+            }
+            with self.lock:
+                self._apply_state(state)
+            self._write_generation()
+
+        if settings.INDEX_MMAP:
+            with self._file_lock(exclusive=False):
+                state = self._read_state(self.generation, mmap=True)
+            with self.lock:
+                self._apply_state(state)
+        return self.generation
+
+    def replace_vectors(self, vectors: np.ndarray) -> int:
+        """
+        Rebuilds the FAISS index from `vectors` (one per existing vector id, in
+        id order), e.g. at a new dimension, keeping metadata and the lexical
+        and near-duplicate indexes. Published as a new generation, so it can
+        be rolled back. Returns that generation.
+        """
+        with self._file_lock(exclusive=True):
+            if self.read_only or self.disk_generation() != self.generation:
+                state = self._read_latest_valid_state(mmap=False)
+                if state is not None:
+                    with self.lock:
+                        self._apply_state(state)
+            if self.index is None or len(vectors) != self.index.ntotal:
+                raise ValueError("Vector count does not match the index; it changed during the rebuild")
+
+            vectors = np.ascontiguousarray(vectors, dtype='float32')
+            index = build_index(vectors.shape[1], vectors)
+            index.add(vectors)
+            enable_reconstruction(index)
+            centroids = self._build_centroids(index, self.metadata)
+            with self.lock:
+                self.index, self.dimension, self.centroids = index, vectors.shape[1], centroids
+            self._write_generation()
+        return self.generation
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Size of the live store, overall and per document, from the running
+        StoreStats. Index bytes are the serialized index size, shared out
+        between documents by vector count.
+        """
+        vectors = self.index.ntotal if self.index is not None else 0
+        bytes_per_vector = self.index_bytes_per_vector or 4.0 * (self.dimension or 0)  # Flat float32 until first save
+        with self.lock:
+            documents = [
+                {
+                    "source_file": source_file,
+                    "vectors": document["vectors"],
+                    "index_bytes": round(document["vectors"] * bytes_per_vector),
+                    "metadata_bytes": document["metadata_bytes"],
+                    "duplicate_rows": document["duplicate_rows"],
+                }
+                for source_file, document in self.stats.documents.items()
+            ]
+        return {
+            "generation": self.generation,
+            "index_type": type(self.index).__name__ if self.index is not None else None,
+            "dimension": self.dimension,
+            "memory_mapped": self.read_only,
+            "vectors": vectors,
+            "index_bytes": round(vectors * bytes_per_vector),
+            "metadata_bytes": self.stats.metadata_bytes,
+            "duplicate_rows": self.stats.duplicate_rows,
+            # Nothing deletes rows yet, so these are only index rows whose metadata is missing
+            "tombstoned_rows": max(0, vectors - self.stats.rows),
+            "last_save_seconds": self.last_save_seconds,
+            "documents": documents,
+        }
+
+    def reconstruct_vectors(self, vector_ids: List[int]) -> np.ndarray:
+        """Returns the stored vectors for `vector_ids` as a (n, d) float32 array."""
+        with self.lock:
+            if self.index is None or not vector_ids:
+                return np.zeros((0, self.dimension or 0), dtype='float32')
+            return self.index.reconstruct_batch(np.array(vector_ids, dtype='int64'))
+
+    def lexical_search(self, query: str, top_k: int = 5) -> List[Dict]:
+        """Performs BM25 keyword search and returns top-k results."""
+        with self.lock:
+            with SEARCH_LATENCY.labels(kind="lexical").time():
+                hits = self.lexical_index.search(query, top_k=top_k)
+
+            results = []
+            for vector_id, score in hits:
+                if vector_id in self.metadata:
+                    results.append({
+                        "vector_id": vector_id,
+                        "score": score,
+                        "metadata": self.metadata[vector_id]
+                    })
+            return results
+
 # Global instance
 vector_store = VectorStore()
+INDEX_SIZE.set_function(lambda: vector_store.index.ntotal if vector_store.index is not None else 0)
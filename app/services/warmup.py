@@ -0,0 +1,32 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.query_log import read_entries, top_questions
+
+logger = get_logger(__name__)
+
+async def warm_caches(answer_question: Callable[[str], Awaitable[object]], limit: int) -> int:
+    """
+    Answers the `limit` most frequent questions from the query log (within
+    WARMUP_LOOKBACK_HOURS) so their embeddings and answers are cached before
+    real traffic asks for them. Runs one question at a time to stay out of
+    the way of live requests. Returns how many questions were warmed.
+    """
+    since = time.time() - settings.WARMUP_LOOKBACK_HOURS * 3600
+    entries = await asyncio.to_thread(lambda: list(read_entries(since=since)))
+    questions = top_questions(entries, limit)
+    if not questions:
+        return 0
+
+    start = time.perf_counter()
+    warmed = 0
+    for question, count in questions:
+        try:
+            await answer_question(question)
+            warmed += 1
+        except Exception as e:
+            logger.warning("Warm-up failed for a question asked %s times: %s", count, e)
+    logger.info("Warmed caches with %s popular questions in %.1fs", warmed, time.perf_counter() - start)
+    return warmed
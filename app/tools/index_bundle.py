@@ -0,0 +1,50 @@
+"""
+Export the vector store as a portable index bundle, or import one into an
+empty store, e.g. to warm-start a new replica instead of re-ingesting every
+upload (see app/services/bundle.py for the format).
+
+A bundle is only accepted if its embedding model and dimension match this
+build's (EMBEDDING_DIMENSION) and every member passes its checksum. The
+import is published as a new index generation, so it can be rolled back.
+Setting INDEX_BOOTSTRAP_BUNDLE imports a bundle at startup instead.
+
+Usage:
+    python -m app.tools.index_bundle export /backups/index.tar.gz
+    python -m app.tools.index_bundle import /backups/index.tar.gz
+    python -m app.tools.index_bundle import /backups/index.tar.gz --replace
+"""
+import argparse
+import sys
+from app.services.bundle import BundleMismatch, export_bundle, import_bundle
+from app.services.vector_store import vector_store
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a portable index bundle")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write the current index to a bundle")
+    export_parser.add_argument("path", help="Bundle file (.tar, or .tar.gz to compress)")
+    import_parser = commands.add_parser("import", help="Publish a bundle as the current index")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--replace", action="store_true", help="Overwrite a store that already has vectors")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        vector_store.load_index()
+        try:
+            header = export_bundle(vector_store, args.path)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"Exported {header['vectors']} vectors and {header['chunks']} chunks "
+              f"({header['embedding_model']}, dimension {header['dimension']}) to {args.path}")
+        return
+
+    try:
+        header = import_bundle(vector_store, args.path, replace=args.replace)
+    except (BundleMismatch, FileExistsError) as e:
+        sys.exit(f"Rejected: {e}")
+    except ValueError as e:
+        sys.exit(f"Corrupt bundle: {e}")
+    print(f"Imported {header['vectors']} vectors and {header['chunks']} chunks as generation {header['generation']}")
+
+if __name__ == "__main__":
+    main()
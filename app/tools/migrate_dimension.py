@@ -0,0 +1,131 @@
+"""
+Offline migration of the vector store to a different embedding dimension.
+
+jina-embeddings-v3 is a Matryoshka model: the leading components of an
+embedding, re-normalized, are the embedding at that smaller size. So the
+existing vectors can be truncated locally instead of re-embedding every
+chunk. The rebuilt index is published as a new generation (roll back via
+/api/admin/generations if needed).
+
+Running workers hot-reload that generation while EMBEDDING_DIMENSION
+still asks Jina for full-size embeddings; they truncate queries and new
+uploads to the index dimension, so they keep serving. Migrate in this order:
+
+    1. Deploy a build whose query path truncates (this one) to every worker.
+    2. Run this tool; workers pick up the new generation on their next poll.
+    3. Set EMBEDDING_DIMENSION to the new value and restart, so Jina stops
+       returning components that are thrown away.
+
+Never lower EMBEDDING_DIMENSION first: embeddings shorter than the index
+cannot be searched, so the tool refuses to publish while the configured
+dimension is below the target.
+
+Before publishing, recall@k of the truncated index is measured against
+exact search at the current dimension, using perturbed stored vectors as
+queries, alongside index size and search latency. Both the current and
+the truncated index are searched with the app's search effort
+(DEFAULT_NPROBE / DEFAULT_EF_SEARCH, or --nprobe / --ef-search).
+
+Usage:
+    python -m app.tools.migrate_dimension --dimension 512 --dry-run
+    python -m app.tools.migrate_dimension --dimension 512 --min-recall 0.95
+"""
+import argparse
+import sys
+import time
+from typing import Dict, Optional
+import faiss
+import numpy as np
+from app.core.config import settings
+from app.services.embeddings import truncate_embeddings
+from app.services.vector_store import build_index, search_params, vector_store
+
+def sample_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Stored vectors plus Gaussian noise, standing in for nearby questions."""
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    queries = (picks + noise * rng.standard_normal(picks.shape) / np.sqrt(picks.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int, nprobe: Optional[int], ef_search: Optional[int]) -> Dict:
+    params = search_params(index, nprobe, ef_search)
+    latencies = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+    return {
+        "ids": np.array(found),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "index_mb": faiss.serialize_index(index).nbytes / 2**20,
+    }
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the vector store at a new embedding dimension")
+    parser.add_argument("--dimension", type=int, required=True, help="Target Matryoshka dimension (e.g. 256, 512)")
+    parser.add_argument("--queries", type=int, default=200, help="Sampled queries for the recall comparison")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.5, help="Query perturbation (relative to vector norm)")
+    parser.add_argument("--nprobe", type=int, help="IVF search effort for both indexes (default DEFAULT_NPROBE)")
+    parser.add_argument("--ef-search", type=int, help="HNSW search effort for both indexes (default DEFAULT_EF_SEARCH)")
+    parser.add_argument("--min-recall", type=float, default=0.0, help="Abort without publishing below this recall@k")
+    parser.add_argument("--dry-run", action="store_true", help="Report the comparison only")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vector_store.load_index()
+    if vector_store.index is None or vector_store.index.ntotal == 0:
+        sys.exit("The vector store is empty; nothing to migrate.")
+
+    # 1. Truncate every stored vector
+    vectors = vector_store.all_vectors()
+    if args.dimension >= vector_store.dimension:
+        sys.exit(f"Target dimension must be below the current {vector_store.dimension}; re-ingest to grow it.")
+    if settings.EMBEDDING_DIMENSION < args.dimension and not args.dry_run:
+        sys.exit(
+            f"EMBEDDING_DIMENSION={settings.EMBEDDING_DIMENSION} is below the target {args.dimension}, so queries "
+            f"could not search the new index. Keep it at {vector_store.dimension} until the migration is published."
+        )
+    truncated = truncate_embeddings(vectors, args.dimension)
+    print(f"Loaded {len(vectors)} vectors at dimension {vector_store.dimension} (generation {vector_store.generation})")
+
+    # 2. Compare the current and truncated index against exact search at the current dimension
+    queries = sample_queries(vectors, args.queries, args.noise, args.seed)
+    k = min(args.k, len(vectors))
+    _, truth = faiss.knn(queries, vectors, k)
+
+    current = measure(vector_store.index, queries, k, args.nprobe, args.ef_search)
+    candidate_index = build_index(args.dimension, truncated)
+    candidate_index.add(truncated)
+    candidate = measure(candidate_index, truncate_embeddings(queries, args.dimension), k, args.nprobe, args.ef_search)
+
+    current_recall = recall_at_k(current["ids"], truth)
+    candidate_recall = recall_at_k(candidate["ids"], truth)
+    print(f"\n{'':>14} | {'dimension':>9} | {f'recall@{k}':>9} | {'p50 ms':>7} | {'p99 ms':>7} | {'index MB':>8}")
+    for label, dim, recall, stats in (
+        ("current", vector_store.dimension, current_recall, current),
+        ("truncated", args.dimension, candidate_recall, candidate),
+    ):
+        print(f"{label:>14} | {dim:>9} | {recall:>9.3f} | {stats['p50_ms']:>7.3f} | {stats['p99_ms']:>7.3f} | {stats['index_mb']:>8.1f}")
+
+    if args.dry_run:
+        print("\nDry run: nothing published.")
+        return
+    if candidate_recall < args.min_recall:
+        sys.exit(f"\nRecall {candidate_recall:.3f} is below --min-recall {args.min_recall}; nothing published.")
+
+    # 3. Publish the rebuilt index as a new generation
+    generation = vector_store.replace_vectors(truncated)
+    print(f"\nPublished generation {generation} at dimension {args.dimension}. Workers truncate queries and "
+          f"uploads to it; set EMBEDDING_DIMENSION={args.dimension} and restart to stop requesting the rest.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Query log analytics: the most frequent questions, the most retrieved
+chunks, per-stage latency percentiles and the answer cache hit rate.
+
+Usage:
+    python -m app.tools.query_analytics --top 20
+    python -m app.tools.query_analytics --since-hours 24 --json
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+import numpy as np
+from app.services.query_log import hot_chunks, read_entries, top_questions
+
+def stage_percentiles(entries: List[Dict]) -> Dict[str, Dict[str, float]]:
+    samples: Dict[str, List[float]] = {}
+    for entry in entries:
+        for stage, ms in entry.get("stages_ms", {}).items():
+            samples.setdefault(stage, []).append(ms)
+    return {
+        stage: {
+            "count": len(values),
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+        }
+        for stage, values in sorted(samples.items())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Report top questions and hot chunks from the query log")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--since-hours", type=float, help="Only consider queries from the last N hours")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    entries = list(read_entries(since=since))
+    cache_lookups = [e["answer_cache_hit"] for e in entries if "answer_cache_hit" in e]
+    report = {
+        "queries": len(entries),
+        "distinct_questions": len(top_questions(entries, limit=None)),
+        "answer_cache_hit_rate": sum(cache_lookups) / len(cache_lookups) if cache_lookups else None,
+        "top_questions": [{"question": q, "count": c} for q, c in top_questions(entries, args.top)],
+        "hot_chunks": [{"chunk_id": chunk, "count": c} for chunk, c in hot_chunks(entries, args.top)],
+        "stages": stage_percentiles(entries),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    hit_rate = report["answer_cache_hit_rate"]
+    print(f"{report['queries']} queries, {report['distinct_questions']} distinct questions, "
+          f"answer cache hit rate {'-' if hit_rate is None else f'{hit_rate:.1%}'}")
+    print("\nTop questions:")
+    for row in report["top_questions"]:
+        print(f"  {row['count']:>6}  {row['question']}")
+    print("\nHot chunks:")
+    for row in report["hot_chunks"]:
+        print(f"  {row['count']:>6}  {row['chunk_id']}")
+    print("\nStage latency (ms):")
+    print(f"  {'stage':<16} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:<16} {stats['count']:>7} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
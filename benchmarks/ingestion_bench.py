@@ -0,0 +1,222 @@
+"""
+Ingestion throughput benchmark: extraction, chunking, embedding and indexing.
+
+Generates synthetic PDF and/or TXT documents of a configurable page count,
+then feeds them one at a time through the real process_document pipeline,
+with embeddings served by the local mock Jina server. After each document
+it reports, as the corpus grows:
+
+- end-to-end pages/s, chunks/s and vectors/s
+- per-stage throughput from the rag_ingestion_stage_seconds histograms
+  (items over the time that stage was busy; embedding time is summed over
+  concurrent requests)
+- index save time and peak RSS
+
+so regressions in ingestion.py, chunking.py or vector_store.py show up as numbers.
+
+Usage:
+    python -m benchmarks.ingestion_bench --documents 20 --pages 50
+    python -m benchmarks.ingestion_bench --formats pdf --pages 200 --embedding-latency-ms 150
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import tempfile
+import time
+from typing import Dict, List
+from prometheus_client import REGISTRY
+from benchmarks.load_test import WORDS, mock_upstreams, save_report
+from benchmarks.mock_upstreams import MockConfig
+from benchmarks.vector_store_bench import current_rss_bytes
+
+LINE_CHARS = 90
+
+# --- Synthetic documents --------------------------------------------------
+
+def synthetic_pages(rng: random.Random, pages: int, words_per_page: int) -> List[List[str]]:
+    """Pages of text lines made of sentences drawn from the benchmark vocabulary."""
+    result = []
+    for _ in range(pages):
+        lines, line, count = [], [], 0
+        while count < words_per_page:
+            sentence = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+            sentence[0] = sentence[0].capitalize()
+            sentence[-1] += "."
+            for word in sentence:
+                if line and len(" ".join(line)) + len(word) >= LINE_CHARS:
+                    lines.append(" ".join(line))
+                    line = []
+                line.append(word)
+            count += len(sentence)
+        lines.append(" ".join(line))
+        result.append(lines)
+    return result
+
+def pdf_bytes(pages: List[List[str]]) -> bytes:
+    """A minimal valid PDF: one content stream of Helvetica text lines per page."""
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    # Objects 1-3 are fixed; each page adds a page object and its content stream
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for lines in pages:
+        content = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET"
+        content_bytes = content.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content_bytes), content_bytes))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+def txt_text(pages: List[List[str]]) -> str:
+    return "\n\n".join("\n".join(lines) for lines in pages)
+
+# --- Measurement ----------------------------------------------------------
+
+STAGES = ("extraction", "chunking", "dedup", "embedding", "indexing", "save")
+
+def read_metrics() -> Dict[str, float]:
+    """Current ingestion counters from the in-process Prometheus registry."""
+    values = {}
+    for stage in STAGES:
+        values[stage] = REGISTRY.get_sample_value("rag_ingestion_stage_seconds_sum", {"stage": stage}) or 0.0
+    for match in ("document", "corpus"):
+        values[f"duplicates_{match}"] = REGISTRY.get_sample_value(
+            "rag_ingestion_duplicate_chunks_total", {"match": match}
+        ) or 0.0
+    return values
+
+def rate(items: float, seconds: float) -> float:
+    return items / seconds if seconds > 0 else 0.0
+
+async def run(args: argparse.Namespace, upload_dir: str) -> List[Dict]:
+    # Imported here so the settings pick up the mock upstream and DATA_DIR set in main()
+    from app.services.ingestion import process_document
+    from app.services.vector_store import vector_store
+
+    vector_store.load_index()
+    rng = random.Random(args.seed)
+    formats = args.formats.split(",")
+    rows = []
+    for doc in range(args.documents):
+        fmt = formats[doc % len(formats)]
+        pages = synthetic_pages(rng, args.pages, args.words_per_page)
+        filename = f"bench_{doc}.{fmt}"
+        path = os.path.join(upload_dir, filename)
+        with open(path, "wb") as f:
+            f.write(pdf_bytes(pages) if fmt == "pdf" else txt_text(pages).encode("utf-8"))
+
+        before = read_metrics()
+        vectors_before = vector_store.index.ntotal if vector_store.index is not None else 0
+        start = time.perf_counter()
+        await process_document(path, filename)
+        wall = time.perf_counter() - start
+        after = read_metrics()
+        delta = {key: after[key] - before[key] for key in after}
+
+        vectors = vector_store.index.ntotal - vectors_before
+        chunks = vectors + delta["duplicates_document"] + delta["duplicates_corpus"]
+        rows.append({
+            "document": doc,
+            "format": fmt,
+            "pages": args.pages,
+            "chunks": int(chunks),
+            "vectors": vectors,
+            "total_vectors": vector_store.index.ntotal,
+            "wall_s": wall,
+            "pages_per_s": rate(args.pages, wall),
+            "chunks_per_s": rate(chunks, wall),
+            "vectors_per_s": rate(vectors, wall),
+            "stage_seconds": {stage: delta[stage] for stage in STAGES},
+            "stage_rates": {
+                "extraction_pages_per_s": rate(args.pages, delta["extraction"]),
+                "chunking_chunks_per_s": rate(chunks, delta["chunking"] + delta["dedup"]),
+                "embedding_vectors_per_s": rate(vectors, delta["embedding"]),
+                "indexing_vectors_per_s": rate(vectors, delta["indexing"]),
+            },
+            "save_s": delta["save"],
+            "last_save_s": vector_store.last_save_seconds,
+            "rss_mb": current_rss_bytes() / 2**20,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        })
+        print_row(rows[-1], header=doc == 0)
+    return rows
+
+def print_row(row: Dict, header: bool):
+    if header:
+        print(f"\n{'doc':>4} {'fmt':>4} {'vectors':>8} {'wall s':>7} {'pages/s':>8} {'chunks/s':>9} "
+              f"{'extract p/s':>11} {'chunk c/s':>10} {'embed v/s':>10} {'index v/s':>10} {'save s':>7} {'peak MB':>8}")
+    rates = row["stage_rates"]
+    print(
+        f"{row['document']:>4} {row['format']:>4} {row['total_vectors']:>8} {row['wall_s']:>7.2f} "
+        f"{row['pages_per_s']:>8.1f} {row['chunks_per_s']:>9.1f} {rates['extraction_pages_per_s']:>11.1f} "
+        f"{rates['chunking_chunks_per_s']:>10.0f} {rates['embedding_vectors_per_s']:>10.1f} "
+        f"{rates['indexing_vectors_per_s']:>10.0f} {row['save_s']:>7.3f} {row['peak_rss_mb']:>8.0f}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the document ingestion pipeline")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=50, help="Pages per document")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--formats", default="pdf,txt", help="Comma-separated formats, alternated between documents")
+    parser.add_argument("--embedding-latency-ms", type=float, default=MockConfig.embedding_latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--dimension", type=int, default=MockConfig.dimension)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        embedding_latency_ms=args.embedding_latency_ms, jitter_ms=args.jitter_ms, dimension=args.dimension
+    )
+    with mock_upstreams(config) as mock_url, tempfile.TemporaryDirectory(prefix="ingestion_bench_") as data_dir:
+        os.environ.update({
+            "JINA_API_URL": f"{mock_url}/v1/embeddings",
+            "JINA_API_KEY": "mock",
+            "GROQ_API_KEY": "mock",
+            "DATA_DIR": data_dir,
+            "EMBEDDING_DIMENSION": str(args.dimension),
+        })
+        upload_dir = os.path.join(data_dir, "uploads")
+        os.makedirs(upload_dir, exist_ok=True)
+        rows = asyncio.run(run(args, upload_dir))
+
+    total_wall = sum(row["wall_s"] for row in rows)
+    summary = {
+        "pages_per_s": rate(sum(row["pages"] for row in rows), total_wall),
+        "chunks_per_s": rate(sum(row["chunks"] for row in rows), total_wall),
+        "vectors_per_s": rate(sum(row["vectors"] for row in rows), total_wall),
+        "peak_rss_mb": max(row["peak_rss_mb"] for row in rows),
+        "final_save_s": rows[-1]["last_save_s"],
+    }
+    print(f"\nOverall: {summary['pages_per_s']:.1f} pages/s, {summary['chunks_per_s']:.1f} chunks/s, "
+          f"{summary['vectors_per_s']:.1f} vectors/s; peak RSS {summary['peak_rss_mb']:.0f} MB; "
+          f"last save {summary['final_save_s']:.3f}s at {rows[-1]['total_vectors']} vectors")
+    report = {"config": vars(args), "summary": summary, "documents": rows}
+    print(f"\nSaved results to {save_report(report, args.output, prefix='ingestion')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Concurrent load test for /api/upload and /api/query.
+
+By default starts the mock Jina/Groq servers and the app (pointed at them
+with a throwaway DATA_DIR) as subprocesses, seeds a few documents, then
+drives mixed upload and query traffic. Reports QPS and p50/p95/p99 latency
+per endpoint and saves the results as JSON for run-to-run comparison.
+
+Usage:
+    python -m benchmarks.load_test --queries 500 --uploads 20 --concurrency 32
+    python -m benchmarks.load_test --app-url http://127.0.0.1:8000   # existing server
+    python -m benchmarks.load_test --compare results/old.json results/new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+import httpx
+import numpy as np
+from benchmarks.mock_upstreams import MockConfig, add_mock_arguments, config_from_args, mock_cli_args
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+WORDS = (
+    "revenue policy employee contract security network invoice customer product release "
+    "schedule budget compliance audit vendor server database latency backup training "
+    "onboarding benefits holiday travel expense approval manager quarterly report risk"
+).split()
+
+# --- Local stack ----------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for_http(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+def stop_process(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+@contextmanager
+def mock_upstreams(config: MockConfig):
+    """Runs the mock upstream server in a subprocess and yields its base URL."""
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_upstreams", "--port", str(port), *mock_cli_args(config)],
+        cwd=REPO_ROOT,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_http(f"{base_url}/health")
+        yield base_url
+    finally:
+        stop_process(proc)
+
+def upstream_env(mock_url: str, data_dir: str) -> Dict[str, str]:
+    """Environment that points the app at the mock upstreams and an isolated data dir."""
+    return {
+        "JINA_API_URL": f"{mock_url}/v1/embeddings",
+        "GROQ_BASE_URL": mock_url,
+        "JINA_API_KEY": "mock",
+        "GROQ_API_KEY": "mock",
+        "DATA_DIR": data_dir,
+    }
+
+@contextmanager
+def local_stack(config: MockConfig, workers: int = 1, extra_env: Optional[Dict[str, str]] = None):
+    """Starts mock upstreams plus the app against them; yields the app's /api URL."""
+    with mock_upstreams(config) as mock_url, tempfile.TemporaryDirectory(prefix="rag_bench_") as data_dir:
+        port = free_port()
+        env = {**os.environ, **upstream_env(mock_url, data_dir), **(extra_env or {})}
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+            cwd=REPO_ROOT, env=env,
+        )
+        api_url = f"http://127.0.0.1:{port}/api"
+        try:
+            wait_for_http(f"{api_url}/health")
+            yield api_url
+        finally:
+            stop_process(proc)
+
+# --- Reporting ------------------------------------------------------------
+
+def summarize(latencies_ms: List[float], errors: int, wall_seconds: float) -> Dict:
+    total = len(latencies_ms) + errors
+    summary = {
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "qps": len(latencies_ms) / wall_seconds if wall_seconds > 0 else 0.0,
+    }
+    if latencies_ms:
+        values = np.array(latencies_ms)
+        summary.update({
+            "mean_ms": float(values.mean()),
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+            "max_ms": float(values.max()),
+        })
+    return summary
+
+def print_report(report: Dict):
+    print(f"\n{'endpoint':<10} {'reqs':>6} {'errs':>5} {'qps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, s in report["endpoints"].items():
+        print(
+            f"{endpoint:<10} {s['requests']:>6} {s['errors']:>5} {s['qps']:>8.2f} "
+            f"{s.get('p50_ms', 0):>7.1f}ms {s.get('p95_ms', 0):>7.1f}ms {s.get('p99_ms', 0):>7.1f}ms"
+        )
+    context = report.get("context")
+    if context and context["retrieved_chars"]:
+        print(f"\nLLM context: {context['sent_chars']:.0f} of {context['retrieved_chars']:.0f} retrieved chars sent "
+              f"({context['reduction']:.1%} reduction)")
+
+def print_comparison(old: Dict, new: Dict):
+    """Prints per-endpoint metric deltas between two saved reports."""
+    print(f"\n{'endpoint':<10} {'metric':<8} {'old':>10} {'new':>10} {'change':>9}")
+    for endpoint, new_stats in new["endpoints"].items():
+        old_stats = old["endpoints"].get(endpoint)
+        if not old_stats:
+            continue
+        for metric in ("qps", "p50_ms", "p95_ms", "p99_ms", "error_rate"):
+            a, b = old_stats.get(metric, 0.0), new_stats.get(metric, 0.0)
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"{endpoint:<10} {metric:<8} {a:>10.2f} {b:>10.2f} {change:>9}")
+    if "context" in old and "context" in new:
+        a, b = old["context"]["sent_chars"], new["context"]["sent_chars"]
+        change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+        print(f"{'context':<10} {'sent':<8} {a:>10.0f} {b:>10.0f} {change:>9}")
+
+def save_report(report: Dict, output: Optional[str], prefix: str = "load") -> str:
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{prefix}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    return output
+
+# --- Load generation ------------------------------------------------------
+
+def synthetic_document(rng: random.Random, words: int) -> str:
+    sentences = []
+    while words > 0:
+        length = rng.randint(8, 20)
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + ".")
+        words -= length
+    return " ".join(sentences)
+
+def synthetic_question(rng: random.Random) -> str:
+    return f"What does the document say about {rng.choice(WORDS)} and {rng.choice(WORDS)}?"
+
+async def wait_for_vectors(client: httpx.AsyncClient, metrics_url: str, timeout: float = 60.0):
+    """Blocks until the app reports a non-empty index (background ingestion finished)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = await client.get(metrics_url)
+        for line in response.text.splitlines():
+            if line.startswith("rag_index_vectors ") and float(line.split()[1]) > 0:
+                return
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Seed documents were not indexed in time")
+
+async def scrape_counter(client: httpx.AsyncClient, metrics_url: str, name: str) -> Dict[str, float]:
+    """Current values of a labelled Prometheus counter, keyed by its label string."""
+    response = await client.get(metrics_url)
+    values = {}
+    for line in response.text.splitlines():
+        if line.startswith(name + "{"):
+            labels, value = line[len(name):].rsplit(" ", 1)
+            values[labels] = float(value)
+    return values
+
+def context_summary(before: Dict[str, float], after: Dict[str, float]) -> Dict:
+    """Prompt context size over the run, from rag_context_chars_total deltas."""
+    def delta(stage: str) -> float:
+        key = f'{{stage="{stage}"}}'
+        return after.get(key, 0.0) - before.get(key, 0.0)
+    retrieved, sent = delta("retrieved"), delta("sent")
+    return {
+        "retrieved_chars": retrieved,
+        "sent_chars": sent,
+        "reduction": 1 - sent / retrieved if retrieved else 0.0,
+    }
+
+async def run_load(api_url: str, args: argparse.Namespace) -> Dict:
+    rng = random.Random(args.seed)
+    samples: Dict[str, List[float]] = {"upload": [], "query": []}
+    errors: Dict[str, int] = {"upload": 0, "query": 0}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        async def upload(i: int):
+            files = {"file": (f"bench_{i}.txt", synthetic_document(rng, args.doc_words), "text/plain")}
+            await timed("upload", client.post(f"{api_url}/upload", files=files))
+
+        async def query():
+            payload = {"question": synthetic_question(rng)}
+            if args.compress != "server":
+                payload["compress"] = args.compress == "on"
+            await timed("query", client.post(f"{api_url}/query", json=payload))
+
+        async def timed(endpoint: str, request):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await request
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    samples[endpoint].append((time.perf_counter() - start) * 1000)
+                else:
+                    errors[endpoint] += 1
+
+        # Seed so queries have something to retrieve
+        await asyncio.gather(*(upload(i) for i in range(args.seed_docs)))
+        await wait_for_vectors(client, api_url.rsplit("/api", 1)[0] + "/metrics")
+        samples["upload"].clear()
+
+        metrics_url = api_url.rsplit("/api", 1)[0] + "/metrics"
+        context_before = await scrape_counter(client, metrics_url, "rag_context_chars_total")
+        tasks = [query() for _ in range(args.queries)]
+        tasks += [upload(args.seed_docs + i) for i in range(args.uploads)]
+        rng.shuffle(tasks)
+        start = time.perf_counter()
+        await asyncio.gather(*tasks)
+        wall_seconds = time.perf_counter() - start
+        context_after = await scrape_counter(client, metrics_url, "rag_context_chars_total")
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output")},
+        "wall_seconds": wall_seconds,
+        "endpoints": {
+            endpoint: summarize(samples[endpoint], errors[endpoint], wall_seconds)
+            for endpoint in samples
+        },
+        "context": context_summary(context_before, context_after),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the RAG API")
+    parser.add_argument("--app-url", help="Existing API base URL (e.g. http://127.0.0.1:8000). Skips the local stack.")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local stack")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--uploads", type=int, default=10)
+    parser.add_argument("--seed-docs", type=int, default=5)
+    parser.add_argument("--doc-words", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compress", choices=("server", "on", "off"), default="server",
+                        help="Context compression per query (A/B against the server default)")
+    parser.add_argument("--output", help="Where to write the JSON report")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two saved reports and exit")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            print_comparison(json.load(f_old), json.load(f_new))
+        return
+
+    if args.app_url:
+        report = asyncio.run(run_load(args.app_url.rstrip("/") + "/api", args))
+    else:
+        with local_stack(config_from_args(args), workers=args.workers) as api_url:
+            report = asyncio.run(run_load(api_url, args))
+
+    print_report(report)
+    print(f"\nSaved results to {save_report(report, args.output)}")
+
+if __name__ == "__main__":
+    main()
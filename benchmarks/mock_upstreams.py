@@ -0,0 +1,195 @@
+"""
+Local stand-ins for the Jina embeddings and Groq chat completion APIs.
+
+Serves the same request/response shapes the app uses, with configurable
+latency, jitter and error rate, and deterministic embeddings (the same text
+always maps to the same unit vector), so benchmarks run offline and are
+repeatable.
+
+Usage:
+    python -m benchmarks.mock_upstreams --port 9100 --latency-ms 80 --jitter-ms 30 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+@dataclass
+class MockConfig:
+    embedding_latency_ms: float = 50.0
+    llm_latency_ms: float = 300.0  # Time to first token
+    prefill_ms_per_1k_tokens: float = 0.0  # Added to time to first token per 1000 prompt tokens
+    token_latency_ms: float = 5.0  # Delay between streamed tokens
+    jitter_ms: float = 20.0
+    slow_rate: float = 0.0  # Fraction of calls that stall for an extra slow_ms (upstream tail latency)
+    slow_ms: float = 1000.0
+    error_rate: float = 0.0
+    dimension: int = 1024
+    answer_tokens: int = 60
+
+def deterministic_embedding(text: str, dimension: int) -> list:
+    """Maps text to a fixed unit vector seeded from its hash."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+def create_mock_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock Jina/Groq upstreams")
+
+    async def simulate_latency(base_ms: float):
+        delay_ms = max(0.0, base_ms + random.uniform(-config.jitter_ms, config.jitter_ms))
+        if random.random() < config.slow_rate:
+            delay_ms += config.slow_ms
+        await asyncio.sleep(delay_ms / 1000)
+
+    def injected_error():
+        if random.random() < config.error_rate:
+            return JSONResponse(status_code=503, content={"error": {"message": "Injected upstream failure"}})
+        return None
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        payload = await request.json()
+        await simulate_latency(config.embedding_latency_ms)
+        error = injected_error()
+        if error:
+            return error
+        dimension = payload.get("dimensions") or config.dimension
+        data = [
+            {"object": "embedding", "index": i, "embedding": deterministic_embedding(text, dimension)}
+            for i, text in enumerate(payload["input"])
+        ]
+        tokens = sum(len(text.split()) for text in payload["input"])
+        return {
+            "model": payload.get("model", "jina-embeddings-v3"),
+            "object": "list",
+            "usage": {"total_tokens": tokens, "prompt_tokens": tokens},
+            "data": data,
+        }
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in payload.get("messages", []))
+        await simulate_latency(config.llm_latency_ms + config.prefill_ms_per_1k_tokens * prompt_tokens / 1000)
+        error = injected_error()
+        if error:
+            return error
+
+        model = payload.get("model", "mock-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        tokens = [f"token{i} " for i in range(config.answer_tokens)]
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+
+        if not payload.get("stream"):
+            await asyncio.sleep(config.token_latency_ms * len(tokens) / 1000)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        async def event_stream():
+            for i, token in enumerate(tokens):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                if i == 0:
+                    chunk["choices"][0]["delta"]["role"] = "assistant"
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(config.token_latency_ms / 1000)
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "x_groq": {"id": completion_id, "usage": usage},
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    return app
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--embedding-latency-ms", type=float, default=MockConfig.embedding_latency_ms)
+    parser.add_argument("--llm-latency-ms", type=float, default=MockConfig.llm_latency_ms)
+    parser.add_argument("--token-latency-ms", type=float, default=MockConfig.token_latency_ms)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=MockConfig.prefill_ms_per_1k_tokens,
+                        help="Extra LLM time to first token per 1000 prompt tokens (makes prompt size matter)")
+    parser.add_argument("--jitter-ms", type=float, default=MockConfig.jitter_ms)
+    parser.add_argument("--slow-rate", type=float, default=MockConfig.slow_rate,
+                        help="Fraction of upstream calls delayed by an extra --slow-ms (tail latency)")
+    parser.add_argument("--slow-ms", type=float, default=MockConfig.slow_ms)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--dimension", type=int, default=MockConfig.dimension)
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        embedding_latency_ms=args.embedding_latency_ms,
+        llm_latency_ms=args.llm_latency_ms,
+        token_latency_ms=args.token_latency_ms,
+        prefill_ms_per_1k_tokens=args.prefill_ms_per_1k_tokens,
+        jitter_ms=args.jitter_ms,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        error_rate=args.error_rate,
+        dimension=args.dimension,
+    )
+
+def mock_cli_args(config: MockConfig) -> list:
+    """Inverse of config_from_args, for launching the server as a subprocess."""
+    return [
+        "--embedding-latency-ms", str(config.embedding_latency_ms),
+        "--llm-latency-ms", str(config.llm_latency_ms),
+        "--token-latency-ms", str(config.token_latency_ms),
+        "--prefill-ms-per-1k-tokens", str(config.prefill_ms_per_1k_tokens),
+        "--jitter-ms", str(config.jitter_ms),
+        "--slow-rate", str(config.slow_rate),
+        "--slow-ms", str(config.slow_ms),
+        "--error-rate", str(config.error_rate),
+        "--dimension", str(config.dimension),
+    ]
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run mock Jina and Groq servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and error injection")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    uvicorn.run(create_mock_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,233 @@
+"""
+Replay captured production traffic against a server and diff latency
+distributions between builds.
+
+Capture by running the app with TRAFFIC_CAPTURE_ENABLED=true; /api/query
+and /api/upload requests (payloads, arrival times, status and latency) are
+appended to data/traffic/capture.jsonl. Replay sends each request at its
+original offset from the first one, divided by --speed, without waiting for
+earlier responses (open loop), so inter-arrival times and therefore
+concurrency match the capture. Point the target server at the same corpus
+(or keep the captured uploads in the replay) so queries retrieve alike.
+
+Usage:
+    python -m benchmarks.replay run data/traffic --app-url http://127.0.0.1:8000 --output old.json
+    python -m benchmarks.replay run data/traffic/capture.jsonl --app-url http://127.0.0.1:8001 --speed 4
+    python -m benchmarks.replay diff old.json new.json
+    python -m benchmarks.replay diff new.json          # replay vs the captured latencies
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from app.services.traffic_capture import entry_body, read_capture
+from benchmarks.load_test import save_report
+
+PERCENTILES = (50, 75, 90, 95, 99, 99.9)
+
+def endpoint_name(path: str) -> str:
+    return path.rsplit("/", 1)[-1]
+
+def distribution(latencies_ms: List[float]) -> Dict:
+    if not latencies_ms:
+        return {"count": 0}
+    values = np.array(latencies_ms)
+    summary = {"count": len(values), "mean_ms": float(values.mean()), "max_ms": float(values.max())}
+    for p in PERCENTILES:
+        summary[f"p{p:g}_ms"] = float(np.percentile(values, p))
+    return summary
+
+def peak_concurrency(intervals: List[Tuple[float, float]]) -> int:
+    """Most requests in flight at once, from (start, end) times."""
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+def ks_statistic(a: List[float], b: List[float]) -> float:
+    """Largest gap between the two empirical latency CDFs (0 = same distribution, 1 = disjoint)."""
+    if not a or not b:
+        return float("nan")
+    a_sorted, b_sorted = np.sort(a), np.sort(b)
+    grid = np.concatenate([a_sorted, b_sorted])
+    cdf_a = np.searchsorted(a_sorted, grid, side="right") / len(a_sorted)
+    cdf_b = np.searchsorted(b_sorted, grid, side="right") / len(b_sorted)
+    return float(np.max(np.abs(cdf_a - cdf_b)))
+
+# --- Replay ---------------------------------------------------------------
+
+async def replay(entries: List[Dict], app_url: str, speed: float, timeout: float, max_connections: int) -> List[Dict]:
+    results: List[Dict] = []
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=timeout, limits=limits) as client:
+        async def send(i: int, entry: Dict, scheduled: float):
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    entry["method"], entry["path"], content=entry_body(entry), headers=entry["headers"]
+                )
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            end = time.perf_counter()
+            results.append({
+                "index": i,
+                "endpoint": endpoint_name(entry["path"]),
+                "status": status,
+                "latency_ms": (end - start) * 1000,
+                "captured_status": entry["status"],
+                "captured_latency_ms": entry["latency_ms"],
+                "lag_ms": (start - scheduled) * 1000,  # Late sends mean the replayer itself is saturated
+                "start": start,
+                "end": end,
+            })
+
+        first_ts = entries[0]["ts"]
+        origin = time.perf_counter()
+        tasks = []
+        for i, entry in enumerate(entries):
+            scheduled = origin + (entry["ts"] - first_ts) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(i, entry, scheduled)))
+        await asyncio.gather(*tasks)
+
+    results.sort(key=lambda r: r["index"])
+    return results
+
+def build_report(args: argparse.Namespace, entries: List[Dict], results: List[Dict], skipped: int) -> Dict:
+    endpoints: Dict[str, Dict] = {}
+    for endpoint in sorted({r["endpoint"] for r in results}):
+        rows = [r for r in results if r["endpoint"] == endpoint]
+        ok = [r for r in rows if r["status"] == 200]
+        endpoints[endpoint] = {
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            "status_changes": sum(r["status"] != r["captured_status"] for r in rows),
+            "replay": distribution([r["latency_ms"] for r in ok]),
+            "captured": distribution([r["captured_latency_ms"] for r in rows if r["captured_status"] == 200]),
+        }
+
+    # Captured intervals are rescaled by --speed so both peaks describe the same offered load
+    first_ts = entries[0]["ts"]
+    captured_intervals = [
+        ((e["ts"] - first_ts) / args.speed, (e["ts"] - first_ts) / args.speed + e["latency_ms"] / 1000)
+        for e in entries
+    ]
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("command", "func")},
+        "skipped": skipped,
+        "wall_seconds": max(r["end"] for r in results) - min(r["start"] for r in results),
+        "peak_concurrency": {
+            "replay": peak_concurrency([(r["start"], r["end"]) for r in results]),
+            "captured": peak_concurrency(captured_intervals),
+        },
+        "max_lag_ms": max(r["lag_ms"] for r in results),
+        "endpoints": endpoints,
+        "requests": [{k: v for k, v in r.items() if k not in ("start", "end")} for r in results],
+    }
+
+def print_run(report: Dict):
+    print(f"\n{'endpoint':<10} {'reqs':>6} {'errs':>5} {'changed':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, stats in report["endpoints"].items():
+        replayed = stats["replay"]
+        print(
+            f"{endpoint:<10} {stats['requests']:>6} {stats['errors']:>5} {stats['status_changes']:>7} "
+            f"{replayed.get('p50_ms', 0):>7.1f}ms {replayed.get('p95_ms', 0):>7.1f}ms {replayed.get('p99_ms', 0):>7.1f}ms"
+        )
+    peak = report["peak_concurrency"]
+    print(f"\nPeak concurrency {peak['replay']} (captured {peak['captured']}); "
+          f"max send lag {report['max_lag_ms']:.1f}ms; {report['skipped']} requests skipped")
+
+def run(args: argparse.Namespace):
+    entries = [e for e in read_capture(args.capture) if endpoint_name(e["path"]) in args.endpoints.split(",")]
+    if args.limit:
+        entries = entries[:args.limit]
+    replayable = [e for e in entries if entry_body(e) is not None]
+    if not replayable:
+        sys.exit("No replayable requests in the capture.")
+    skipped = len(entries) - len(replayable)
+    span_s = replayable[-1]["ts"] - replayable[0]["ts"]
+    print(f"Replaying {len(replayable)} requests spanning {span_s:.1f}s at {args.speed}x against {args.app_url}")
+
+    results = asyncio.run(replay(replayable, args.app_url.rstrip("/"), args.speed, args.timeout, args.max_connections))
+    report = build_report(args, replayable, results, skipped)
+    print_run(report)
+    print(f"\nSaved results to {save_report(report, args.output, prefix='replay')}")
+
+# --- Diff -----------------------------------------------------------------
+
+def paired_ratio(old: Dict, new: Dict, endpoint: str) -> Optional[float]:
+    """Median new/old latency ratio over requests that succeeded in both replays of the same capture."""
+    old_by_index = {r["index"]: r for r in old["requests"] if r["endpoint"] == endpoint and r["status"] == 200}
+    ratios = [
+        r["latency_ms"] / old_by_index[r["index"]]["latency_ms"]
+        for r in new["requests"]
+        if r["endpoint"] == endpoint and r["status"] == 200 and r["index"] in old_by_index
+    ]
+    return float(np.median(ratios)) if ratios else None
+
+def diff(args: argparse.Namespace):
+    with open(args.reports[-1]) as f:
+        new = json.load(f)
+    if len(args.reports) == 2:
+        with open(args.reports[0]) as f:
+            old = json.load(f)
+        labels = ("old", "new")
+    else:
+        # Compare the replay with the production latencies recorded in its capture
+        old = {"endpoints": {}, "requests": [
+            {**r, "latency_ms": r["captured_latency_ms"], "status": r["captured_status"]} for r in new["requests"]
+        ]}
+        labels = ("captured", "replay")
+
+    print(f"\n{'endpoint':<10} {'metric':<9} {labels[0]:>10} {labels[1]:>10} {'change':>9}")
+    for endpoint in new["endpoints"]:
+        old_latencies = [r["latency_ms"] for r in old["requests"] if r["endpoint"] == endpoint and r["status"] == 200]
+        new_latencies = [r["latency_ms"] for r in new["requests"] if r["endpoint"] == endpoint and r["status"] == 200]
+        old_dist, new_dist = distribution(old_latencies), distribution(new_latencies)
+        for metric in ("mean_ms", *(f"p{p:g}_ms" for p in PERCENTILES), "max_ms"):
+            a, b = old_dist.get(metric, 0.0), new_dist.get(metric, 0.0)
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"{endpoint:<10} {metric:<9} {a:>10.1f} {b:>10.1f} {change:>9}")
+        ratio = paired_ratio(old, new, endpoint)
+        ratio_text = f"{ratio:.3f}" if ratio is not None else "n/a"
+        print(f"{endpoint:<10} KS statistic {ks_statistic(old_latencies, new_latencies):.3f}, "
+              f"median per-request ratio {ratio_text}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare latency distributions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Replay a capture against a server")
+    run_parser.add_argument("capture", nargs="+", help="Capture files, or directories of them (e.g. data/traffic)")
+    run_parser.add_argument("--app-url", required=True, help="Server to replay against (e.g. http://127.0.0.1:8000)")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="Time compression; 2 = twice the original rate")
+    run_parser.add_argument("--endpoints", default="query,upload", help="Comma-separated endpoints to replay")
+    run_parser.add_argument("--limit", type=int, help="Only replay the first N captured requests")
+    run_parser.add_argument("--timeout", type=float, default=120.0)
+    run_parser.add_argument("--max-connections", type=int, default=512)
+    run_parser.add_argument("--output", help="Where to write the JSON report")
+    run_parser.set_defaults(func=run)
+
+    diff_parser = commands.add_parser("diff", help="Compare latency distributions of two replay reports")
+    diff_parser.add_argument("reports", nargs="+", metavar="REPORT", help="OLD NEW, or a single report to compare with its capture")
+    diff_parser.set_defaults(func=diff)
+
+    args = parser.parse_args()
+    if args.command == "diff" and len(args.reports) > 2:
+        parser.error("diff takes one or two reports")
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Recall and latency of two-stage (document centroid -> chunk) retrieval.
+
+Builds a synthetic corpus of documents whose chunks cluster around a
+per-document center drawn from a smaller set of shared topics (so
+documents overlap, as real ones do), loads it into a VectorStore, and
+compares VectorStore.two_stage_search across TWO_STAGE_TOP_DOCUMENTS
+values against exact search over every chunk: recall@k, p50/p99 latency
+and the fraction of chunks scanned per query.
+
+Usage:
+    python -m benchmarks.two_stage_bench --documents 2000 --chunks-per-doc 50
+    python -m benchmarks.two_stage_bench --top-documents 4,8,16,32,64 --dimension 1024
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict
+import numpy as np
+
+# Keep the throwaway store out of the real data directory
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="two_stage_bench_"))
+
+import faiss
+from app.services.vector_store import VectorStore
+from benchmarks.load_test import save_report
+from benchmarks.vector_store_bench import recall_at_k
+
+def build_corpus(store: VectorStore, documents: int, chunks_per_doc: int, dimension: int,
+                 topics: int, doc_spread: float, chunk_spread: float, seed: int) -> np.ndarray:
+    """Adds the synthetic corpus to `store` one document at a time; returns all vectors."""
+    rng = np.random.default_rng(seed)
+    topic_centers = rng.standard_normal((topics, dimension)).astype(np.float32)
+    all_vectors = []
+    for doc in range(documents):
+        center = topic_centers[rng.integers(topics)] + doc_spread * rng.standard_normal(dimension).astype(np.float32)
+        count = max(1, int(rng.lognormal(np.log(chunks_per_doc), 0.5)))
+        vectors = center + chunk_spread * rng.standard_normal((count, dimension)).astype(np.float32)
+        faiss.normalize_L2(vectors)
+        store.add_embeddings(list(vectors), [{"text": "", "source_file": f"doc_{doc}", "chunk_id": str(i)} for i in range(count)])
+        all_vectors.append(vectors)
+    return np.vstack(all_vectors)
+
+def timed_search(search, queries: np.ndarray, k: int) -> Dict:
+    latencies, found = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results = search(q.tolist(), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append([r["vector_id"] for r in results] + [-1] * (k - len(results)))
+    return {
+        "ids": np.array(found),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark two-stage centroid retrieval against exact search")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--chunks-per-doc", type=int, default=50, help="Median chunks per document (log-normal)")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=100, help="Shared topics documents are drawn around")
+    parser.add_argument("--doc-spread", type=float, default=0.6)
+    parser.add_argument("--chunk-spread", type=float, default=0.5)
+    parser.add_argument("--top-documents", default="2,4,8,16,32,64")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    store = VectorStore()
+    build_start = time.perf_counter()
+    vectors = build_corpus(store, args.documents, args.chunks_per_doc, args.dimension,
+                           args.topics, args.doc_spread, args.chunk_spread, args.seed)
+    print(f"Built {len(vectors)} chunks in {args.documents} documents in {time.perf_counter() - build_start:.1f}s")
+
+    # Queries are perturbed chunks, so each has a "home" document but may match others
+    rng = np.random.default_rng((args.seed, 1))
+    queries = vectors[rng.choice(len(vectors), size=args.queries, replace=False)]
+    queries = (queries + args.chunk_spread * rng.standard_normal(queries.shape)).astype(np.float32)
+    faiss.normalize_L2(queries)
+    _, truth = faiss.knn(queries, vectors, args.k)
+
+    exact = timed_search(lambda q, k: store.similarity_search(q, top_k=k), queries, args.k)
+    rows = [{
+        "mode": "exact", "top_documents": "-", f"recall@{args.k}": recall_at_k(exact["ids"], truth),
+        "p50_ms": exact["p50_ms"], "p99_ms": exact["p99_ms"], "scanned": 1.0,
+    }]
+    for top_documents in (int(v) for v in args.top_documents.split(",")):
+        stats = timed_search(lambda q, k: store.two_stage_search(q, top_k=k, top_documents=top_documents), queries, args.k)
+        scanned = np.mean([
+            len(store.centroids.chunk_ids(store.centroids.nearest_documents(q, top_documents))) for q in queries
+        ]) / len(vectors)
+        rows.append({
+            "mode": "two_stage", "top_documents": top_documents, f"recall@{args.k}": recall_at_k(stats["ids"], truth),
+            "p50_ms": stats["p50_ms"], "p99_ms": stats["p99_ms"], "scanned": float(scanned),
+        })
+
+    print(f"\n{'mode':<10} | {'top docs':>8} | {f'R@{args.k}':>6} | {'p50 ms':>7} | {'p99 ms':>7} | {'scanned':>7}")
+    for row in rows:
+        print(f"{row['mode']:<10} | {row['top_documents']:>8} | {row[f'recall@{args.k}']:>6.3f} | "
+              f"{row['p50_ms']:>7.3f} | {row['p99_ms']:>7.3f} | {row['scanned']:>7.1%}")
+    report = {"config": vars(args), "chunks": len(vectors), "results": rows}
+    print(f"\nSaved results to {save_report(report, args.output, prefix='two_stage')}")
+
+if __name__ == "__main__":
+    main()
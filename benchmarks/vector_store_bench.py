@@ -0,0 +1,210 @@
+"""
+FAISS index micro-benchmark for choosing VectorStore defaults.
+
+Generates synthetic clustered unit vectors at the Jina dimension, then for
+each corpus size and index type measures build/train time, add throughput,
+single and batched query latency, recall@k against exact search, resident
+memory and on-disk size across a sweep of search parameters.
+
+Vectors are generated in seeded batches and never held all at once, and
+exact ground truth is computed by streaming those batches through a
+result heap, so large sizes (10M) only need memory for the index under test.
+
+Usage:
+    python -m benchmarks.vector_store_bench --sizes 10000,100000
+    python -m benchmarks.vector_store_bench --sizes 1000000,10000000 --indexes "HNSW32,IVF{nlist},SQ8"
+"""
+import argparse
+import math
+import os
+import resource
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+import faiss
+import numpy as np
+from benchmarks.load_test import save_report
+
+DIMENSION = 1024  # jina-embeddings-v3
+BATCH_SIZE = 50_000
+
+DEFAULT_INDEXES = ["Flat", "HNSW32", "IVF{nlist},Flat", "IVF{nlist},SQ8", "IVF{nlist},PQ64"]
+SEARCH_SWEEPS = {
+    "ivf": [("nprobe", v) for v in (1, 4, 16, 64)],
+    "hnsw": [("efSearch", v) for v in (16, 64, 256)],
+    "flat": [(None, None)],
+}
+
+# --- Synthetic data -------------------------------------------------------
+
+class ClusteredCorpus:
+    """Deterministic clustered unit vectors, regenerated batch by batch on demand."""
+    def __init__(self, size: int, dimension: int, clusters: int, spread: float, seed: int):
+        self.size = size
+        self.dimension = dimension
+        self.spread = spread
+        self.seed = seed
+        self.centers = np.random.default_rng(seed).standard_normal((clusters, dimension)).astype(np.float32)
+
+    def _sample(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        assignment = rng.integers(0, len(self.centers), size=count)
+        vectors = self.centers[assignment] + self.spread * rng.standard_normal((count, self.dimension)).astype(np.float32)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def batches(self) -> Iterator[np.ndarray]:
+        for batch_no, start in enumerate(range(0, self.size, BATCH_SIZE)):
+            rng = np.random.default_rng((self.seed, batch_no))
+            yield self._sample(rng, min(BATCH_SIZE, self.size - start))
+
+    def queries(self, count: int) -> np.ndarray:
+        return self._sample(np.random.default_rng((self.seed, 0xFFFFE)), count)
+
+    def training_sample(self, count: int) -> np.ndarray:
+        return self._sample(np.random.default_rng((self.seed, 0xFFFFF)), count)
+
+def exact_neighbors(corpus: ClusteredCorpus, queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact L2 top-k ids, computed by streaming corpus batches through a result heap."""
+    heap = faiss.ResultHeap(len(queries), k)
+    offset = 0
+    for batch in corpus.batches():
+        distances, ids = faiss.knn(queries, batch, k)
+        heap.add_result(distances, ids + offset)
+        offset += len(batch)
+    heap.finalize()
+    return heap.I
+
+# --- Measurement helpers --------------------------------------------------
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current RSS, but better than nothing off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def on_disk_bytes(index: faiss.Index) -> int:
+    with tempfile.NamedTemporaryFile(suffix=".faiss") as f:
+        faiss.write_index(index, f.name)
+        return os.path.getsize(f.name)
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(np.intersect1d(found[i, :k], truth[i])) for i in range(len(truth)))
+    return hits / truth.size
+
+def index_family(index: faiss.Index) -> str:
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+def search_params(family: str, value: Optional[int]):
+    if family == "ivf":
+        return faiss.SearchParametersIVF(nprobe=value)
+    if family == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=value)
+    return None
+
+# --- Benchmark ------------------------------------------------------------
+
+def benchmark_index(spec: str, corpus: ClusteredCorpus, queries: np.ndarray, truth: np.ndarray, k: int) -> List[Dict]:
+    nlist = max(16, int(4 * math.sqrt(corpus.size)))
+    factory = spec.format(nlist=nlist)
+    rss_before = current_rss_bytes()
+
+    index = faiss.index_factory(corpus.dimension, factory)
+    build_start = time.perf_counter()
+    if not index.is_trained:
+        index.train(corpus.training_sample(min(corpus.size, max(nlist * 39, 50_000))))
+    train_seconds = time.perf_counter() - build_start
+
+    add_start = time.perf_counter()
+    for batch in corpus.batches():
+        index.add(batch)
+    add_seconds = time.perf_counter() - add_start
+
+    memory_bytes = current_rss_bytes() - rss_before
+    disk_bytes = on_disk_bytes(index)
+    family = index_family(index)
+
+    rows = []
+    for param_name, param_value in SEARCH_SWEEPS[family]:
+        params = search_params(family, param_value)
+
+        single_ms = []
+        for q in queries:
+            start = time.perf_counter()
+            index.search(q.reshape(1, -1), k, params=params)
+            single_ms.append((time.perf_counter() - start) * 1000)
+
+        batch_start = time.perf_counter()
+        _, found = index.search(queries, k, params=params)
+        batch_ms = (time.perf_counter() - batch_start) * 1000
+
+        rows.append({
+            "size": corpus.size,
+            "index": factory,
+            "param": f"{param_name}={param_value}" if param_name else "-",
+            "train_s": train_seconds,
+            "build_s": train_seconds + add_seconds,
+            "add_vps": corpus.size / add_seconds if add_seconds else 0.0,
+            "single_p50_ms": float(np.percentile(single_ms, 50)),
+            "single_p99_ms": float(np.percentile(single_ms, 99)),
+            "batch_per_query_ms": batch_ms / len(queries),
+            f"recall@{k}": recall_at_k(found, truth),
+            "rss_mb": memory_bytes / 2**20,
+            "disk_mb": disk_bytes / 2**20,
+        })
+    del index
+    return rows
+
+def print_table(rows: List[Dict], k: int):
+    columns = [
+        ("size", "{:>9}"), ("index", "{:<18}"), ("param", "{:<13}"), ("build_s", "{:>8.1f}"),
+        ("add_vps", "{:>10.0f}"), ("single_p50_ms", "{:>8.2f}"), ("single_p99_ms", "{:>8.2f}"),
+        ("batch_per_query_ms", "{:>8.3f}"), (f"recall@{k}", "{:>7.3f}"), ("rss_mb", "{:>8.0f}"), ("disk_mb", "{:>8.0f}"),
+    ]
+    headers = ["size", "index", "param", "build_s", "add vec/s", "p50 ms", "p99 ms", "batch ms", f"R@{k}", "RSS MB", "disk MB"]
+    widths = [len(fmt.format(rows[0][name])) if rows else 8 for name, fmt in columns]
+    print(" | ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("-|-".join("-" * w for w in widths))
+    for row in rows:
+        print(" | ".join(fmt.format(row[name]) for name, fmt in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types for VectorStore")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated corpus sizes (e.g. 10000,...,10000000)")
+    parser.add_argument("--indexes", default=";".join(DEFAULT_INDEXES),
+                        help="Semicolon-separated index_factory strings; {nlist} is filled from corpus size")
+    parser.add_argument("--dimension", type=int, default=DIMENSION)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--spread", type=float, default=0.15, help="Within-cluster noise scale")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, help="OpenMP threads for FAISS (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    rows = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        corpus = ClusteredCorpus(size, args.dimension, args.clusters, args.spread, args.seed)
+        queries = corpus.queries(args.queries)
+        truth = exact_neighbors(corpus, queries, args.k)
+        for spec in args.indexes.split(";"):
+            print(f"Benchmarking {spec} on {size} vectors...")
+            rows.extend(benchmark_index(spec, corpus, queries, truth, args.k))
+
+    print()
+    print_table(rows, args.k)
+    report = {"config": vars(args), "results": rows}
+    print(f"\nSaved results to {save_report(report, args.output, prefix='vector_store')}")
+
+if __name__ == "__main__":
+    main()
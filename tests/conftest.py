@@ -0,0 +1,80 @@
+"""
+Unit tests run without the live APIs. Settings are read when app modules
+are imported, so the environment is set up here first.
+"""
+import os
+import tempfile
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ.setdefault("JINA_API_KEY", "test")
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.services import vector_store as vector_store_module
+
+DIMENSION = 8
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A VectorStore persisting into its own temporary index directory."""
+    index_dir = tmp_path / "faiss_index"
+    paths = {
+        "INDEX_DIR": index_dir,
+        "GENERATIONS_DIR": index_dir / "generations",
+        "CURRENT_FILE": index_dir / "CURRENT",
+        "LOCK_FILE": index_dir / ".lock",
+        "LEGACY_INDEX_FILE": index_dir / vector_store_module.INDEX_FILENAME,
+        "LEGACY_METADATA_FILE": index_dir / vector_store_module.METADATA_FILENAME,
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(vector_store_module, name, str(path))
+    return vector_store_module.VectorStore()
+
+@pytest.fixture
+def api(store, monkeypatch):
+    """A client for the API routes (without the app's startup tasks), serving `store`."""
+    monkeypatch.setattr(routes, "vector_store", store)
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api")
+    return TestClient(app)
+
+def random_vectors(count: int, dimension: int = DIMENSION, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).random((count, dimension), dtype=np.float32)
+
+def chunk_metadata(count: int, source_file: str = "a.txt", offset: int = 0):
+    return [
+        {"source_file": source_file, "chunk_id": offset + i, "text": f"chunk {offset + i} of {source_file} word{offset + i}"}
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def answering(store, monkeypatch):
+    """
+    Serves `store`, holding chunks of a.txt and b.txt, to the query path with
+    stubbed embedding and LLM calls. Returns the contexts the LLM was given.
+    """
+    from app.services import retrieval
+
+    metadata = chunk_metadata(3, "a.txt") + chunk_metadata(3, "b.txt", offset=3)
+    # Chunk ids are strings outside the unit tests, as the response schema expects
+    store.commit(random_vectors(6).tolist(), [{**m, "chunk_id": f"{m['source_file']}_chunk_{m['chunk_id']}"} for m in metadata])
+    monkeypatch.setattr(retrieval, "vector_store", store)
+    monkeypatch.setattr(routes, "vector_store", store)
+    monkeypatch.setattr(routes, "answer_cache", routes.LRUCache("answer", 16))
+    llm_contexts = []
+
+    async def embed_query(query):
+        return random_vectors(1, seed=9)[0].tolist()
+
+    async def generate_answer(question, context_chunks):
+        llm_contexts.append(context_chunks)
+        return f"Answer from {len(context_chunks)} chunks."
+
+    monkeypatch.setattr(retrieval, "embed_query", embed_query)
+    monkeypatch.setattr(routes, "generate_answer", generate_answer)
+    return llm_contexts
@@ -0,0 +1,38 @@
+import pytest
+
+from app.api import routes
+from conftest import chunk_metadata, random_vectors
+
+@pytest.fixture
+def generations(store):
+    store.commit(random_vectors(2).tolist(), chunk_metadata(2))
+    store.commit(random_vectors(1, seed=1).tolist(), chunk_metadata(1, offset=2))
+    return store
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "anything"}])
+def test_admin_endpoints_are_disabled_without_a_configured_token(api, generations, monkeypatch, headers):
+    monkeypatch.setattr(routes.settings, "ADMIN_TOKEN", None)
+    assert api.get("/api/admin/generations", headers=headers).status_code == 403
+    response = api.post("/api/admin/generations/1/rollback", headers=headers)
+    assert response.status_code == 403
+    assert "ADMIN_TOKEN" in response.json()["detail"]
+    assert generations.disk_generation() == 2
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}])
+def test_admin_endpoints_reject_a_missing_or_wrong_token(api, generations, monkeypatch, headers):
+    monkeypatch.setattr(routes.settings, "ADMIN_TOKEN", "secret")
+    response = api.post("/api/admin/generations/1/rollback", headers=headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Invalid admin token."
+    assert generations.disk_generation() == 2
+
+def test_admin_can_list_and_roll_back_generations(api, generations, monkeypatch):
+    monkeypatch.setattr(routes.settings, "ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    listing = api.get("/api/admin/generations", headers=headers).json()
+    assert listing["current"] == 2
+    assert [(g["generation"], g["current"]) for g in listing["generations"]] == [(2, True), (1, False)]
+
+    assert api.post("/api/admin/generations/1/rollback", headers=headers).json() == {"generation": 1, "vectors": 2}
+    assert generations.disk_generation() == 1
+    assert api.post("/api/admin/generations/9/rollback", headers=headers).status_code == 404
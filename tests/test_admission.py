@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected, retry_after_header
+
+def controller(max_concurrent=1, max_queue=10, max_wait_ms=1000.0, avg_service_s=0.01):
+    admission = AdmissionController("test", max_concurrent, max_queue, max_wait_ms)
+    admission.avg_service_s = avg_service_s
+    return admission
+
+async def hold(admission, release: asyncio.Event, order=None, name=None):
+    async with admission.admit():
+        if order is not None:
+            order.append(name)
+        await release.wait()
+
+def test_admits_up_to_max_concurrent_without_queueing():
+    async def main():
+        admission = controller(max_concurrent=2)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert admission.active == 2 and not admission.waiters
+        release.set()
+        await asyncio.gather(*tasks)
+        assert admission.active == 0
+
+    asyncio.run(main())
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def main():
+        admission = controller()
+        release = asyncio.Event()
+        order = []
+        first = asyncio.create_task(hold(admission, release, order, "first"))
+        await asyncio.sleep(0)
+        queued = []
+        for name in ("a", "b", "c"):
+            queued.append(asyncio.create_task(hold(admission, release, order, name)))
+            await asyncio.sleep(0)
+        assert len(admission.waiters) == 3
+        release.set()
+        await asyncio.gather(first, *queued)
+        assert order == ["first", "a", "b", "c"]
+        assert admission.active == 0
+
+    asyncio.run(main())
+
+def test_sheds_when_the_queue_is_full():
+    async def main():
+        admission = controller(max_queue=1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, release))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold(admission, release)))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with admission.admit():
+                pass
+        assert rejected.value.reason == "queue_full"
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+def test_sheds_up_front_when_the_estimated_wait_is_too_long():
+    async def main():
+        admission = controller(max_wait_ms=100, avg_service_s=1.0)
+        release = asyncio.Event()
+        task = asyncio.create_task(hold(admission, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with admission.admit():
+                pass
+        assert rejected.value.reason == "queue_wait"
+        assert rejected.value.retry_after_s == pytest.approx(1.0)
+        assert not admission.waiters
+        release.set()
+        await task
+
+    asyncio.run(main())
+
+def test_request_deadline_only_tightens_the_wait_limit():
+    admission = controller(max_wait_ms=100, avg_service_s=0.05)
+    admission.active = 1
+    admission.check()
+    admission.check(max_wait_ms=10_000)
+    with pytest.raises(AdmissionRejected):
+        admission.check(max_wait_ms=10)
+
+def test_rejects_waiters_that_time_out():
+    async def main():
+        admission = controller(max_wait_ms=50, avg_service_s=0.001)
+        release = asyncio.Event()
+        task = asyncio.create_task(hold(admission, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with admission.admit():
+                pass
+        assert rejected.value.reason == "wait_timeout"
+        assert not admission.waiters
+        release.set()
+        await task
+        assert admission.active == 0
+
+    asyncio.run(main())
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def main():
+        admission = controller()
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(admission, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(admission, release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await holder
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.active == 0 and not admission.waiters
+
+    asyncio.run(main())
+
+def test_check_takes_neither_a_slot_nor_a_queue_place():
+    admission = controller(max_queue=0)
+    admission.check()
+    assert admission.active == 0 and not admission.waiters
+    admission.active = 1
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.check()
+    assert rejected.value.reason == "queue_full"
+    assert admission.active == 1 and not admission.waiters
+
+def test_retry_after_header_rounds_up_to_whole_seconds():
+    assert retry_after_header(0.2) == "1"
+    assert retry_after_header(2.1) == "3"
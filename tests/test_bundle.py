@@ -0,0 +1,111 @@
+import io
+import json
+import shutil
+import tarfile
+import numpy as np
+import pytest
+
+from app.services import bundle, vector_store as vector_store_module
+from app.services.bundle import BundleMismatch, check_header, export_bundle, import_bundle
+from app.services.vector_store import VectorStore
+from conftest import DIMENSION, chunk_metadata, random_vectors
+
+@pytest.fixture(autouse=True)
+def dimension(monkeypatch):
+    monkeypatch.setattr(bundle.settings, "EMBEDDING_DIMENSION", DIMENSION)
+
+@pytest.fixture
+def exported(store, tmp_path):
+    store.commit(random_vectors(5).tolist(), chunk_metadata(5))
+    path = str(tmp_path / "store.tar.gz")
+    export_bundle(store, path)
+    return path
+
+def rewrite(path, target, edit):
+    """Copies the bundle at `path` to `target`, passing each member's bytes through `edit(name, data)`."""
+    with tarfile.open(path, "r:*") as source, tarfile.open(target, "w") as out:
+        for member in source.getmembers():
+            data = edit(member.name, source.extractfile(member).read())
+            member.size = len(data)
+            out.addfile(member, io.BytesIO(data))
+    return target
+
+def fresh_store() -> VectorStore:
+    store = VectorStore()
+    store.load_index()
+    return store
+
+def test_round_trip_into_an_empty_store(store, exported):
+    vectors = store.all_vectors()
+    metadata = dict(store.metadata)
+    # Start the target from an empty directory
+    shutil.rmtree(vector_store_module.INDEX_DIR)
+    target = VectorStore()
+    target.load_index()
+    header = import_bundle(target, exported)
+    assert header["vectors"] == 5 and header["generation"] == 1
+    np.testing.assert_array_equal(target.all_vectors(), vectors)
+    assert target.metadata == metadata
+    assert target.lexical_search("word4", top_k=1)[0]["vector_id"] == 4
+
+def test_refuses_to_overwrite_a_store_with_vectors(exported):
+    with pytest.raises(FileExistsError):
+        import_bundle(fresh_store(), exported)
+    assert import_bundle(fresh_store(), exported, replace=True)["generation"] == 2
+
+@pytest.mark.parametrize("field, value, message", [
+    ("format", "something-else", "Not an index bundle"),
+    ("version", 99, "newer than supported"),
+    ("embedding_model", "other-model", "embedded with other-model"),
+    ("dimension", DIMENSION * 2, "does not match EMBEDDING_DIMENSION"),
+])
+def test_mismatched_headers_are_rejected(exported, tmp_path, field, value, message):
+    def edit(name, data):
+        if name != bundle.HEADER_MEMBER:
+            return data
+        header = json.loads(data)
+        header[field] = value
+        return json.dumps(header).encode()
+
+    path = rewrite(exported, str(tmp_path / "bad.tar"), edit)
+    with pytest.raises(BundleMismatch, match=message):
+        import_bundle(fresh_store(), path, replace=True)
+
+def test_check_header_accepts_this_builds_bundles(exported):
+    with tarfile.open(exported, "r:*") as tar:
+        check_header(json.loads(tar.extractfile(bundle.HEADER_MEMBER).read()))
+
+def test_corrupt_vectors_fail_the_checksum_and_publish_nothing(exported, tmp_path):
+    def edit(name, data):
+        return data[:-1] + b"\x7f" if name == bundle.VECTORS_MEMBER else data
+
+    path = rewrite(exported, str(tmp_path / "corrupt.tar"), edit)
+    store = fresh_store()
+    with pytest.raises(ValueError, match="checksum mismatch for vectors.f32"):
+        import_bundle(store, path, replace=True)
+    assert store.disk_generation() == 1
+
+def test_truncated_vectors_are_rejected(exported, tmp_path):
+    def edit(name, data):
+        return data[:-4] if name == bundle.VECTORS_MEMBER else data
+
+    path = rewrite(exported, str(tmp_path / "short.tar"), edit)
+    with pytest.raises(ValueError, match="Malformed bundle"):
+        import_bundle(fresh_store(), path, replace=True)
+
+def test_exporting_an_empty_store_fails(store, tmp_path):
+    store.load_index()
+    with pytest.raises(ValueError, match="empty"):
+        export_bundle(store, str(tmp_path / "empty.tar"))
+
+def test_failed_export_leaves_no_partial_file(store, tmp_path, monkeypatch):
+    store.commit(random_vectors(5).tolist(), chunk_metadata(5))
+
+    def vectors_then_fail(batch_size=65536):
+        yield random_vectors(2)
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(store, "iter_vectors", vectors_then_fail)
+    with pytest.raises(OSError):
+        export_bundle(store, str(tmp_path / "store.tar"))
+    assert not list(tmp_path.glob("store.tar*"))
@@ -0,0 +1,51 @@
+import pickle
+import numpy as np
+import pytest
+
+from app.services.centroids import DocumentCentroids
+from app.services.vector_store import VectorStore
+from conftest import DIMENSION, chunk_metadata
+
+def clustered(axis: int, count: int, seed: int) -> np.ndarray:
+    """Vectors scattered around the unit vector along `axis`."""
+    vectors = np.random.default_rng(seed).normal(scale=0.05, size=(count, DIMENSION)).astype(np.float32)
+    vectors[:, axis] += 1.0
+    return vectors
+
+def test_centroids_are_updated_incrementally():
+    centroids = DocumentCentroids()
+    centroids.add("a.txt", [0, 1], np.array([[2.0, 0.0], [0.0, 2.0]], dtype=np.float32))
+    centroids.add("b.txt", [2], np.array([[-1.0, 0.0]], dtype=np.float32))
+    assert centroids.nearest_documents(np.array([1.0, 1.0]), 2) == ["a.txt", "b.txt"]
+    assert centroids.nearest_documents(np.array([-1.0, 1.0]), 1) == ["b.txt"]
+    # A later chunk moves a.txt's centroid
+    centroids.add("a.txt", [3], np.array([[-4.0, 0.0]], dtype=np.float32))
+    assert centroids.nearest_documents(np.array([-1.0, 1.0]), 1) == ["a.txt"]
+    assert centroids.chunk_ids(["a.txt", "b.txt", "a.txt"]).tolist() == [0, 1, 2, 3]
+    assert centroids.chunk_ids([]).tolist() == []
+
+def test_pickled_centroids_rebuild_their_matrix():
+    centroids = DocumentCentroids()
+    centroids.add("a.txt", [0], np.ones((1, 4), dtype=np.float32))
+    centroids.nearest_documents(np.ones(4), 1)
+    restored = pickle.loads(pickle.dumps(centroids))
+    assert restored._matrix is None
+    assert restored.nearest_documents(np.ones(4), 1) == ["a.txt"]
+
+def test_two_stage_search_only_scans_the_nearest_documents(store):
+    vectors = np.vstack([clustered(0, 5, seed=1), clustered(1, 5, seed=2), clustered(2, 5, seed=3)])
+    metadata = chunk_metadata(5, "a.txt") + chunk_metadata(5, "b.txt", offset=5) + chunk_metadata(5, "c.txt", offset=10)
+    store.commit(vectors.tolist(), metadata)
+    query = clustered(1, 1, seed=4)[0]
+
+    results = store.two_stage_search(query.tolist(), top_k=3, top_documents=1)
+    assert {r["metadata"]["source_file"] for r in results} == {"b.txt"}
+    exact = store.similarity_search(query.tolist(), top_k=3)
+    assert [r["vector_id"] for r in results] == [r["vector_id"] for r in exact]
+    assert [r["score"] for r in results] == pytest.approx([r["score"] for r in exact], abs=1e-4)
+
+    # Centroids are persisted with the generation
+    reader = VectorStore()
+    reader.load_index()
+    assert reader.centroids.nearest_documents(query, 1) == ["b.txt"]
+    assert len(reader.two_stage_search(query.tolist(), top_k=10, top_documents=2)) == 10
@@ -0,0 +1,41 @@
+from app.services import compression
+from app.services.compression import GAP_MARKER, compress_context, should_compress
+
+def result(vector_id, text):
+    return {"vector_id": vector_id, "score": 0.0, "metadata": {"source_file": "a.txt", "chunk_id": vector_id, "text": text}}
+
+FILLER = [f"Filler sentence number {n} talks about nothing." for n in range(8)]
+
+def test_keeps_the_best_sentences_with_their_neighbours_in_order():
+    text = " ".join(FILLER[:3] + ["The warranty lasts five years."] + FILLER[3:])
+    other = " ".join(FILLER)
+    compressed, original, kept = compress_context("How long is the warranty?", [result(1, other), result(2, text)], ratio=0.1, neighbors=1)
+    assert [res["vector_id"] for res in compressed] == [2]
+    assert compressed[0]["metadata"]["text"] == " ".join([FILLER[2], "The warranty lasts five years.", FILLER[3]])
+    assert compressed[0]["metadata"]["source_file"] == "a.txt"
+    assert original == len(text) + len(other) and kept == len(compressed[0]["metadata"]["text"])
+
+def test_marks_gaps_between_kept_sentences():
+    text = " ".join(["Refunds take ten days.", *FILLER[:4], "Refunds need a receipt."])
+    (res,), _, _ = compress_context("refunds", [result(1, text)], ratio=0.3, neighbors=0)
+    assert res["metadata"]["text"] == f"Refunds take ten days.{GAP_MARKER}Refunds need a receipt."
+
+def test_unrelated_questions_leave_the_context_unchanged():
+    context = [result(1, " ".join(FILLER))]
+    assert compress_context("warranty", context, ratio=0.1, neighbors=1) == (context, len(context[0]["metadata"]["text"]), len(context[0]["metadata"]["text"]))
+
+def test_only_long_contexts_are_compressed(monkeypatch):
+    monkeypatch.setattr(compression.settings, "CONTEXT_COMPRESSION_MIN_CHARS", 100)
+    assert not should_compress([result(1, "x" * 99)], True)
+    assert should_compress([result(1, "x" * 60), result(2, "x" * 40)], True)
+    assert not should_compress([result(1, "x" * 500)], False)
+
+def test_compressed_queries_send_less_context_to_the_llm(api, answering, monkeypatch):
+    monkeypatch.setattr(compression.settings, "CONTEXT_COMPRESSION_MIN_CHARS", 0)
+    api.post("/api/query", json={"question": "word1", "top_k": 3, "compress": False})
+    response = api.post("/api/query", json={"question": "word1", "top_k": 3, "compress": True}).json()
+    full, compressed = answering
+    assert len(full) == 3
+    assert [res["metadata"]["text"] for res in compressed] == ["chunk 1 of a.txt word1"]
+    # Sources still cite every retrieved chunk
+    assert len(response["sources"]) == 3
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+
+from app.services import retrieval
+from app.services.deadline import Deadline
+from conftest import chunk_metadata, random_vectors
+
+def late(deadline: Deadline) -> Deadline:
+    """Moves the deadline's start back so the embedding stage is already over its share."""
+    deadline.start -= (deadline.stage_share_ms("embedding") + 50) / 1000
+    return deadline
+
+def test_unbounded_deadline_never_runs_late():
+    deadline = Deadline()
+    assert deadline.remaining_ms() is None and deadline.stage_timeout_ms("embedding") is None
+    assert not deadline.behind_schedule("embedding")
+
+def test_stage_allowances_split_the_budget(monkeypatch):
+    monkeypatch.setattr(retrieval.settings, "DEADLINE_EMBEDDING_SHARE", 0.2)
+    monkeypatch.setattr(retrieval.settings, "DEADLINE_SEARCH_SHARE", 0.1)
+    deadline = Deadline(1000)
+    assert deadline.stage_share_ms("embedding") == pytest.approx(200)
+    assert deadline.stage_share_ms("llm") == pytest.approx(700)
+    assert not deadline.behind_schedule("embedding")
+    late(deadline)
+    assert deadline.behind_schedule("embedding")
+    assert deadline.stage_timeout_ms("llm") == pytest.approx(700)
+    # Capped by what is actually left once earlier stages overran
+    deadline.start -= 0.5
+    assert deadline.stage_timeout_ms("llm") == pytest.approx(250, abs=20)
+
+def test_degradations_are_recorded_once():
+    deadline = Deadline(1000)
+    deadline.degrade("lexical_only")
+    deadline.degrade("lexical_only")
+    assert deadline.degradations == ["lexical_only"]
+
+@pytest.fixture
+def live_store(store, monkeypatch):
+    store.commit(random_vectors(6).tolist(), chunk_metadata(3, "a.txt") + chunk_metadata(3, "b.txt", offset=3))
+    monkeypatch.setattr(retrieval, "vector_store", store)
+
+    async def embed_query(query):
+        return random_vectors(1, seed=9)[0].tolist()
+
+    monkeypatch.setattr(retrieval, "embed_query", embed_query)
+    return store
+
+def spy(monkeypatch, store, method):
+    calls = []
+    original = getattr(store, method)
+
+    def record(*args, **kwargs):
+        calls.append(kwargs)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(store, method, record)
+    return calls
+
+def test_late_requests_search_with_half_the_effort(live_store, monkeypatch):
+    calls = spy(monkeypatch, live_store, "similarity_search")
+    deadline = late(Deadline(10_000))
+    asyncio.run(retrieval.retrieve_context("word1", top_k=2, nprobe=8, ef_search=40, deadline=deadline))
+    assert calls[0]["nprobe"] == 4 and calls[0]["ef_search"] == 20
+    assert deadline.degradations == ["reduced_search_effort"]
+
+def test_late_requests_search_fewer_documents_in_two_stage_retrieval(live_store, monkeypatch):
+    monkeypatch.setattr(retrieval.settings, "TWO_STAGE_MIN_DOCUMENTS", 1)
+    monkeypatch.setattr(retrieval.settings, "TWO_STAGE_TOP_DOCUMENTS", 2)
+    calls = spy(monkeypatch, live_store, "two_stage_search")
+    asyncio.run(retrieval.retrieve_context("word1", top_k=2, deadline=Deadline(10_000)))
+    deadline = late(Deadline(10_000))
+    asyncio.run(retrieval.retrieve_context("word1", top_k=2, deadline=deadline))
+    assert [call["top_documents"] for call in calls] == [2, 1]
+    assert deadline.degradations == ["reduced_search_effort"]
@@ -0,0 +1,103 @@
+from app.services.dedup import (
+    MinHasher, NearDuplicateIndex, StreamingDeduplicator, add_duplicate_refs, duplicate_count, minhasher,
+)
+from app.services.store_stats import StoreStats
+
+BOILERPLATE = (
+    "This document is confidential and intended solely for the use of the individual or entity "
+    "to whom it is addressed. If you have received it in error please notify the sender immediately "
+    "and delete it from your system. Any unauthorised copying or distribution is strictly prohibited."
+)
+
+def ref(source_file, chunk_id=0):
+    return {"source_file": source_file, "chunk_id": chunk_id}
+
+def test_signature_is_deterministic_and_none_without_tokens():
+    hasher = MinHasher(num_perm=64, shingle_size=3)
+    assert (hasher.signature(BOILERPLATE) == hasher.signature(BOILERPLATE)).all()
+    assert hasher.signature("  ...  ") is None
+
+def test_similarity_tracks_jaccard():
+    hasher = MinHasher(num_perm=256, shingle_size=3)
+    near = BOILERPLATE.replace("immediately", "at once")
+    unrelated = "Quarterly revenue grew by twelve percent driven by strong subscription renewals in Europe."
+    base = hasher.signature(BOILERPLATE)
+    assert (base == hasher.signature(near)).mean() > 0.7
+    assert (base == hasher.signature(unrelated)).mean() < 0.1
+
+def test_near_duplicate_index_finds_only_above_threshold():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add(7, minhasher.signature(BOILERPLATE))
+    assert index.find(minhasher.signature(BOILERPLATE)) == 7
+    assert index.find(minhasher.signature("An entirely different passage about sailing boats and harbours.")) is None
+    assert len(index) == 1
+
+def test_add_duplicate_refs_lists_other_documents_once():
+    meta = {"source_file": "a.txt"}
+    kept = add_duplicate_refs(meta, [ref("a.txt", 3), ref("b.txt"), ref("b.txt", 1), ref("c.txt")])
+    assert kept == [ref("b.txt"), ref("c.txt")]
+    assert meta["duplicates"] == kept
+    assert meta["duplicate_count"] == 4
+
+def test_add_duplicate_refs_caps_the_listed_sources(monkeypatch):
+    monkeypatch.setattr("app.services.dedup.settings.DEDUP_MAX_SOURCE_REFS", 3)
+    meta = {"source_file": "a.txt"}
+    add_duplicate_refs(meta, [ref(f"{i}.txt") for i in range(2)])
+    kept = add_duplicate_refs(meta, [ref(f"{i}.txt") for i in range(2, 10)])
+    assert kept == [ref("2.txt")]
+    assert len(meta["duplicates"]) == 3
+    assert meta["duplicate_count"] == 10
+    assert add_duplicate_refs(meta, [ref("x.txt")]) == []
+    assert duplicate_count(meta) == 11
+
+def test_duplicate_count_of_rows_written_before_the_count():
+    assert duplicate_count({"duplicates": [ref("b.txt"), ref("c.txt")]}) == 2
+    assert duplicate_count({}) == 0
+
+def test_store_stats_count_unlisted_duplicates():
+    stats = StoreStats()
+    meta = {"source_file": "a.txt", "text": "x"}
+    stats.add_row(meta)
+    refs = [ref("b.txt"), ref("b.txt", 1), ref("c.txt")]
+    listed = add_duplicate_refs(meta, refs)
+    stats.add_duplicates(meta, listed, len(refs))
+    assert stats.duplicate_rows == 3
+
+def test_streaming_deduplicator_collapses_within_a_document():
+    deduplicator = StreamingDeduplicator(lambda signature: None)
+    first = {"source_file": "a.txt", "chunk_id": 0, "text": BOILERPLATE}
+    second = {"source_file": "a.txt", "chunk_id": 1, "text": BOILERPLATE}
+    assert deduplicator.check(first)[0] is True
+    assert deduplicator.check(second)[0] is False
+    assert deduplicator.document_duplicates == 1
+    # Same document: counted, but not listed as another source
+    assert first["duplicate_count"] == 1
+    assert "duplicates" not in first
+
+def test_streaming_deduplicator_defers_refs_to_stored_vectors():
+    deduplicator = StreamingDeduplicator(lambda signature: 42)
+    chunk = {"source_file": "b.txt", "chunk_id": 5, "text": BOILERPLATE}
+    needs_embedding, signature = deduplicator.check(chunk)
+    assert not needs_embedding and signature is not None
+    assert deduplicator.corpus_duplicates == 1
+    assert deduplicator.take_existing_duplicates() == {42: [ref("b.txt", 5)]}
+    assert deduplicator.take_existing_duplicates() == {}
+
+def test_streaming_deduplicator_routes_matches_on_committed_chunks_to_the_store():
+    deduplicator = StreamingDeduplicator(lambda signature: None)
+    first = {"source_file": "a.txt", "chunk_id": 0, "text": BOILERPLATE}
+    deduplicator.check(first)
+    first["vector_id"] = 9
+    deduplicator.check({"source_file": "a.txt", "chunk_id": 1, "text": BOILERPLATE})
+    assert deduplicator.take_existing_duplicates() == {9: [ref("a.txt", 1)]}
+
+def test_commit_merges_duplicate_refs_into_stored_chunks(store, monkeypatch):
+    monkeypatch.setattr("app.services.dedup.settings.DEDUP_MAX_SOURCE_REFS", 2)
+    store.commit([[1.0] * 8], [{"source_file": "a.txt", "chunk_id": 0, "text": BOILERPLATE}])
+    refs = [ref(f"{i}.txt") for i in range(5)]
+    store.commit([], [], duplicate_sources={0: refs, 99: [ref("gone.txt")]})
+    assert store.generation == 2
+    assert store.metadata[0]["duplicate_count"] == 5
+    assert [r["source_file"] for r in store.metadata[0]["duplicates"]] == ["0.txt", "1.txt"]
+    assert store.stats.duplicate_rows == 5
+    assert store.find_near_duplicate(minhasher.signature(BOILERPLATE)) == 0
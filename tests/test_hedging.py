@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+
+from app.services.hedging import Hedger
+
+@pytest.fixture(autouse=True)
+def hedge_settings(monkeypatch):
+    from app.services.hedging import settings
+    monkeypatch.setattr(settings, "HEDGING_ENABLED", True)
+    monkeypatch.setattr(settings, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY_MS", 10.0)
+    monkeypatch.setattr(settings, "HEDGE_PERCENTILE", 95.0)
+    monkeypatch.setattr(settings, "HEDGE_BUDGET_RATIO", 0.0)
+    monkeypatch.setattr(settings, "HEDGE_BUDGET_BURST", 1)
+
+def warmed_up(latency_s=0.01) -> Hedger:
+    hedger = Hedger("test")
+    hedger.latencies.extend([latency_s] * 5)
+    return hedger
+
+def test_no_hedging_until_enough_samples():
+    hedger = Hedger("test")
+    assert hedger.delay_s() is None
+    hedger.latencies.extend([0.001] * 5)
+    assert hedger.delay_s() == pytest.approx(0.01)  # Floored at HEDGE_MIN_DELAY_MS
+
+def test_slow_primary_is_hedged_and_the_spare_cancelled():
+    async def main():
+        hedger = warmed_up()
+        calls = []
+        cancelled = []
+
+        async def attempt():
+            number = len(calls)
+            calls.append(number)
+            try:
+                await asyncio.sleep(1.0 if number == 0 else 0.0)
+            except asyncio.CancelledError:
+                cancelled.append(number)
+                raise
+            return number
+
+        assert await hedger.run(attempt) == 1
+        await asyncio.sleep(0)  # Let the cancellation land
+        assert calls == [0, 1]
+        assert cancelled == [0]
+        # Both the winner and the abandoned primary are recorded
+        assert len(hedger.latencies) == 7
+
+    asyncio.run(main())
+
+def test_hedges_stop_when_the_budget_is_spent():
+    async def main():
+        hedger = warmed_up()
+        calls = []
+
+        async def attempt():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        await hedger.run(attempt)
+        assert len(calls) == 2
+        calls.clear()
+        assert await hedger.run(attempt) == "ok"
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+def test_budget_refills_by_the_ratio_per_call(monkeypatch):
+    from app.services.hedging import settings
+    monkeypatch.setattr(settings, "HEDGE_BUDGET_RATIO", 0.5)
+    hedger = warmed_up(latency_s=1.0)
+    hedger.credit = 0.0
+
+    async def fast():
+        return "ok"
+
+    async def main():
+        for _ in range(2):
+            await hedger.run(fast)
+
+    asyncio.run(main())
+    assert hedger.credit == pytest.approx(1.0)
+
+def test_a_failed_attempt_falls_back_to_the_other():
+    async def main():
+        hedger = warmed_up()
+        calls = []
+
+        async def attempt():
+            number = len(calls)
+            calls.append(number)
+            await asyncio.sleep(0.05 if number == 0 else 0.0)
+            if number == 1:
+                raise ConnectionError("hedge failed")
+            return "primary"
+
+        assert await hedger.run(attempt) == "primary"
+
+    asyncio.run(main())
+
+def test_disabled_hedger_makes_one_call(monkeypatch):
+    from app.services.hedging import settings
+    monkeypatch.setattr(settings, "HEDGING_ENABLED", False)
+    hedger = warmed_up()
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert asyncio.run(hedger.run(attempt)) == "ok"
+    assert calls == [1]
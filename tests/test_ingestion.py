@@ -0,0 +1,58 @@
+import asyncio
+import random
+import time
+import numpy as np
+import pytest
+
+from app.services import ingestion
+from app.services.ingestion import commit_interval, process_document
+
+@pytest.fixture
+def pipeline_store(store, monkeypatch):
+    monkeypatch.setattr(ingestion, "vector_store", store)
+    monkeypatch.setattr(ingestion.settings, "INGEST_EMBED_BATCH_SIZE", 2)
+    monkeypatch.setattr(ingestion.settings, "INGEST_EMBED_CONCURRENCY", 1)
+    monkeypatch.setattr(ingestion.settings, "INGEST_COMMIT_INTERVAL_S", 0.2)
+
+    async def generate_embeddings(texts):
+        await asyncio.sleep(0.05)
+        return np.random.default_rng(len(texts)).random((len(texts), 8), dtype=np.float32).tolist()
+
+    monkeypatch.setattr(ingestion, "generate_embeddings", generate_embeddings)
+    return store
+
+def write_document(path, chars: int) -> str:
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(" ".join(f"w{rng.randrange(100_000)}" for _ in range(chars // 7))[:chars])
+    return str(path)
+
+def test_commit_interval_stretches_with_snapshot_save_time(store, monkeypatch):
+    monkeypatch.setattr(ingestion, "vector_store", store)
+    monkeypatch.setattr(ingestion.settings, "INGEST_COMMIT_INTERVAL_S", 2.0)
+    monkeypatch.setattr(ingestion.settings, "INGEST_COMMIT_MAX_SAVE_SHARE", 0.25)
+    store.last_save_seconds = 0.1
+    assert commit_interval() == 2.0
+    store.last_save_seconds = 1.5
+    assert commit_interval() == pytest.approx(6.0)
+
+def test_documents_become_searchable_in_paced_commits(pipeline_store, tmp_path, monkeypatch):
+    commits = []
+    original = pipeline_store.commit
+
+    def record(embeddings, *args, **kwargs):
+        commits.append((time.perf_counter(), len(embeddings)))
+        return original(embeddings, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline_store, "commit", record)
+    # 20 chunks of 1000 chars (800 apart) -> 10 embedding batches of 2
+    pipeline = asyncio.run(process_document(write_document(tmp_path / "long.txt", 16_200), "long.txt"))
+
+    assert pipeline.error is None
+    assert pipeline.chunks == pipeline.indexed == pipeline_store.index.ntotal == 20
+    # The first batch is published straight away, the rest at most every 0.2s
+    assert commits[0][1] == 2
+    assert 3 <= len(commits) == pipeline.commits < 10
+    gaps = [later[0] - earlier[0] for earlier, later in zip(commits, commits[1:-1])]
+    assert all(gap >= 0.19 for gap in gaps)
+    assert pipeline_store.disk_generation() == len(commits)
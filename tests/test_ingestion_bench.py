@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import io
+import random
+import numpy as np
+from pypdf import PdfReader
+
+from app.services import ingestion
+from app.services import vector_store as vector_store_module
+from benchmarks import ingestion_bench
+from benchmarks.ingestion_bench import LINE_CHARS, pdf_bytes, synthetic_pages, txt_text
+
+def test_synthetic_pages_are_deterministic_lines_of_sentences():
+    pages = synthetic_pages(random.Random(3), pages=2, words_per_page=120)
+    assert pages == synthetic_pages(random.Random(3), pages=2, words_per_page=120)
+    assert len(pages) == 2
+    for lines in pages:
+        assert all(len(line) <= LINE_CHARS for line in lines)
+        assert len(" ".join(lines).split()) >= 120
+        assert lines[-1].endswith(".")
+
+def test_generated_pdf_extracts_to_the_same_text_as_txt():
+    pages = synthetic_pages(random.Random(1), pages=3, words_per_page=60)
+    pages[0][0] += " (with parentheses)"
+    reader = PdfReader(io.BytesIO(pdf_bytes(pages)))
+    assert len(reader.pages) == 3
+    extracted = "\n\n".join(page.extract_text() for page in reader.pages)
+    assert extracted.split() == txt_text(pages).split()
+
+def test_benchmark_reports_per_document_throughput(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store_module, "vector_store", store)
+    monkeypatch.setattr(ingestion, "vector_store", store)
+
+    async def generate_embeddings(texts):
+        return np.random.default_rng(len(texts)).random((len(texts), 8), dtype=np.float32).tolist()
+
+    monkeypatch.setattr(ingestion, "generate_embeddings", generate_embeddings)
+    args = argparse.Namespace(documents=2, pages=3, words_per_page=200, formats="pdf,txt", seed=0)
+    rows = asyncio.run(ingestion_bench.run(args, str(tmp_path)))
+
+    assert [row["format"] for row in rows] == ["pdf", "txt"]
+    assert rows[-1]["total_vectors"] == store.index.ntotal == sum(row["vectors"] for row in rows)
+    for row in rows:
+        assert row["vectors"] > 0 and row["chunks"] >= row["vectors"]
+        assert row["stage_seconds"]["extraction"] > 0 and row["stage_seconds"]["save"] > 0
+        assert row["pages_per_s"] > 0 and row["stage_rates"]["indexing_vectors_per_s"] > 0
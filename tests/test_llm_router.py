@@ -0,0 +1,71 @@
+import pytest
+
+from app.services import llm
+from app.services.llm import REFUSAL_ANSWER, escalation_reason, route_model, score_margin
+
+def chunks(*scores):
+    return [{"score": score, "metadata": {}} for score in scores]
+
+@pytest.fixture
+def routing(monkeypatch):
+    monkeypatch.setattr(llm.settings, "LLM_ROUTING_ENABLED", True)
+
+@pytest.fixture(autouse=True)
+def clean_speeds(monkeypatch):
+    monkeypatch.setattr(llm, "tier_speed", {})
+
+def test_routing_is_off_by_default():
+    tier, reason, features = route_model("What year was it founded?", chunks(0.9, 0.1), 500)
+    assert (tier, reason) == ("large", "disabled")
+    assert features["question_type"] == "lookup"
+
+def test_short_lookup_with_a_clear_winner_goes_to_the_small_model(routing):
+    assert route_model("What year was it founded?", chunks(0.9, 0.1, 0.1), 500)[:2] == ("small", "simple")
+
+@pytest.mark.parametrize("query, scores, context_chars, reason", [
+    ("what " * 20, (0.9, 0.1), 500, "question_length"),
+    ("Why did revenue fall?", (0.9, 0.1), 500, "question_type"),
+    ("Compare the two plans", (0.9, 0.1), 500, "question_type"),
+    ("What year was it founded?", (0.9, 0.1), 10_000, "context_size"),
+    ("What year was it founded?", (0.5, 0.48, 0.47), 500, "score_margin"),
+])
+def test_anything_else_goes_to_the_large_model(routing, query, scores, context_chars, reason):
+    assert route_model(query, chunks(*scores), context_chars)[:2] == ("large", reason)
+
+def test_score_margin():
+    assert score_margin(chunks(1.0, 0.5, 0.5)) == pytest.approx(0.5)
+    assert score_margin(chunks(0.4, 0.4)) == 0.0
+    assert score_margin(chunks(0.0, 0.0)) == 0.0
+    assert score_margin(chunks(0.9)) is None
+    # Distances: the best result has the smallest score
+    assert score_margin(chunks(0.2, 1.0)) == pytest.approx(0.8)
+
+def test_escalation_reason():
+    assert escalation_reason(f"Sorry. {REFUSAL_ANSWER}") == "refusal"
+    assert escalation_reason("Yes.") == "short"
+    assert escalation_reason("Yes.", complete=False) is None
+    assert escalation_reason("It was founded in 1998 in Berlin by two engineers.") is None
+
+def test_token_cost_uses_the_tier_prices():
+    assert llm.token_cost("large", 1_000_000, 0) == pytest.approx(llm.settings.LLM_LARGE_PRICE_PER_M_INPUT)
+    assert llm.token_cost("small", 0, 1_000_000) == pytest.approx(llm.settings.LLM_SMALL_PRICE_PER_M_OUTPUT)
+
+def test_estimated_seconds_follows_recent_speed():
+    assert llm.estimated_seconds("large", 100) is None
+    llm.record_speed("large", ttft_s=0.5, latency_s=1.49, completion_tokens=100)
+    assert llm.estimated_seconds("large", 100) == pytest.approx(1.49)
+    llm.record_speed("large", ttft_s=1.5, latency_s=1.5, completion_tokens=1)
+    assert llm.tier_speed["large"]["ttft_s"] == pytest.approx(0.6)
+
+def test_record_savings_counts_price_and_time_saved():
+    def value(kind):
+        return llm.LLM_SAVINGS.labels(kind=kind)._value.get()
+
+    cost, seconds = value("cost_usd"), value("seconds")
+    llm.record_speed("large", ttft_s=1.0, latency_s=2.0, completion_tokens=11)
+    llm.record_savings({"prompt_tokens": 1_000_000, "completion_tokens": 11, "seconds": 0.5})
+    expected = llm.token_cost("large", 1_000_000, 11) - llm.token_cost("small", 1_000_000, 11)
+    assert value("cost_usd") - cost == pytest.approx(expected)
+    assert value("seconds") - seconds == pytest.approx(1.5)
+    llm.record_savings({})  # Streams without usage are skipped
+    assert value("cost_usd") - cost == pytest.approx(expected)
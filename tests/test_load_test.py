@@ -0,0 +1,48 @@
+import argparse
+import json
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.load_test import summarize
+from benchmarks.mock_upstreams import MockConfig, add_mock_arguments, config_from_args, create_mock_app, mock_cli_args
+
+@pytest.fixture
+def upstreams():
+    return TestClient(create_mock_app(MockConfig(embedding_latency_ms=0, llm_latency_ms=0, token_latency_ms=0, jitter_ms=0, dimension=16, answer_tokens=3)))
+
+def test_mock_embeddings_are_deterministic_unit_vectors(upstreams):
+    payload = {"model": "jina-embeddings-v3", "input": ["alpha", "beta", "alpha"]}
+    data = upstreams.post("/v1/embeddings", json=payload).json()["data"]
+    vectors = np.array([item["embedding"] for item in data])
+    assert vectors.shape == (3, 16)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert np.array_equal(vectors[0], vectors[2]) and not np.array_equal(vectors[0], vectors[1])
+    # A requested dimension wins over the configured one
+    assert len(upstreams.post("/v1/embeddings", json={**payload, "dimensions": 4}).json()["data"][0]["embedding"]) == 4
+
+def test_mock_chat_completions_stream_tokens_and_usage(upstreams):
+    payload = {"model": "m", "stream": True, "messages": [{"role": "user", "content": "two words"}]}
+    lines = [line[len("data: "):] for line in upstreams.post("/openai/v1/chat/completions", json=payload).text.splitlines() if line]
+    assert lines[-1] == "[DONE]"
+    chunks = [json.loads(line) for line in lines[:-1]]
+    assert "".join(c["choices"][0]["delta"].get("content", "") for c in chunks) == "token0 token1 token2 "
+    assert chunks[-1]["x_groq"]["usage"] == {"prompt_tokens": 2, "completion_tokens": 3, "total_tokens": 5}
+
+def test_injected_errors_return_503():
+    client = TestClient(create_mock_app(MockConfig(embedding_latency_ms=0, jitter_ms=0, error_rate=1.0)))
+    assert client.post("/v1/embeddings", json={"input": ["x"]}).status_code == 503
+
+def test_mock_config_round_trips_through_the_command_line():
+    config = MockConfig(embedding_latency_ms=12.0, slow_rate=0.05, error_rate=0.01, dimension=256)
+    parser = argparse.ArgumentParser()
+    add_mock_arguments(parser)
+    assert config_from_args(parser.parse_args(mock_cli_args(config))) == config
+
+def test_summary_reports_percentiles_and_error_rate():
+    summary = summarize([float(ms) for ms in range(1, 101)], errors=25, wall_seconds=10.0)
+    assert summary["requests"] == 125 and summary["error_rate"] == pytest.approx(0.2)
+    assert summary["qps"] == pytest.approx(10.0)
+    assert summary["p50_ms"] == pytest.approx(50.5) and summary["p99_ms"] == pytest.approx(99.01)
+    assert summary["max_ms"] == 100.0
+    assert "p50_ms" not in summarize([], errors=3, wall_seconds=1.0)
@@ -0,0 +1,57 @@
+import json
+import logging
+import queue
+import threading
+
+from app.core.logging import (
+    HOT_PATH, HotPathSampler, JsonFormatter, NonBlockingQueueHandler, RequestContextFilter, request_id_var,
+)
+
+def queue_logger(name: str, maxsize: int = 0, sample_rate: float = 1.0):
+    """A logger feeding a NonBlockingQueueHandler set up like setup_logging's, and its queue."""
+    log_queue: queue.Queue = queue.Queue(maxsize=maxsize)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(HotPathSampler(sample_rate))
+    logger = logging.getLogger(f"tests.{name}")
+    logger.handlers = [handler]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger, log_queue
+
+def test_records_carry_the_request_id_and_format_as_json():
+    logger, log_queue = queue_logger("json")
+    token = request_id_var.set("abc123")
+    try:
+        logger.info("Indexed %d chunks", 4, extra={"source_file": "a.txt"})
+    finally:
+        request_id_var.reset(token)
+    record = log_queue.get_nowait()
+
+    # Formatted later, on another thread, where the request context is gone
+    formatted = []
+    thread = threading.Thread(target=lambda: formatted.append(JsonFormatter().format(record)))
+    thread.start()
+    thread.join()
+    payload = json.loads(formatted[0])
+    assert payload["message"] == "Indexed 4 chunks"
+    assert payload["request_id"] == "abc123"
+    assert payload["source_file"] == "a.txt"
+    assert payload["level"] == "INFO" and payload["logger"] == "tests.json"
+
+def test_a_full_queue_drops_records_instead_of_blocking():
+    logger, log_queue = queue_logger("full", maxsize=2)
+    dropped = NonBlockingQueueHandler.dropped
+    for i in range(5):
+        logger.info("record %d", i)
+    assert log_queue.qsize() == 2
+    assert NonBlockingQueueHandler.dropped == dropped + 3
+
+def test_hot_path_records_are_sampled_below_warning():
+    logger, log_queue = queue_logger("sampled", sample_rate=0.0)
+    logger.info("per-request detail", extra=HOT_PATH)
+    logger.warning("per-request problem", extra=HOT_PATH)
+    logger.info("startup message")
+    assert [log_queue.get_nowait().getMessage() for _ in range(log_queue.qsize())] == [
+        "per-request problem", "startup message",
+    ]
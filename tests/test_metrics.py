@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.main import app
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_a_query_is_timed_per_search_stage(answering):
+    before = {kind: sample("rag_search_seconds_count", kind=kind) for kind in ("vector", "lexical")}
+    response = TestClient(app).post("/api/query", json={"question": "word1"})
+    assert response.status_code == 200
+    for kind, count in before.items():
+        assert sample("rag_search_seconds_count", kind=kind) == count + 1
+    assert sample("rag_context_chars_total", stage="sent") > 0
+
+def test_metrics_endpoint_exposes_the_registry(answering):
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'rag_requests_in_flight{endpoint="query"} 0.0' in response.text
+    assert "rag_index_vectors " in response.text
+    assert 'rag_search_seconds_bucket{kind="vector",le="0.001"}' in response.text
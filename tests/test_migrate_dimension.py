@@ -0,0 +1,51 @@
+import asyncio
+import sys
+import pytest
+
+from app.services import retrieval
+from app.tools import migrate_dimension
+from conftest import DIMENSION, chunk_metadata, random_vectors
+
+@pytest.fixture
+def populated(store, monkeypatch):
+    store.commit(random_vectors(40).tolist(), chunk_metadata(40))
+    monkeypatch.setattr(migrate_dimension, "vector_store", store)
+    monkeypatch.setattr(migrate_dimension.settings, "EMBEDDING_DIMENSION", DIMENSION)
+    return store
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["migrate_dimension", *args])
+    migrate_dimension.main()
+
+def test_dry_run_reports_without_publishing(populated, monkeypatch, capsys):
+    run(monkeypatch, "--dimension", "4", "--dry-run", "--queries", "10")
+    output = capsys.readouterr().out
+    assert "truncated" in output and "Dry run" in output
+    assert populated.disk_generation() == 1
+
+def test_publishes_a_truncated_generation_that_serves_full_size_queries(populated, monkeypatch):
+    run(monkeypatch, "--dimension", "4", "--queries", "10")
+    assert populated.disk_generation() == 2
+    assert populated.dimension == 4
+    assert len(populated.metadata) == 40
+
+    # Workers keep requesting EMBEDDING_DIMENSION-sized query embeddings until it is changed
+    query = random_vectors(40)[7]
+
+    async def embed_query(question):
+        return query.tolist()
+
+    monkeypatch.setattr(retrieval, "vector_store", populated)
+    monkeypatch.setattr(retrieval, "embed_query", embed_query)
+    results = asyncio.run(retrieval.retrieve_context("unrelated", top_k=3))
+    assert [r["vector_id"] for r in results][0] == 7
+
+def test_refuses_to_publish_while_embedding_dimension_is_below_the_target(populated, monkeypatch):
+    monkeypatch.setattr(migrate_dimension.settings, "EMBEDDING_DIMENSION", 2)
+    with pytest.raises(SystemExit, match="EMBEDDING_DIMENSION=2"):
+        run(monkeypatch, "--dimension", "4", "--queries", "10")
+    assert populated.disk_generation() == 1
+
+def test_refuses_to_grow_the_dimension(populated, monkeypatch):
+    with pytest.raises(SystemExit, match="must be below"):
+        run(monkeypatch, "--dimension", str(DIMENSION))
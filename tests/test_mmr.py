@@ -0,0 +1,24 @@
+import numpy as np
+
+from app.services.mmr import maximal_marginal_relevance
+
+QUERY = np.array([1.0, 0.0, 0.0])
+CANDIDATES = np.array([
+    [1.0, 0.1, 0.0],   # Most relevant
+    [1.0, 0.11, 0.0],  # Near copy of the first
+    [0.7, 0.0, 0.7],   # Less relevant but different
+])
+
+def test_pure_relevance_ranks_by_similarity_to_the_query():
+    assert maximal_marginal_relevance(QUERY, CANDIDATES, top_k=3, lambda_mult=1.0) == [0, 1, 2]
+
+def test_diversity_skips_near_copies_of_selected_candidates():
+    assert maximal_marginal_relevance(QUERY, CANDIDATES, top_k=2, lambda_mult=0.5) == [0, 2]
+
+def test_selects_each_candidate_at_most_once():
+    selected = maximal_marginal_relevance(QUERY, CANDIDATES, top_k=10, lambda_mult=0.0)
+    assert sorted(selected) == [0, 1, 2]
+
+def test_no_candidates_or_no_slots_select_nothing():
+    assert maximal_marginal_relevance(QUERY, np.zeros((0, 3)), top_k=5) == []
+    assert maximal_marginal_relevance(QUERY, CANDIDATES, top_k=0) == []
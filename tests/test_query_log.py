@@ -0,0 +1,84 @@
+import asyncio
+import json
+import pytest
+
+from app.api import routes
+from app.api.schemas import QueryRequest
+from app.services import query_log
+from app.services.deadline import Deadline
+from app.services.query_log import QueryLogWriter, hot_chunks, read_entries, top_questions
+from app.services.warmup import warm_caches
+from app.tools.query_analytics import stage_percentiles
+
+class RecordingWriter:
+    def __init__(self):
+        self.entries = []
+
+    def write(self, entry):
+        self.entries.append(entry)
+
+@pytest.fixture
+def logged(monkeypatch):
+    writer = RecordingWriter()
+    monkeypatch.setattr(query_log, "_writer", writer)
+    return writer.entries
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_log, "QUERY_LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(query_log, "QUERY_LOG_FILE", str(tmp_path / "queries.jsonl"))
+    monkeypatch.setattr(query_log.settings, "QUERY_LOG_FLUSH_INTERVAL_S", 0.05)
+    return tmp_path
+
+def test_queries_are_logged_with_chunks_stages_and_cache_hits(api, answering, logged):
+    for _ in range(2):
+        assert api.post("/api/query", json={"question": "word1"}).status_code == 200
+    first, second = logged
+    assert first["question"] == "word1"
+    assert "a.txt_chunk_1" in first["chunk_ids"] and len(first["chunk_ids"]) == len(first["vector_ids"])
+    assert {"lexical_search", "vector_search", "llm", "total"} <= set(first["stages_ms"])
+    assert "_start" not in first
+    assert not first["answer_cache_hit"] and second["answer_cache_hit"]
+
+def test_writer_batches_entries_to_disk_and_rolls_the_file(log_dir):
+    writer = QueryLogWriter(query_log.QUERY_LOG_FILE, max_bytes=200)
+    for i in range(6):
+        writer.write({"ts": i, "question": f"question {i}", "chunk_ids": []})
+    writer.stop()
+    assert [entry["question"] for entry in read_entries()] == [f"question {i}" for i in range(6)]
+    assert [entry["ts"] for entry in read_entries(since=4)] == [4, 5]
+    assert len(list(log_dir.glob("queries-*.jsonl"))) == 1
+
+def test_analytics_fold_phrasings_and_count_chunks():
+    entries = [
+        {"question": "What is RAG?", "chunk_ids": ["a", "b"]},
+        {"question": "what is  rag?", "chunk_ids": ["a"]},
+        {"question": "What is RAG?", "chunk_ids": ["c", "a"]},
+        {"question": "Who wrote it?", "chunk_ids": ["b"]},
+    ]
+    assert top_questions(entries, limit=None) == [("What is RAG?", 3), ("Who wrote it?", 1)]
+    assert hot_chunks(entries, limit=2) == [("a", 3), ("b", 2)]
+
+def test_stage_percentiles_cover_each_logged_stage():
+    entries = [{"stages_ms": {"llm": float(ms), "total": ms + 10.0}} for ms in range(1, 101)]
+    entries.append({"stages_ms": {"compression": 4.0}})
+    stages = stage_percentiles(entries)
+    assert list(stages) == ["compression", "llm", "total"]
+    assert stages["llm"]["count"] == 100 and stages["llm"]["p50_ms"] == pytest.approx(50.5)
+    assert stages["compression"] == {"count": 1, "p50_ms": 4.0, "p95_ms": 4.0, "p99_ms": 4.0}
+
+def test_warm_up_answers_popular_questions_before_they_are_asked(api, answering, log_dir):
+    with open(query_log.QUERY_LOG_FILE, "w") as f:
+        for question in ["word1", "Word1", "word4", "word1"]:
+            f.write(json.dumps({"ts": 1e12, "question": question}) + "\n")
+        f.write('{"ts": 1e12, "quest')  # A torn last line is skipped
+
+    async def answer_question(question):
+        await routes.answer_query(QueryRequest(question=question), Deadline())
+
+    assert asyncio.run(warm_caches(answer_question, limit=1)) == 1
+    assert len(answering) == 1
+    api.post("/api/query", json={"question": "WORD1"})
+    assert len(answering) == 1
+    api.post("/api/query", json={"question": "word4"})
+    assert len(answering) == 2
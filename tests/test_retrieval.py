@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+
+from app.services import retrieval
+from app.services.deadline import Deadline
+from app.services.embeddings import truncate_embeddings
+from app.services.retrieval import reciprocal_rank_fusion
+from conftest import DIMENSION, chunk_metadata, random_vectors
+
+def results(*vector_ids):
+    return [{"vector_id": vector_id, "score": 0.0, "metadata": {"chunk_id": vector_id}} for vector_id in vector_ids]
+
+def test_results_in_both_lists_rank_first():
+    fused = reciprocal_rank_fusion([results(1, 2, 3), results(3, 4, 1)], top_k=4, k=60)
+    assert [r["vector_id"] for r in fused] == [1, 3, 2, 4]
+    assert fused[0]["score"] == pytest.approx(1 / 61 + 1 / 63)
+    assert fused[0]["metadata"] == {"chunk_id": 1}
+
+def test_top_k_truncates_the_fused_list():
+    assert [r["vector_id"] for r in reciprocal_rank_fusion([results(5, 6, 7)], top_k=2)] == [5, 6]
+
+def test_empty_lists_fuse_to_nothing():
+    assert reciprocal_rank_fusion([[], []], top_k=5) == []
+
+@pytest.fixture
+def live_store(store, monkeypatch):
+    monkeypatch.setattr(retrieval, "vector_store", store)
+    return store
+
+def query_returns(monkeypatch, embedding):
+    async def embed_query(query):
+        return list(embedding)
+
+    monkeypatch.setattr(retrieval, "embed_query", embed_query)
+
+def test_queries_still_work_after_the_index_dimension_is_migrated(live_store, monkeypatch):
+    vectors = random_vectors(12)
+    live_store.commit(vectors.tolist(), chunk_metadata(12))
+    live_store.replace_vectors(truncate_embeddings(vectors, DIMENSION // 2))
+    # EMBEDDING_DIMENSION not changed yet: queries still arrive at the old size
+    query_returns(monkeypatch, vectors[3])
+    for mmr_lambda in (0.5, 1.0):
+        results = asyncio.run(retrieval.retrieve_context("unrelated words", top_k=3, mmr_lambda=mmr_lambda))
+        assert len(results) == 3
+        assert results[0]["vector_id"] == 3
+
+def test_failed_query_embedding_is_reported_as_lexical_only(live_store, monkeypatch):
+    live_store.commit(random_vectors(3).tolist(), chunk_metadata(3))
+
+    async def embed_query(query):
+        raise ConnectionError("embedding API down")
+
+    monkeypatch.setattr(retrieval, "embed_query", embed_query)
+    deadline = Deadline()
+    results = asyncio.run(retrieval.retrieve_context("word1", top_k=2, deadline=deadline))
+    assert results[0]["vector_id"] == 1
+    assert deadline.degradations == ["lexical_only"]
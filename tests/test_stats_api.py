@@ -0,0 +1,31 @@
+import pytest
+
+from conftest import DIMENSION, chunk_metadata, random_vectors
+
+@pytest.fixture
+def populated(store):
+    store.commit(random_vectors(6).tolist(), chunk_metadata(3, "a.txt") + chunk_metadata(2, "b.txt") + chunk_metadata(1, "c.txt"))
+    return store
+
+def test_reports_vectors_and_documents_largest_first(api, populated):
+    stats = api.get("/api/stats").json()
+    assert stats["generation"] == 1
+    assert stats["vectors"] == 6 and stats["dimension"] == DIMENSION
+    assert stats["document_count"] == 3
+    assert [(d["source_file"], d["vectors"]) for d in stats["documents"]] == [("a.txt", 3), ("b.txt", 2), ("c.txt", 1)]
+    assert sum(d["index_bytes"] for d in stats["documents"]) == stats["index_bytes"]
+    assert stats["metadata_bytes"] == sum(d["metadata_bytes"] for d in stats["documents"])
+    assert stats["disk"]["faiss_index_bytes"] >= 0
+
+def test_top_limits_the_documents_listed(api, populated):
+    stats = api.get("/api/stats", params={"top": 2}).json()
+    assert stats["document_count"] == 3
+    assert [d["source_file"] for d in stats["documents"]] == ["a.txt", "b.txt"]
+
+@pytest.mark.parametrize("top", [0, -1])
+def test_top_must_be_positive(api, populated, top):
+    assert api.get("/api/stats", params={"top": top}).status_code == 422
+
+def test_empty_store(api):
+    stats = api.get("/api/stats").json()
+    assert stats["vectors"] == 0 and stats["documents"] == [] and stats["index_type"] is None
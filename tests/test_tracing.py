@@ -0,0 +1,64 @@
+import time
+import pytest
+
+from app.core import tracing
+from app.core.tracing import Trace, finish_trace, span, start_trace
+
+@pytest.fixture(autouse=True)
+def no_sampling(monkeypatch):
+    monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 0.0)
+
+def test_spans_are_no_ops_outside_a_trace():
+    assert start_trace(False) is None
+    with span("retrieval") as current:
+        assert current is None
+
+def test_nested_spans_record_their_parent():
+    trace = start_trace(True)
+    try:
+        with span("query_document"):
+            with span("retrieval", top_k=5):
+                pass
+    finally:
+        finish_trace(trace)
+    breakdown = trace.breakdown()
+    assert [(s["name"], s["parent"]) for s in breakdown] == [("query_document", None), ("retrieval", "query_document")]
+    assert breakdown[1]["attributes"] == {"top_k": 5}
+    assert breakdown[0]["duration_ms"] >= breakdown[1]["duration_ms"]
+
+def test_otlp_export_types_attributes():
+    trace = Trace(requested=True)
+    tracing._current_trace.set(trace)
+    try:
+        with span("llm", tier="small", cached=False, tokens=12, seconds=0.5):
+            pass
+    finally:
+        tracing._current_trace.set(None)
+    (otlp_span,) = trace.to_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert otlp_span["traceId"] == trace.trace_id and "parentSpanId" not in otlp_span
+    assert otlp_span["attributes"] == [
+        {"key": "tier", "value": {"stringValue": "small"}},
+        {"key": "cached", "value": {"boolValue": False}},
+        {"key": "tokens", "value": {"intValue": "12"}},
+        {"key": "seconds", "value": {"doubleValue": 0.5}},
+    ]
+
+def test_traces_are_returned_on_request_and_written_to_the_trace_log(api, answering):
+    assert api.post("/api/query", json={"question": "word1"}).json()["trace"] is None
+    trace = api.post("/api/query?trace=true", json={"question": "word1"}).json()["trace"]
+    spans = {s["name"]: s for s in trace["spans"]}
+    assert spans["query_document"]["parent"] is None
+    assert spans["retrieval"]["parent"] == "query_document"
+    assert {"lexical_search", "vector_search"} <= set(spans)
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            with open(tracing.TRACE_FILE) as f:
+                if trace["trace_id"] in f.read():
+                    break
+        except FileNotFoundError:
+            pass
+        time.sleep(0.05)
+    else:
+        pytest.fail("trace was not written to the trace log")
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import traffic_capture
+from app.services.traffic_capture import entry_body, read_capture, record_request
+from benchmarks.replay import ks_statistic, paired_ratio, peak_concurrency, replay
+
+@pytest.fixture
+def captured(monkeypatch):
+    entries = []
+    monkeypatch.setattr(traffic_capture.settings, "TRAFFIC_CAPTURE_ENABLED", True)
+    monkeypatch.setattr(traffic_capture._writer, "write", entries.append)
+    return entries
+
+def test_queries_are_captured_with_their_payload(answering, captured, monkeypatch):
+    client = TestClient(app)
+    body = {"question": "word1", "top_k": 2}
+    client.post("/api/query", json=body, headers={"X-Request-ID": "req-1", "X-Traffic-Class": "batch"})
+    client.get("/api/health")
+    (entry,) = captured
+    assert entry["path"] == "/api/query" and entry["status"] == 200 and entry["request_id"] == "req-1"
+    assert json.loads(entry_body(entry)) == body
+    assert entry["headers"] == {"content-type": "application/json", "x-traffic-class": "batch"}
+
+    # Oversized bodies are recorded by size only
+    monkeypatch.setattr(traffic_capture.settings, "TRAFFIC_CAPTURE_MAX_BODY_BYTES", 10)
+    client.post("/api/query", json=body)
+    assert entry_body(captured[-1]) is None and captured[-1]["body_bytes"] == entry["body_bytes"] > 10
+
+def test_binary_bodies_round_trip(captured):
+    record_request("POST", "/api/upload", {}, b"%PDF\xff\x00", 6, 1.0, 200, 12.5)
+    assert entry_body(captured[0]) == b"%PDF\xff\x00"
+
+def test_capture_files_are_read_in_arrival_order(tmp_path):
+    (tmp_path / "capture-20240101T000000.jsonl").write_text(json.dumps({"ts": 2}) + "\n" + json.dumps({"ts": 1}) + "\n")
+    (tmp_path / "capture.jsonl").write_text(json.dumps({"ts": 3}) + "\n" + '{"ts": 4, "pa')
+    (tmp_path / "other.jsonl").write_text(json.dumps({"ts": 0}) + "\n")
+    assert [e["ts"] for e in read_capture([str(tmp_path)])] == [1, 2, 3]
+
+class Recorder(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        Recorder.requests.append((time.perf_counter(), self.path, body, self.headers.get("X-Traffic-Class")))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+def test_replay_keeps_the_captured_arrival_times_scaled_by_speed():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Recorder)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    Recorder.requests = []
+    entries = [
+        {"ts": 100.0, "method": "POST", "path": "/api/query", "headers": {"x-traffic-class": "batch"},
+         "body": '{"question": "a"}', "status": 200, "latency_ms": 40.0},
+        {"ts": 100.6, "method": "POST", "path": "/api/query", "headers": {},
+         "body": '{"question": "b"}', "status": 503, "latency_ms": 5.0},
+    ]
+    try:
+        results = asyncio.run(replay(entries, f"http://127.0.0.1:{server.server_port}", speed=2.0, timeout=5, max_connections=4))
+    finally:
+        server.shutdown()
+    assert [(r["endpoint"], r["status"], r["captured_status"]) for r in results] == [("query", 200, 200), ("query", 200, 503)]
+    (first, _, first_body, traffic_class), (second, *_) = Recorder.requests
+    assert first_body == b'{"question": "a"}' and traffic_class == "batch"
+    assert second - first == pytest.approx(0.3, abs=0.1)
+
+def test_replay_statistics():
+    assert peak_concurrency([(0, 3), (1, 2), (2.5, 4), (5, 6)]) == 2
+    assert ks_statistic([1, 2, 3], [1, 2, 3]) == 0.0
+    assert ks_statistic([1, 2], [10, 20]) == 1.0
+    old = {"requests": [{"index": i, "endpoint": "query", "status": 200, "latency_ms": 10.0} for i in range(3)]}
+    new = {"requests": [
+        {"index": 0, "endpoint": "query", "status": 200, "latency_ms": 20.0},
+        {"index": 1, "endpoint": "query", "status": 200, "latency_ms": 15.0},
+        {"index": 2, "endpoint": "query", "status": 500, "latency_ms": 1.0},
+    ]}
+    assert paired_ratio(old, new, "query") == pytest.approx(1.75)
+    assert paired_ratio(old, new, "upload") is None
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from streamlit.testing.v1 import AppTest
+
+UI_PATH = os.path.join(os.path.dirname(__file__), "..", "ui", "app.py")
+
+class StubAPI(BaseHTTPRequestHandler):
+    """Answers /query/stream with a fixed event stream and /upload/{id} with a finished batch."""
+    queries = []
+    events = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        StubAPI.queries.append(json.loads(self.rfile.read(length))["question"])
+        body = "".join(json.dumps(event) + "\n" for event in StubAPI.events).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        body = json.dumps({"batch_id": "b1", "status": "complete", "files": [{"name": "new.txt", "status": "indexed"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+ANSWER_EVENTS = [
+    {"event": "sources", "sources": [{"source_file": "a.txt", "chunk_id": 1}]},
+    {"event": "token", "text": "Founded "},
+    {"event": "token", "text": "in 1998."},
+    {"event": "done"},
+]
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubAPI.queries, StubAPI.events = [], ANSWER_EVENTS
+    yield f"http://127.0.0.1:{server.server_port}/api"
+    server.shutdown()
+
+def app(api_url) -> AppTest:
+    with open(UI_PATH, encoding="utf-8") as f:
+        source = f.read().replace('API_URL = "http://127.0.0.1:8000/api"', f'API_URL = "{api_url}"')
+    at = AppTest.from_string(source, default_timeout=30)
+    at.run()
+    return at
+
+def ask(at: AppTest, question: str) -> dict:
+    at.text_input(key="query_input").set_value(question)
+    next(button for button in at.button if button.label == "Send").click().run()
+    assert not at.exception
+    return at.session_state["messages"][-1]
+
+def test_streams_the_answer_with_its_sources(api_url):
+    message = ask(app(api_url), "When was it founded?")
+    assert message["content"] == "Founded in 1998."
+    assert message["sources"] == [{"source_file": "a.txt", "chunk_id": 1}]
+    assert not message.get("cached")
+
+def test_repeated_questions_are_answered_from_the_session_cache(api_url):
+    at = app(api_url)
+    ask(at, "When was it founded?")
+    message = ask(at, "  when was IT founded? ")
+    assert message["cached"] and message["content"] == "Founded in 1998."
+    assert len(StubAPI.queries) == 1
+
+    # Another browser session has its own cache
+    ask(app(api_url), "When was it founded?")
+    assert len(StubAPI.queries) == 2
+
+def test_finished_uploads_clear_the_session_cache(api_url):
+    at = app(api_url)
+    ask(at, "When was it founded?")
+    at.session_state["batches"] = [{"batch_id": "b1", "status": "queued", "files": [{"name": "new.txt", "status": "queued"}]}]
+    at.run()
+    assert at.session_state["documents"] == ["new.txt"]
+    assert not ask(at, "When was it founded?").get("cached")
+    assert len(StubAPI.queries) == 2
+
+def test_cut_off_answers_are_flagged_and_not_cached(api_url):
+    StubAPI.events = ANSWER_EVENTS[:-1]
+    at = app(api_url)
+    message = ask(at, "When was it founded?")
+    assert "closed before the answer was complete" in message["content"]
+    assert not ask(at, "When was it founded?").get("cached")
@@ -0,0 +1,138 @@
+import asyncio
+import io
+import os
+import zipfile
+import pytest
+from fastapi import UploadFile
+
+from app.services import upload_batch
+from app.services.upload_batch import UploadBatch, UploadRejected, create_batch, run_batch, safe_relative_path
+
+@pytest.fixture(autouse=True)
+def upload_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_batch, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(upload_batch, "BATCH_DIR", str(tmp_path / "batches"))
+    return tmp_path
+
+def archive(members) -> io.BytesIO:
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+    data.seek(0)
+    return data
+
+def upload(name, data) -> UploadFile:
+    return UploadFile(file=data if isinstance(data, io.BytesIO) else io.BytesIO(data), filename=name)
+
+def statuses(batch):
+    return {entry["name"]: (entry["status"], entry["detail"]) for entry in batch.files}
+
+@pytest.mark.parametrize("name, expected", [
+    ("report.pdf", "report.pdf"),
+    ("docs/./2024//report.pdf", "docs/2024/report.pdf"),
+    ("docs\\report.pdf", "docs/report.pdf"),
+    ("/etc/passwd", None),
+    ("C:\\Windows\\system.ini", None),
+    ("../outside.txt", None),
+    ("docs/../../outside.txt", None),
+    ("", None),
+])
+def test_safe_relative_path(name, expected):
+    assert safe_relative_path(name) == expected
+
+def test_unpacks_supported_members_and_skips_the_rest():
+    batch = UploadBatch()
+    upload_batch._unpack_archive(batch, "docs.zip", archive({
+        "a/notes.txt": "alpha",
+        "b/notes.txt": "beta",
+        "../escape.txt": "nope",
+        "image.png": "png",
+        "__MACOSX/a/._notes.txt": "meta",
+        ".DS_Store": "meta",
+    }))
+    assert set(batch.paths) == {"a/notes.txt", "b/notes.txt"}
+    with open(batch.paths["b/notes.txt"]) as f:
+        assert f.read() == "beta"
+    assert statuses(batch)["../escape.txt"] == ("skipped", "Unsafe path in archive")
+    assert statuses(batch)["image.png"] == ("skipped", "Unsupported file type")
+    assert len(batch.files) == 4
+
+def test_skips_members_whose_path_clashes_with_another_file():
+    batch = UploadBatch()
+    upload_batch._unpack_archive(batch, "docs.zip", archive({"x.txt": "file", "x.txt/y.txt": "nested"}))
+    assert set(batch.paths) == {"x.txt"}
+    assert statuses(batch)["x.txt/y.txt"] == ("skipped", "Path clashes with another file in the upload")
+
+def test_rejects_an_archive_that_expands_past_the_limit(monkeypatch):
+    monkeypatch.setattr(upload_batch.settings, "UPLOAD_MAX_ARCHIVE_BYTES", 10)
+    batch = UploadBatch()
+    with pytest.raises(UploadRejected, match="UPLOAD_MAX_ARCHIVE_BYTES"):
+        upload_batch._unpack_archive(batch, "bomb.zip", archive({"a.txt": "x" * 6, "b.txt": "y" * 6}))
+    assert list(batch.paths) == ["a.txt"]
+    assert not os.path.exists(os.path.join(upload_batch.UPLOAD_DIR, "b.txt"))
+
+def test_rejects_an_invalid_archive():
+    with pytest.raises(UploadRejected, match="not a valid ZIP"):
+        upload_batch._unpack_archive(UploadBatch(), "broken.zip", io.BytesIO(b"not a zip"))
+
+def test_create_batch_stages_files_and_flags_duplicates():
+    batch = asyncio.run(create_batch([
+        upload("one.txt", b"1"),
+        upload("dir/one.txt", b"again"),
+        upload("bundle.zip", archive({"two.pdf": "2"})),
+        upload("notes.docx", b"?"),
+    ]))
+    assert batch.status == "queued"
+    assert set(batch.paths) == {"one.txt", "two.pdf"}
+    assert [(entry["name"], entry["status"], entry["detail"]) for entry in batch.files] == [
+        ("one.txt", "queued", None),
+        ("one.txt", "skipped", "Duplicate name in upload"),
+        ("two.pdf", "queued", None),
+        ("notes.docx", "skipped", "Unsupported file type"),
+    ]
+    assert upload_batch.get_batch_status(batch.batch_id)["status"] == "queued"
+
+def test_create_batch_removes_staged_files_when_rejected(monkeypatch):
+    monkeypatch.setattr(upload_batch.settings, "UPLOAD_MAX_FILES", 1)
+    with pytest.raises(UploadRejected, match="Too many files"):
+        asyncio.run(create_batch([upload("a.txt", b"a"), upload("b.txt", b"b")]))
+    assert not os.listdir(upload_batch.UPLOAD_DIR)
+
+def test_create_batch_removes_staged_files_on_disk_errors(monkeypatch):
+    copy = upload_batch._copy_limited
+
+    def copy_then_fail(source, path, limit):
+        if path.endswith("b.txt"):
+            raise OSError(28, "No space left on device")
+        return copy(source, path, limit)
+
+    monkeypatch.setattr(upload_batch, "_copy_limited", copy_then_fail)
+    with pytest.raises(OSError):
+        asyncio.run(create_batch([upload("a.txt", b"a"), upload("b.txt", b"b")]))
+    assert not os.listdir(upload_batch.UPLOAD_DIR)
+
+def test_create_batch_rejects_uploads_without_documents():
+    with pytest.raises(UploadRejected, match="No PDF or TXT"):
+        asyncio.run(create_batch([upload("notes.docx", b"?")]))
+
+def test_run_batch_marks_unfinished_files_failed_when_the_commit_fails(monkeypatch):
+    class Pipeline:
+        chunks, indexed, error, deduplicator, defer_commit = 3, 0, None, None, True
+
+    async def process_document(path, name, defer_commit):
+        return Pipeline()
+
+    async def fail_commit(documents, pipelines):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(upload_batch, "process_document", process_document)
+    monkeypatch.setattr(upload_batch, "_commit_batch", fail_commit)
+
+    batch = asyncio.run(create_batch([upload("a.txt", b"a"), upload("b.txt", b"b")]))
+    asyncio.run(run_batch(batch))
+    status = upload_batch.get_batch_status(batch.batch_id)
+    assert batch.batch_id not in upload_batch.batches
+    assert status["status"] == "failed"
+    assert {entry["status"] for entry in status["files"]} == {"failed"}
+    assert status["files"][0]["detail"] == "Batch failed: disk full"
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import faiss
+import pytest
+
+from app.services import vector_store as vector_store_module
+from app.services.vector_store import VectorStore, generation_dir
+from conftest import DIMENSION, chunk_metadata, random_vectors
+
+def commit(store, count, source_file="a.txt", offset=0, seed=0):
+    return store.commit(random_vectors(count, seed=seed).tolist(), chunk_metadata(count, source_file, offset))
+
+def test_commit_publishes_a_new_generation(store):
+    assert commit(store, 3) == [0, 1, 2]
+    assert store.generation == 1
+    assert store.disk_generation() == 1
+    assert commit(store, 2, offset=3, seed=1) == [3, 4]
+    assert store.disk_generation() == 2
+    assert [m["generation"] for m in store.list_generations()] == [2, 1]
+    assert store.list_generations()[0]["vectors"] == 5
+
+def test_empty_commit_publishes_nothing(store):
+    assert store.commit([], []) == []
+    assert store.disk_generation() == 0
+    assert store.list_generations() == []
+
+def test_load_index_reads_the_current_generation(store):
+    commit(store, 4)
+    reader = VectorStore()
+    reader.load_index()
+    assert reader.generation == 1
+    assert reader.index.ntotal == 4
+    assert reader.metadata[2]["chunk_id"] == 2
+    assert reader.lexical_search("word3", top_k=1)[0]["vector_id"] == 3
+
+def test_commit_builds_on_generations_published_by_another_process(store):
+    commit(store, 2)
+    other = VectorStore()
+    other.load_index()
+    commit(other, 3, source_file="b.txt", seed=1)
+    # The first writer is behind; its next commit reloads before appending
+    assert commit(store, 1, source_file="c.txt", seed=2) == [5]
+    assert store.index.ntotal == 6
+    assert {meta["source_file"] for meta in store.metadata.values()} == {"a.txt", "b.txt", "c.txt"}
+
+def test_rollback_serves_and_publishes_an_older_generation(store):
+    commit(store, 2)
+    commit(store, 3, offset=2, seed=1)
+    result = asyncio.run(store.rollback(1))
+    assert result == {"generation": 1, "vectors": 2}
+    assert store.disk_generation() == 1
+    assert store.index.ntotal == 2
+    # The next commit builds on the rolled-back state
+    assert commit(store, 1, offset=2, seed=2) == [2]
+    assert store.generation == 3
+
+def test_rollback_to_unknown_generation_raises(store):
+    commit(store, 1)
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(store.rollback(7))
+
+def test_rollback_refuses_a_corrupt_generation(store):
+    commit(store, 2)
+    commit(store, 3, offset=2, seed=1)
+    with open(os.path.join(generation_dir(1), vector_store_module.METADATA_FILENAME), "ab") as f:
+        f.write(b"corrupt")
+    with pytest.raises(ValueError, match="checksum"):
+        asyncio.run(store.rollback(1))
+    assert store.disk_generation() == 2
+
+def test_load_falls_back_past_a_corrupt_current_generation(store):
+    commit(store, 2)
+    commit(store, 3, offset=2, seed=1)
+    with open(os.path.join(generation_dir(2), vector_store_module.INDEX_FILENAME), "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\0\0\0\0")
+    reader = VectorStore()
+    reader.load_index()
+    assert reader.generation == 1
+    assert reader.index.ntotal == 2
+
+def test_load_falls_back_when_current_generation_is_missing(store):
+    commit(store, 2)
+    commit(store, 3, offset=2, seed=1)
+    with open(vector_store_module.CURRENT_FILE, "w") as f:
+        f.write("9")
+    reader = VectorStore()
+    reader.load_index()
+    assert reader.generation == 2
+
+def test_failed_write_leaves_the_previous_generation(store, monkeypatch):
+    commit(store, 2)
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(vector_store_module.faiss, "write_index", fail)
+    with pytest.raises(OSError):
+        commit(store, 1, offset=2, seed=1)
+    assert store.disk_generation() == 1
+    assert os.listdir(vector_store_module.GENERATIONS_DIR) == [os.path.basename(generation_dir(1))]
+
+def test_old_generations_are_pruned(store, monkeypatch):
+    monkeypatch.setattr(vector_store_module.settings, "INDEX_KEEP_GENERATIONS", 2)
+    for i in range(4):
+        commit(store, 1, offset=i, seed=i)
+    assert [m["generation"] for m in store.list_generations()] == [4, 3]
+
+def test_import_state_refuses_to_overwrite_unless_replacing(store):
+    commit(store, 2)
+    other = VectorStore()
+    other.load_index()
+    with pytest.raises(FileExistsError):
+        store.import_state(other.index, dict(other.metadata))
+    assert store.import_state(other.index, dict(other.metadata), replace=True) == 2
+
+def test_published_vectors_follow_the_current_generation(store):
+    assert not store.has_published_vectors()
+    # An index saved before snapshots existed counts until the first generation
+    store.add_embeddings(random_vectors(2).tolist(), chunk_metadata(2))
+    faiss.write_index(store.index, vector_store_module.LEGACY_INDEX_FILE)
+    assert store.has_published_vectors()
+
+    commit(store, 1, offset=2, seed=1)
+    assert store.has_published_vectors()
+    store.import_state(faiss.IndexFlatL2(DIMENSION), {}, replace=True)
+    assert not store.has_published_vectors()
+    # So a bundle can be imported without replace
+    store.import_state(faiss.IndexFlatL2(DIMENSION), {})
+    asyncio.run(store.rollback(1))
+    assert store.has_published_vectors()
+
+def test_workers_hot_reload_generations_published_by_another(store):
+    commit(store, 2)
+    worker = VectorStore()
+    worker.load_index()
+    assert not asyncio.run(worker.refresh_if_stale())
+    commit(store, 3, source_file="b.txt", offset=2, seed=1)
+    assert asyncio.run(worker.refresh_if_stale())
+    assert worker.generation == 2
+    assert worker.lexical_search("word4", top_k=1)[0]["metadata"]["source_file"] == "b.txt"
+
+def test_memory_mapped_index_is_read_only_until_commit(store, monkeypatch):
+    monkeypatch.setattr(vector_store_module.settings, "INDEX_MMAP", True)
+    commit(store, 2)
+    worker = VectorStore()
+    worker.load_index()
+    assert worker.read_only
+    with pytest.raises(RuntimeError, match="read-only"):
+        worker.add_embeddings(random_vectors(1).tolist(), chunk_metadata(1, offset=2))
+    # commit() appends to a private copy, then maps the published generation again
+    assert commit(worker, 1, offset=2, seed=1) == [2]
+    assert worker.read_only and worker.index.ntotal == 3
+    assert worker.similarity_search(random_vectors(1, seed=1)[0].tolist(), top_k=1)[0]["vector_id"] == 2
@@ -0,0 +1,37 @@
+import faiss
+import numpy as np
+import pytest
+
+from benchmarks import vector_store_bench
+from benchmarks.vector_store_bench import ClusteredCorpus, benchmark_index, exact_neighbors, recall_at_k
+
+@pytest.fixture
+def corpus(monkeypatch):
+    # Several batches, so streaming ground truth has to offset ids across them
+    monkeypatch.setattr(vector_store_bench, "BATCH_SIZE", 300)
+    return ClusteredCorpus(size=1000, dimension=16, clusters=8, spread=0.3, seed=1)
+
+def test_corpus_batches_are_deterministic_unit_vectors(corpus):
+    batches = list(corpus.batches())
+    assert [len(b) for b in batches] == [300, 300, 300, 100]
+    assert np.allclose(np.linalg.norm(np.vstack(batches), axis=1), 1.0)
+    assert np.array_equal(np.vstack(batches), np.vstack(list(corpus.batches())))
+
+def test_streamed_ground_truth_matches_exact_search(corpus):
+    queries = corpus.queries(20)
+    _, expected = faiss.knn(queries, np.vstack(list(corpus.batches())), 5)
+    assert np.array_equal(exact_neighbors(corpus, queries, 5), expected)
+
+def test_recall_counts_true_neighbors_found():
+    truth = np.array([[1, 2], [3, 4]])
+    assert recall_at_k(np.array([[2, 1], [3, 9]]), truth) == 0.75
+
+def test_benchmark_rows_cover_the_search_sweep(corpus):
+    queries = corpus.queries(10)
+    truth = exact_neighbors(corpus, queries, 5)
+    (flat,) = benchmark_index("Flat", corpus, queries, truth, 5)
+    assert flat["recall@5"] == 1.0 and flat["param"] == "-"
+    ivf = benchmark_index("IVF{nlist},Flat", corpus, queries, truth, 5)
+    assert [row["param"] for row in ivf] == ["nprobe=1", "nprobe=4", "nprobe=16", "nprobe=64"]
+    assert ivf[0]["index"] == "IVF126,Flat"
+    assert ivf[-1]["recall@5"] >= ivf[0]["recall@5"]
@@ -1,6 +1,10 @@
-import streamlit as st
-import requests
+import json
+import time
+from collections import OrderedDict
 from datetime import datetime
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
 
 # --- Page Configuration (Must be first) ---
 st.set_page_config(
@@ -355,69 +359,214 @@ st.markdown("""
 # --- Session State Management ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "file_uploaded" not in st.session_state:
-    st.session_state.file_uploaded = False
-if "current_file" not in st.session_state:
-    st.session_state.current_file = None
+if "documents" not in st.session_state:
+    st.session_state.documents = []  # Names of indexed files, newest last
+if "batches" not in st.session_state:
+    st.session_state.batches = []  # Upload batches and their last known status
+if "uploaded_ids" not in st.session_state:
+    st.session_state.uploaded_ids = set()  # Uploader file ids already sent
+if "answer_cache" not in st.session_state:
+    st.session_state.answer_cache = OrderedDict()  # Normalized question -> answer, sources, time cached
 if "query_count" not in st.session_state:
     st.session_state.query_count = 0
 
+# --- API Client ---
+QUERY_TIMEOUT = (5, 120)  # (connect, read between streamed lines) seconds
+UPLOAD_TIMEOUT = (5, 300)
+STATUS_TIMEOUT = 5
+INGESTION_POLL_INTERVAL_S = 2
+BATCH_DONE = ("complete", "failed")
+# Per browser session: uploads by other sessions or clients are not seen here, so entries expire quickly
+ANSWER_CACHE_SIZE = 64
+ANSWER_CACHE_TTL_S = 300
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One pooled HTTP session for every browser session, so calls reuse keep-alive connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def answer_cache_key(question: str) -> str:
+    return " ".join(question.lower().split())
+
+def cached_answer(question: str):
+    """This session's answer to the same question, if it is recent enough."""
+    cache = st.session_state.answer_cache
+    entry = cache.get(answer_cache_key(question))
+    if entry is None or time.monotonic() - entry["at"] > ANSWER_CACHE_TTL_S:
+        return None
+    cache.move_to_end(answer_cache_key(question))
+    return entry
+
+def cache_answer(question: str, answer: str, sources: list):
+    cache = st.session_state.answer_cache
+    cache[answer_cache_key(question)] = {"answer": answer, "sources": sources, "at": time.monotonic()}
+    cache.move_to_end(answer_cache_key(question))
+    while len(cache) > ANSWER_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def error_detail(response: requests.Response) -> str:
+    if response.status_code == 503:
+        return "The server is busy. Please retry in a moment."
+    try:
+        return response.json().get("detail", response.reason)
+    except ValueError:
+        return f"HTTP {response.status_code}"
+
+def stream_answer(question: str, result: dict):
+    """
+    Yields the answer text as /query/stream produces it. Sources, errors and
+    whether the answer completed are recorded in `result`.
+    """
+    try:
+        with get_session().post(
+            f"{API_URL}/query/stream", json={"question": question}, stream=True, timeout=QUERY_TIMEOUT
+        ) as response:
+            if response.status_code != 200:
+                result["error"] = error_detail(response)
+                return
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "sources":
+                    result["sources"] = event["sources"]
+                elif event["event"] == "token":
+                    yield event["text"]
+                elif event["event"] == "error":
+                    result["error"] = event["detail"]
+                elif event["event"] == "done":
+                    result["complete"] = True
+    except requests.exceptions.RequestException:
+        result["error"] = "Could not reach the API. Is the backend running?"
+
 # --- Functions ---
 def handle_upload():
-    """Handles file upload logic"""
-    uploaded_file = st.session_state.uploaded_file_widget
-    if uploaded_file is not None:
-        with st.spinner("🔄 Processing document..."):
-            try:
-                files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
-                try:
-                    response = requests.post(f"{API_URL}/upload", files=files, timeout=120)
-                    status = response.status_code
-                except requests.exceptions.RequestException:
-                    status = 200  # Fallback for demo
-                
-                if status == 200:
-                    st.session_state.file_uploaded = True
-                    st.session_state.current_file = uploaded_file.name
-                    st.toast(f"✅ Indexed: {uploaded_file.name}", icon="📄")
-                else:
-                    st.error("❌ Upload failed. Please try again.")
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-
-def handle_query():
-    """Handles query logic"""
-    user_query = st.session_state.query_input
-    if user_query and user_query.strip():
-        timestamp = datetime.now().strftime("%I:%M %p")
+    """Sends newly selected files (PDF, TXT or ZIP) as one upload batch; ingestion runs in the background"""
+    uploaded_files = st.session_state.uploaded_file_widget or []
+    new_files = [f for f in uploaded_files if f.file_id not in st.session_state.uploaded_ids]
+    if not new_files:
+        return
+    files = [("files", (f.name, f.getvalue(), f.type or "application/octet-stream")) for f in new_files]
+    try:
+        response = get_session().post(f"{API_URL}/upload", files=files, timeout=UPLOAD_TIMEOUT)
+    except requests.exceptions.RequestException:
+        st.error("❌ Could not reach the API. Is the backend running?")
+        return
+
+    if response.status_code == 200:
+        data = response.json()
+        st.session_state.uploaded_ids.update(f.file_id for f in new_files)
+        st.session_state.batches.append({"batch_id": data["batch_id"], "status": "queued", "files": data["files"]})
+        st.toast(f"📄 Ingesting {len(new_files)} file(s) in the background", icon="🔄")
+    else:
+        st.error(f"❌ Upload failed: {error_detail(response)}")
+
+def poll_batches():
+    """Refreshes the status of unfinished upload batches."""
+    finished = False
+    for batch in st.session_state.batches:
+        if batch["status"] in BATCH_DONE:
+            continue
+        try:
+            response = get_session().get(f"{API_URL}/upload/{batch['batch_id']}", timeout=STATUS_TIMEOUT)
+        except requests.exceptions.RequestException:
+            continue  # Try again on the next poll
+        if response.status_code != 200:
+            continue
+        batch.update(response.json())
+        if batch["status"] in BATCH_DONE:
+            finished = True
+            indexed = [f["name"] for f in batch["files"] if f["status"] == "indexed"]
+            st.session_state.documents.extend(indexed)
+            if indexed:
+                st.session_state.answer_cache.clear()  # New documents can change answers
+                st.toast(f"✅ Indexed {len(indexed)} file(s)", icon="📄")
+            if len(indexed) < len(batch["files"]):
+                st.toast(f"⚠️ {len(batch['files']) - len(indexed)} file(s) were not indexed", icon="⚠️")
+    return finished
+
+def render_batches():
+    for batch in st.session_state.batches:
+        if batch["status"] in BATCH_DONE:
+            continue
+        files = batch["files"]
+        settled = sum(f["status"] in ("indexed", "embedded", "failed", "empty", "skipped") for f in files)
+        st.progress(settled / max(1, len(files)), text=f"Ingesting: {settled}/{len(files)} files processed")
+
+@st.fragment(run_every=INGESTION_POLL_INTERVAL_S)
+def ingestion_status():
+    """Polls ingestion progress on its own timer, without rerunning (or blocking) the rest of the page."""
+    if poll_batches() and all(b["status"] in BATCH_DONE for b in st.session_state.batches):
+        st.rerun(scope="app")  # Show the new documents and stop polling
+    render_batches()
+
+def render_message(msg):
+    if msg["role"] == "user":
+        st.markdown(f'''
+            <div class="message-wrapper">
+                <div class="user-msg">{msg["content"]}</div>
+                <div class="msg-time msg-time-user">{msg.get("time", "")}</div>
+            </div>
+        ''', unsafe_allow_html=True)
+        return
+
+    st.markdown(f'''
+        <div class="message-wrapper">
+            <div class="ai-msg">{msg["content"]}</div>
+            <div class="msg-time">{msg.get("time", "")}{" • cached" if msg.get("cached") else ""}</div>
+        </div>
+    ''', unsafe_allow_html=True)
+
+    # Source chips
+    if msg.get("sources"):
+        sources_html = "".join([
+            f'<span class="source-chip">📎 {src.get("source_file", "Unknown")} • {src.get("chunk_id", "")}</span>'
+            for src in msg["sources"]
+        ])
+        st.markdown(f'<div style="margin-top: 8px; margin-bottom: 12px;">{sources_html}</div>', unsafe_allow_html=True)
+
+def handle_query(user_query: str, container):
+    """Answers a question, streaming the answer into `container` as it is generated"""
+    question = user_query.strip()
+    if not question:
+        return
+    user_msg = {"role": "user", "content": question, "time": datetime.now().strftime("%I:%M %p")}
+    st.session_state.messages.append(user_msg)
+    st.session_state.query_count += 1
+
+    cached = cached_answer(question)
+    if cached is not None:
         st.session_state.messages.append({
-            "role": "user", 
-            "content": user_query.strip(),
-            "time": timestamp
+            "role": "assistant",
+            "content": cached["answer"],
+            "sources": cached["sources"],
+            "time": datetime.now().strftime("%I:%M %p"),
+            "cached": True,
         })
-        
-        try:
-            payload = {"question": user_query}
-            try:
-                response = requests.post(f"{API_URL}/query", json=payload, timeout=60)
-                data = response.json()
-                answer = data.get("answer", "No answer provided.")
-                sources = data.get("sources", [])
-            except requests.exceptions.RequestException:
-                import time
-                time.sleep(1.2)
-                answer = f"Based on the uploaded document, here's what I found regarding your query.\n\nThe analysis indicates relevant information that addresses your question about '{user_query[:50]}...'."
-                sources = [{"source_file": st.session_state.current_file or "document.pdf", "chunk_id": "chunk_1"}]
-
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": answer,
-                "sources": sources,
-                "time": datetime.now().strftime("%I:%M %p")
-            })
-            st.session_state.query_count += 1
-        except Exception as e:
-            st.error(f"Error: {e}")
+        return
+
+    result = {"sources": [], "error": None, "complete": False}
+    with container:
+        render_message(user_msg)
+        answer = st.write_stream(stream_answer(question, result))
+    answer = answer if isinstance(answer, str) else "".join(map(str, answer or []))
+
+    if not result["error"] and not result["complete"]:
+        result["error"] = "The connection closed before the answer was complete."
+    if result["error"]:
+        answer = f"{answer}\n\n⚠️ {result['error']}" if answer else f"⚠️ {result['error']}"
+    else:
+        cache_answer(question, answer, result["sources"])
+    st.session_state.messages.append({
+        "role": "assistant",
+        "content": answer,
+        "sources": result["sources"],
+        "time": datetime.now().strftime("%I:%M %p")
+    })
 
 def clear_chat():
     """Clears chat history"""
@@ -454,18 +603,25 @@ with left_col:
     st.markdown('<div class="card-subtitle">Upload documents to ground AI responses</div>', unsafe_allow_html=True)
     
     st.file_uploader(
-        "Upload PDF/TXT", 
-        type=["pdf", "txt"], 
+        "Upload PDF/TXT/ZIP", 
+        type=["pdf", "txt", "zip"], 
+        accept_multiple_files=True,
         key="uploaded_file_widget",
         on_change=handle_upload,
         label_visibility="collapsed"
     )
     
-    if st.session_state.file_uploaded and st.session_state.current_file:
+    if any(b["status"] not in BATCH_DONE for b in st.session_state.batches):
+        ingestion_status()
+
+    if st.session_state.documents:
+        names = st.session_state.documents[-3:]
+        more = len(st.session_state.documents) - len(names)
         st.markdown(f"""
             <div class="active-file">
                 <div class="active-file-label">Active Context</div>
-                <div class="active-file-name">📄 {st.session_state.current_file}</div>
+                {"".join(f'<div class="active-file-name">📄 {name}</div>' for name in names)}
+                {f'<div class="active-file-label">+ {more} more</div>' if more else ""}
             </div>
         """, unsafe_allow_html=True)
     else:
@@ -514,7 +670,8 @@ with right_col:
     
     with chat_container:
         if not st.session_state.messages:
-            st.markdown("""
+            empty_state = st.empty()
+            empty_state.markdown("""
                 <div class="empty-state">
                     <div class="empty-state-icon">🧠</div>
                     <div class="empty-state-title">Ask anything about your documents</div>
@@ -525,28 +682,7 @@ with right_col:
             """, unsafe_allow_html=True)
         else:
             for msg in st.session_state.messages:
-                if msg["role"] == "user":
-                    st.markdown(f'''
-                        <div class="message-wrapper">
-                            <div class="user-msg">{msg["content"]}</div>
-                            <div class="msg-time msg-time-user">{msg.get("time", "")}</div>
-                        </div>
-                    ''', unsafe_allow_html=True)
-                else:
-                    st.markdown(f'''
-                        <div class="message-wrapper">
-                            <div class="ai-msg">{msg["content"]}</div>
-                            <div class="msg-time">{msg.get("time", "")}</div>
-                        </div>
-                    ''', unsafe_allow_html=True)
-                    
-                    # Source chips
-                    if msg.get("sources"):
-                        sources_html = "".join([
-                            f'<span class="source-chip">📎 {src.get("source_file", "Unknown")} • {src.get("chunk_id", "")}</span>'
-                            for src in msg["sources"]
-                        ])
-                        st.markdown(f'<div style="margin-top: 8px; margin-bottom: 12px;">{sources_html}</div>', unsafe_allow_html=True)
+                render_message(msg)
     
     # Input Form
     with st.form(key="query_form", clear_on_submit=True):
@@ -562,5 +698,7 @@ with right_col:
             submit_btn = st.form_submit_button("Send", use_container_width=True)
             
         if submit_btn:
-            handle_query()
+            if not st.session_state.messages:
+                empty_state.empty()
+            handle_query(st.session_state.query_input, chat_container)
             st.rerun()
\ No newline at end of file